@@ -0,0 +1,54 @@
+"""
+Atomic Writes
+Phase 1: Write output files so that readers never see a partial one
+
+Metadata, checkpoints, packed frames, manifests, and cached prompt embeddings
+are read by other processes (pool workers, the viewer, a resumed run) while
+they may be rewritten. Each file is written under a temporary name next to
+its destination and renamed into place; the rename is atomic, so a reader
+sees either the old file or the complete new one.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+def write_atomic(path, write):
+    """
+    Write a file under a temporary name and rename it into place.
+
+    Args:
+        path: Destination path
+        write: Callable that writes the complete file to the path it is given
+
+    Returns:
+        Destination path
+    """
+    path = Path(path)
+    # Named per process, so parallel workers writing the same file never share a temporary
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_json_atomic(path, data, **json_kwargs):
+    """
+    Write JSON to a temporary file and rename it into place.
+
+    Args:
+        path: Destination path
+        data: JSON-serializable data
+        **json_kwargs: Options for json.dump (default: indent=2)
+
+    Returns:
+        Destination path
+    """
+    json_kwargs.setdefault("indent", 2)
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, **json_kwargs)
+
+    return write_atomic(path, write)
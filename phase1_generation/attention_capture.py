@@ -0,0 +1,219 @@
+"""
+Cross-Attention Capture
+Phase 1: Record which image regions attend to which prompt tokens
+
+Diffusers attention modules never return their attention weights, so forward
+hooks cannot see them. Instead, the UNet's cross-attention layers (attn2) get
+a capture processor that computes the attention probabilities itself and
+hands them to a shared store.
+
+Full per-head maps for every layer and step would need gigabytes, so the
+store averages over heads and layers on the compute device and keeps one
+compact [tokens, H, W] map per sample per resolution per step.
+"""
+
+import math
+
+import torch
+
+
+class CrossAttentionStore:
+    def __init__(self):
+        """
+        Accumulate head- and layer-averaged cross-attention maps for one step at a time.
+        """
+        self.enabled = True
+
+        # Per-run settings (see reset)
+        self.latent_hw = None
+        self.conditional_only = True
+        self.num_tokens = None
+
+        # Running sums on the compute device, keyed by (height, width)
+        self._sums = {}
+        self._counts = {}
+
+    def reset(self, latent_hw, conditional_only=True, num_tokens=None):
+        """
+        Prepare the store for a new generation.
+
+        Args:
+            latent_hw: (height, width) of the latent, used to recover each layer's spatial shape
+            conditional_only: Batch holds [unconditional, conditional] halves (classifier-free
+                guidance) and only the conditional half should be recorded
+            num_tokens: Keep only the first N text tokens (None = all 77)
+        """
+        self.latent_hw = latent_hw
+        self.conditional_only = conditional_only
+        self.num_tokens = num_tokens
+        self._sums = {}
+        self._counts = {}
+
+    def add(self, attention_probs, batch_size):
+        """
+        Fold one layer's attention probabilities into the running step average.
+
+        Args:
+            attention_probs: Tensor of shape (batch * heads, pixels, tokens)
+            batch_size: Batch size of the layer input
+        """
+        if not self.enabled or self.latent_hw is None:
+            return
+
+        with torch.no_grad():
+            _, num_pixels, num_tokens = attention_probs.shape
+            probs = attention_probs.reshape(batch_size, -1, num_pixels, num_tokens)
+
+            if self.conditional_only and batch_size > 1:
+                probs = probs[batch_size // 2:]
+
+            if self.num_tokens is not None:
+                probs = probs[..., :self.num_tokens]
+
+            # Average over heads (samples stay separate), then restore the spatial layout
+            probs = probs.float().mean(dim=1)
+
+            latent_h, latent_w = self.latent_hw
+            downscale = math.sqrt(latent_h * latent_w / num_pixels)
+            height = int(round(latent_h / downscale))
+            width = num_pixels // height
+
+            attention_map = probs.reshape(probs.shape[0], height, width, -1).permute(0, 3, 1, 2)
+
+            key = (height, width)
+            if key in self._sums:
+                self._sums[key] += attention_map
+                self._counts[key] += 1
+            else:
+                self._sums[key] = attention_map.clone()
+                self._counts[key] = 1
+
+    def pop_step(self):
+        """
+        Finish the current step: average each resolution and move it to the host.
+
+        Returns:
+            Dict mapping "HxW" resolution strings to float16 numpy arrays of
+            shape [samples, tokens, H, W] (empty if nothing was captured)
+        """
+        step_maps = {}
+        for (height, width), total in self._sums.items():
+            mean_map = total / self._counts[(height, width)]
+            step_maps[f"{height}x{width}"] = mean_map.half().cpu().numpy()
+
+        self._sums = {}
+        self._counts = {}
+
+        return step_maps
+
+
+class CrossAttentionCaptureProcessor:
+    def __init__(self, store):
+        """
+        Attention processor that computes attention explicitly and records it.
+
+        Mirrors diffusers' default AttnProcessor, so outputs are unchanged.
+
+        Args:
+            store: CrossAttentionStore receiving the attention probabilities
+        """
+        self.store = store
+
+    def __call__(self, attn, hidden_states, encoder_hidden_states=None, attention_mask=None, temb=None, *args, **kwargs):
+        residual = hidden_states
+
+        if attn.spatial_norm is not None:
+            hidden_states = attn.spatial_norm(hidden_states, temb)
+
+        input_ndim = hidden_states.ndim
+
+        if input_ndim == 4:
+            batch_size, channel, height, width = hidden_states.shape
+            hidden_states = hidden_states.view(batch_size, channel, height * width).transpose(1, 2)
+
+        batch_size, sequence_length, _ = (
+            hidden_states.shape if encoder_hidden_states is None else encoder_hidden_states.shape
+        )
+        attention_mask = attn.prepare_attention_mask(attention_mask, sequence_length, batch_size)
+
+        if attn.group_norm is not None:
+            hidden_states = attn.group_norm(hidden_states.transpose(1, 2)).transpose(1, 2)
+
+        query = attn.to_q(hidden_states)
+
+        if encoder_hidden_states is None:
+            encoder_hidden_states = hidden_states
+        elif attn.norm_cross:
+            encoder_hidden_states = attn.norm_encoder_hidden_states(encoder_hidden_states)
+
+        key = attn.to_k(encoder_hidden_states)
+        value = attn.to_v(encoder_hidden_states)
+
+        query = attn.head_to_batch_dim(query)
+        key = attn.head_to_batch_dim(key)
+        value = attn.head_to_batch_dim(value)
+
+        attention_probs = attn.get_attention_scores(query, key, attention_mask)
+        self.store.add(attention_probs, batch_size)
+
+        hidden_states = torch.bmm(attention_probs, value)
+        hidden_states = attn.batch_to_head_dim(hidden_states)
+
+        # linear proj
+        hidden_states = attn.to_out[0](hidden_states)
+        # dropout
+        hidden_states = attn.to_out[1](hidden_states)
+
+        if input_ndim == 4:
+            hidden_states = hidden_states.transpose(-1, -2).reshape(batch_size, channel, height, width)
+
+        if attn.residual_connection:
+            hidden_states = hidden_states + residual
+
+        hidden_states = hidden_states / attn.rescale_output_factor
+
+        return hidden_states
+
+
+class AttentionCaptureHandle:
+    def __init__(self, unet, original_processors):
+        """
+        Undo handle for install_attention_capture (same interface as a torch hook handle).
+
+        Args:
+            unet: The UNet whose processors were replaced
+            original_processors: Processor dict to restore
+        """
+        self.unet = unet
+        self.original_processors = original_processors
+
+    def remove(self):
+        """Restore the UNet's original attention processors."""
+        if self.original_processors is not None:
+            self.unet.set_attn_processor(self.original_processors)
+            self.original_processors = None
+
+
+def install_attention_capture(unet, store):
+    """
+    Replace every cross-attention (attn2) processor in the UNet with a capture processor.
+
+    Args:
+        unet: The pipeline's UNet2DConditionModel
+        store: CrossAttentionStore shared by all capture processors
+
+    Returns:
+        AttentionCaptureHandle that restores the original processors
+    """
+    original_processors = dict(unet.attn_processors)
+
+    processors = {}
+    for name, processor in original_processors.items():
+        if name.endswith("attn2.processor"):  # attn2 = cross-attention
+            processors[name] = CrossAttentionCaptureProcessor(store)
+        else:
+            processors[name] = processor
+
+    unet.set_attn_processor(processors)
+
+    return AttentionCaptureHandle(unet, original_processors)
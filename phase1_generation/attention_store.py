@@ -0,0 +1,246 @@
+"""
+Attention Store
+Phase 1/3: Chunked, float16, random-access storage for captured attention maps
+
+A pickled list of tensors has to be loaded completely before a single step can
+be inspected. Instead, each resolution's maps are laid out as
+[step, token, H, W] float16 arrays split into .npy chunks along the step axis,
+with an index.json describing them. Readers memory-map only the chunks they
+touch, so loading one step - or one token across all steps - costs about
+what is actually read.
+
+Layout:
+    phase3_data/attention/
+    ├── index.json
+    ├── 16x16_0000.npy    # steps [0, chunk_size)
+    ├── 16x16_0001.npy    # steps [chunk_size, 2*chunk_size)
+    └── ...
+"""
+
+import copy
+import json
+from pathlib import Path
+
+import numpy as np
+
+from trajectory_store import StepArrayWriter
+
+
+INDEX_FILENAME = "index.json"
+
+
+class AttentionStoreWriter:
+    def __init__(self, store_dir, num_steps, chunk_size=10):
+        """
+        Initialize a streaming writer for per-step attention maps.
+
+        Args:
+            store_dir: Directory for the chunk files and index
+            num_steps: Maximum number of steps that will be written
+            chunk_size: Steps per chunk file
+        """
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.num_steps = num_steps
+        self.chunk_size = chunk_size
+
+        self.num_written = 0
+        self._chunks = {}      # resolution -> list of chunk entries
+        self._writers = {}     # resolution -> StepArrayWriter for the open chunk
+        self._num_tokens = None
+
+    def _open_chunk(self, resolution):
+        """Start a new chunk file for a resolution at the current step."""
+        chunk_idx = self.num_written // self.chunk_size
+        filename = f"{resolution}_{chunk_idx:04d}.npy"
+        capacity = min(
+            self.chunk_size - self.num_written % self.chunk_size,
+            self.num_steps - self.num_written
+        )
+
+        self._writers[resolution] = StepArrayWriter(
+            self.store_dir / filename,
+            num_steps=max(capacity, 1),
+            dtype=np.float16
+        )
+        self._chunks.setdefault(resolution, []).append({
+            "file": filename,
+            "start_step": self.num_written,
+            "num_steps": 0
+        })
+
+    def _close_chunk(self, resolution):
+        """Finish the open chunk for a resolution."""
+        writer = self._writers.pop(resolution, None)
+        if writer is not None:
+            shape = writer.close()
+            self._chunks[resolution][-1]["num_steps"] = shape[0] if shape else 0
+
+    def write_step(self, step_maps):
+        """
+        Append one step's attention maps.
+
+        Args:
+            step_maps: Dict mapping "HxW" resolution strings to [tokens, H, W] arrays
+        """
+        for resolution, token_maps in step_maps.items():
+            if self.num_written % self.chunk_size == 0 or resolution not in self._writers:
+                self._close_chunk(resolution)
+                self._open_chunk(resolution)
+
+            self._writers[resolution].write(np.asarray(token_maps, dtype=np.float16))
+            self._num_tokens = len(token_maps)
+
+        self.num_written += 1
+
+        # Close chunks as soon as they are full so they can be read mid-run
+        if self.num_written % self.chunk_size == 0:
+            for resolution in list(self._writers):
+                self._close_chunk(resolution)
+
+    def state_dict(self):
+        """
+        Flush open chunks and describe the writer's progress (for checkpoints).
+
+        Returns:
+            Dict that load_state_dict() accepts
+        """
+        for writer in self._writers.values():
+            writer.flush()
+
+        return {
+            "num_written": self.num_written,
+            "num_tokens": self._num_tokens,
+            "chunks": copy.deepcopy(self._chunks),
+            "open_chunks": {resolution: writer.count for resolution, writer in self._writers.items()}
+        }
+
+    def load_state_dict(self, state):
+        """
+        Continue writing from a state_dict() taken earlier in the same store directory.
+
+        Args:
+            state: Dict returned by state_dict()
+        """
+        self.num_written = state["num_written"]
+        self._num_tokens = state["num_tokens"]
+        self._chunks = copy.deepcopy(state["chunks"])
+
+        self._writers = {}
+        for resolution, count in state["open_chunks"].items():
+            writer = StepArrayWriter(self.store_dir / self._chunks[resolution][-1]["file"], num_steps=0)
+            writer.reopen(count)
+            self._writers[resolution] = writer
+
+    def close(self):
+        """
+        Finish all chunks and write the index.
+
+        Returns:
+            Number of steps written
+        """
+        for resolution in list(self._writers):
+            self._close_chunk(resolution)
+
+        index = {
+            "format": "chunked_attention_v1",
+            "dtype": "float16",
+            "layout": ["step", "token", "height", "width"],
+            "num_steps": self.num_written,
+            "num_tokens": self._num_tokens,
+            "chunk_size": self.chunk_size,
+            "resolutions": {
+                resolution: {
+                    "height": int(resolution.split("x")[0]),
+                    "width": int(resolution.split("x")[1]),
+                    "chunks": chunks
+                }
+                for resolution, chunks in self._chunks.items()
+            }
+        }
+
+        with open(self.store_dir / INDEX_FILENAME, "w") as f:
+            json.dump(index, f, indent=2)
+
+        return self.num_written
+
+
+class AttentionStoreReader:
+    def __init__(self, store_dir):
+        """
+        Open a chunked attention store for random access.
+
+        Only index.json is read here; chunk files are memory-mapped on demand.
+
+        Args:
+            store_dir: Directory containing index.json and chunk files
+        """
+        self.store_dir = Path(store_dir)
+
+        with open(self.store_dir / INDEX_FILENAME, "r") as f:
+            self.index = json.load(f)
+
+        self.num_steps = self.index["num_steps"]
+        self.num_tokens = self.index["num_tokens"]
+        self.resolutions = list(self.index["resolutions"].keys())
+
+        self._mapped = {}
+
+    def __len__(self):
+        return self.num_steps
+
+    def __getitem__(self, step_idx):
+        return self.load_step(step_idx)
+
+    def _chunk_array(self, chunk):
+        """Memory-map a chunk file (cached)."""
+        filename = chunk["file"]
+        if filename not in self._mapped:
+            self._mapped[filename] = np.load(self.store_dir / filename, mmap_mode="r")
+        return self._mapped[filename]
+
+    def _find_chunk(self, resolution, step_idx):
+        """Locate the chunk holding a step for one resolution."""
+        for chunk in self.index["resolutions"][resolution]["chunks"]:
+            if chunk["start_step"] <= step_idx < chunk["start_step"] + chunk["num_steps"]:
+                return chunk
+        return None
+
+    def load_step(self, step_idx, resolutions=None):
+        """
+        Load every resolution's maps for one step.
+
+        Args:
+            step_idx: Denoising step
+            resolutions: Optional subset of "HxW" resolution strings
+
+        Returns:
+            Dict mapping resolution to a [tokens, H, W] float16 array view
+        """
+        if not 0 <= step_idx < self.num_steps:
+            raise IndexError(f"Step {step_idx} out of range (0-{self.num_steps - 1})")
+
+        step_maps = {}
+        for resolution in resolutions or self.resolutions:
+            chunk = self._find_chunk(resolution, step_idx)
+            if chunk is not None:
+                step_maps[resolution] = self._chunk_array(chunk)[step_idx - chunk["start_step"]]
+
+        return step_maps
+
+    def load_token(self, token_idx, resolution):
+        """
+        Load one token's map at one resolution across all steps.
+
+        Args:
+            token_idx: Position in the CLIP token sequence
+            resolution: "HxW" resolution string
+
+        Returns:
+            float16 array of shape [steps, H, W]
+        """
+        return np.concatenate([
+            self._chunk_array(chunk)[:, token_idx]
+            for chunk in self.index["resolutions"][resolution]["chunks"]
+            if chunk["num_steps"] > 0
+        ])
@@ -0,0 +1,195 @@
+"""
+Long Trajectory Benchmark
+Measures resident memory of long-trajectory generation across step counts
+
+Each step count runs in a fresh worker process (so one run's allocations
+cannot hide another's), streaming every artifact to disk with
+long_trajectory=True. Resident memory is sampled after every step; with
+bounded memory the peak should stay flat from 50 to 1000 steps.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes.
+
+    Uses psutil when installed, /proc on Linux, and the peak RSS from
+    getrusage as a last resort (macOS without psutil).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_worker(args):
+    """Generate one sequence and report its memory profile as a JSON line."""
+    from diffusion_step_generator import DiffusionStepCapture
+
+    generator = DiffusionStepCapture(
+        model_id=args.model_id,
+        device=args.device,
+        decode_mode=args.decode_mode,
+        long_trajectory=not args.unbounded,
+        scheduler=args.scheduler
+    )
+
+    output_dir = Path(args.output_dir) / f"steps_{args.worker:04d}"
+    stream = generator.iter_steps(
+        prompt=args.prompt,
+        output_dir=output_dir,
+        num_inference_steps=args.worker,
+        seed=42,
+        height=args.height,
+        width=args.width
+    )
+
+    start_rss = current_rss()
+    start = time.perf_counter()
+    samples = []
+    for _ in stream:
+        samples.append(current_rss())
+    seconds = time.perf_counter() - start
+    end_rss = current_rss()
+
+    # Growth over the second half of the run (allocator warmup happens early)
+    half = samples[len(samples) // 2] if samples else start_rss
+
+    print(json.dumps({
+        "steps": args.worker,
+        "frames": len(samples),
+        "seconds": seconds,
+        "start_mb": start_rss / 2**20,
+        "peak_mb": max(samples + [end_rss]) / 2**20,
+        "growth_mb": (max(samples + [end_rss]) - start_rss) / 2**20,
+        "second_half_growth_mb": (samples[-1] - half) / 2**20 if samples else 0.0
+    }))
+
+
+def main():
+    """
+    Run the benchmark for every step count and print a summary table.
+    """
+    parser = argparse.ArgumentParser(
+        description="Show resident memory of long-trajectory generation from 50 to 1000 steps"
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        nargs="+",
+        default=[50, 100, 250, 500, 1000],
+        help="Step counts to benchmark"
+    )
+    parser.add_argument(
+        "--model-id",
+        default="runwayml/stable-diffusion-v1-5",
+        help="Model to generate with"
+    )
+    parser.add_argument(
+        "--device",
+        default="mps",
+        choices=["cuda", "mps", "cpu"],
+        help="Device for generation"
+    )
+    parser.add_argument(
+        "--decode-mode",
+        default="deferred",
+        choices=["sync", "deferred", "background"],
+        help="When step frames are decoded"
+    )
+    parser.add_argument(
+        "--scheduler",
+        default="ddpm",
+        choices=["pndm", "ddim", "ddpm"],
+        help="Denoising scheduler (DDPM runs up to 1000 steps)"
+    )
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument(
+        "--prompt",
+        default="a lighthouse on a cliff at dusk, oil painting",
+        help="Prompt to generate"
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Where the benchmark sequences are written (default: a temporary directory)"
+    )
+    parser.add_argument(
+        "--unbounded",
+        action="store_true",
+        help="Run without long_trajectory, for comparison"
+    )
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = args.output_dir or tmp_dir
+
+        results = []
+        for num_steps in args.steps:
+            print(f"\nBenchmarking {num_steps} steps...")
+            command = [
+                sys.executable, str(Path(__file__).resolve()),
+                "--worker", str(num_steps),
+                "--model-id", args.model_id,
+                "--device", args.device,
+                "--decode-mode", args.decode_mode,
+                "--scheduler", args.scheduler,
+                "--height", str(args.height),
+                "--width", str(args.width),
+                "--prompt", args.prompt,
+                "--output-dir", output_dir
+            ]
+            if args.unbounded:
+                command.append("--unbounded")
+
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(completed.stderr)
+                sys.exit(completed.returncode)
+
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"  ✓ {result['frames']} frames in {result['seconds']:.1f}s, peak {result['peak_mb']:.0f} MB")
+
+    print("\n" + "="*70)
+    mode = "unbounded" if args.unbounded else "long_trajectory=True"
+    print(f"LONG TRAJECTORY MEMORY ({mode}, {args.scheduler}, {args.decode_mode} decoding)")
+    print("="*70)
+    print(f"{'steps':>6} {'ms/step':>9} {'start MB':>9} {'peak MB':>9} {'growth MB':>10} {'2nd half MB':>12}")
+    for result in results:
+        print(
+            f"{result['steps']:>6} {1000 * result['seconds'] / max(1, result['frames']):>9.1f} "
+            f"{result['start_mb']:>9.0f} {result['peak_mb']:>9.0f} {result['growth_mb']:>10.1f} "
+            f"{result['second_half_growth_mb']:>12.1f}"
+        )
+
+    if len(results) > 1:
+        spread = results[-1]["growth_mb"] - results[0]["growth_mb"]
+        print(f"\nPeak growth {results[0]['steps']} -> {results[-1]['steps']} steps: {spread:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
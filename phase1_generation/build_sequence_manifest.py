@@ -0,0 +1,324 @@
+"""
+Sequence Manifest Builder
+Phase 1 -> Phase 2: Index every generated sequence in one sequences.json for the web viewer
+
+Without an index the viewer has to know (or probe) the directory names that
+diffusion_step_generator.main and generate_fakenews_all_modes write, then
+fetch each sequence's metadata.json - a large file, since it holds every
+step's statistics. The builder reads those metadata.json files in parallel
+and writes one compact sequences.json next to them, with per sequence the
+prompt, mode, step count, frame and thumbnail URLs, and a precomputed
+noise-variance curve. All URLs are relative to sequences.json.
+
+The manifest is updated incrementally: each entry remembers the size and
+modification time of the metadata.json it was built from, and only new or
+changed sequences are read again. Sequences that disappeared are dropped.
+
+Forked sequences only list their own frames; their prefix frames are the
+parent's frames before "first_frame" (the parent is in the manifest too).
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from atomic_write import write_json_atomic
+from generate_fakenews_all_modes import MODES, THEMES
+from pack_sequences import frame_files
+
+
+MANIFEST_FILENAME = "sequences.json"
+MANIFEST_VERSION = 1
+
+
+def source_stamp(metadata_path):
+    """
+    Identify the version of a metadata.json an entry was built from.
+
+    Args:
+        metadata_path: Path to the sequence's metadata.json
+
+    Returns:
+        [size, mtime_ns] (metadata.json is replaced atomically, so a rewrite changes both)
+    """
+    stat = metadata_path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_sequence_name(name):
+    """
+    Recover theme and mode from a sequence directory name.
+
+    Understands the names written by generate_fakenews_all_modes
+    (fakenews_<theme>_<mode>) and diffusion_step_generator.main (01_standard, ...).
+
+    Args:
+        name: Directory name
+
+    Returns:
+        (theme, mode); either is None if the name does not say
+    """
+    theme = None
+    if name.startswith("fakenews_"):
+        for theme_id in THEMES:
+            if name.startswith(f"fakenews_{theme_id}_"):
+                theme = theme_id
+                name = name[len(f"fakenews_{theme_id}_"):]
+                break
+
+    name = re.sub(r"^\d+_", "", name)
+    mode = name if name in MODES else None
+    return theme, mode
+
+
+def downsample_curve(steps, key, max_points):
+    """
+    Pick an evenly spaced subset of a per-step statistic.
+
+    Args:
+        steps: metadata.json "steps" list
+        key: Statistic to read (e.g. "noise_variance")
+        max_points: Maximum number of points (0 = keep every step)
+
+    Returns:
+        List of [step, value] (steps without the statistic, e.g. skipped by a stride, are left out)
+    """
+    points = [
+        [entry["step"], round(entry[key], 5)]
+        for entry in steps
+        if entry.get(key) is not None
+    ]
+    if max_points and len(points) > max_points:
+        last = len(points) - 1
+        points = [points[round(i * last / max(1, max_points - 1))] for i in range(max_points)]
+    return points
+
+
+def build_entry(base_dir, metadata_path, url_root="", curve_points=100):
+    """
+    Summarize one sequence for the manifest.
+
+    Args:
+        base_dir: Directory containing the sequences (entry ids are relative to it)
+        metadata_path: The sequence's metadata.json
+        url_root: Path from the manifest's directory to base_dir ("" if the manifest is in base_dir)
+        curve_points: Maximum points of the noise-variance curve
+
+    Returns:
+        Manifest entry dict
+    """
+    stamp = source_stamp(metadata_path)
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    sequence_dir = metadata_path.parent
+    sequence_id = sequence_dir.relative_to(base_dir).as_posix()
+    theme, mode = parse_sequence_name(sequence_dir.name)
+
+    def url(*parts):
+        return posixpath.normpath(posixpath.join(url_root, sequence_id, *parts))
+
+    steps = metadata.get("steps", [])
+    # Only sequences from before frame_indices was recorded need a directory listing
+    files = frame_files(sequence_dir, metadata)
+    frame_indices = [index for index, _ in files]
+
+    # Thumbnails come from the "thumb" rendition, or else the smallest downscaled one
+    renditions = metadata.get("renditions") or {}
+    scaled = sorted((described["max_size"], name) for name, described in renditions.items() if described.get("max_size"))
+    thumbnails = None
+    if scaled:
+        rendition = "thumb" if "thumb" in renditions else scaled[0][1]
+        thumbnails = [
+            url(path.relative_to(sequence_dir).as_posix())
+            for _, path in frame_files(sequence_dir, metadata, rendition)
+        ]
+
+    variance = downsample_curve(steps, "noise_variance", curve_points)
+    entry = {
+        "id": sequence_id,
+        "prompt": metadata.get("prompt"),
+        "theme": theme,
+        "mode": mode,
+        "num_inference_steps": metadata.get("num_inference_steps"),
+        "captured_steps": len(steps),
+        "guidance_scale": metadata.get("guidance_scale"),
+        "seed": metadata.get("seed"),
+        "width": metadata.get("width"),
+        "height": metadata.get("height"),
+        "scheduler": metadata.get("scheduler"),
+        "generated_at": metadata.get("generated_at"),
+        "final": url("final.png"),
+        "frame_indices": frame_indices,
+        "frames": [url(path.name) for _, path in files],
+        "thumbnails": thumbnails,
+        "noise_variance": variance,
+        "summary": {
+            "frames": len(frame_indices),
+            "noise_variance_start": variance[0][1] if variance else None,
+            "noise_variance_end": variance[-1][1] if variance else None,
+            "exit_step": (metadata.get("early_exit") or {}).get("exit_step")
+        },
+        "source": stamp
+    }
+
+    if metadata.get("x0_frame_indices"):
+        entry["x0_frames"] = [url(f"x0_step_{j:04d}.png") for j in metadata["x0_frame_indices"]]
+
+    if metadata.get("fork"):
+        fork = metadata["fork"]
+        entry["fork"] = {
+            "parent": posixpath.normpath(posixpath.join(sequence_id, fork["parent_dir"])),
+            "fork_step": fork["fork_step"],
+            "first_frame": fork["first_frame"]
+        }
+
+    # Point the viewer at packed frames (see pack_sequences.py), with the index it needs to slice them
+    if metadata.get("packed"):
+        entry["packed"] = {
+            kind: dict(index, file=url(index["file"]))
+            for kind, index in metadata["packed"].items()
+            if isinstance(index, dict)
+        }
+
+    return entry
+
+
+def load_manifest(manifest_path):
+    """Read an existing manifest, or return None if there is none (or it is unreadable)."""
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def build_manifest(base_dir, manifest_path=None, workers=8, curve_points=100, force=False):
+    """
+    Write (or update) the sequence manifest.
+
+    Args:
+        base_dir: Directory containing the sequences (e.g. assets/generated_sequences)
+        manifest_path: Where to write it (default: base_dir/sequences.json)
+        workers: metadata.json files read in parallel
+        curve_points: Maximum points of each noise-variance curve
+        force: Re-read every sequence, even unchanged ones
+
+    Returns:
+        Dict with counts of "added", "updated", "unchanged", "removed", and "failed" sequences
+    """
+    base_dir = Path(base_dir)
+    manifest_path = Path(manifest_path) if manifest_path else base_dir / MANIFEST_FILENAME
+
+    url_root = Path(os.path.relpath(base_dir, manifest_path.parent)).as_posix()
+    url_root = "" if url_root == "." else url_root
+
+    settings = {"curve_points": curve_points, "url_root": url_root}
+    previous = load_manifest(manifest_path) or {}
+    # Entries built with other settings (or by another version of this script) are rebuilt
+    reusable = not force and previous.get("version") == MANIFEST_VERSION and previous.get("settings") == settings
+    previous = {entry["id"]: entry for entry in previous.get("sequences", [])}
+
+    metadata_paths = sorted(base_dir.rglob("metadata.json"))
+
+    def read(metadata_path):
+        sequence_id = metadata_path.parent.relative_to(base_dir).as_posix()
+        try:
+            cached = previous.get(sequence_id)
+            if reusable and cached is not None and cached.get("source") == source_stamp(metadata_path):
+                return "unchanged", cached
+            return ("updated" if cached is not None else "added"), build_entry(base_dir, metadata_path, url_root, curve_points)
+        except (OSError, KeyError, ValueError) as e:
+            # Keep the last good entry of a sequence whose metadata cannot be read right now
+            return f"failed: {metadata_path}: {e}", previous.get(sequence_id)
+
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    sequences = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for status, entry in executor.map(read, metadata_paths):
+            if status.startswith("failed"):
+                print(f"  ✗ {status[len('failed: '):]}")
+                status = "failed"
+            counts[status] += 1
+            if entry is not None:
+                sequences.append(entry)
+
+    counts["removed"] = len(set(previous) - {entry["id"] for entry in sequences})
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(manifest_path, {
+        "version": MANIFEST_VERSION,
+        "generated_at": datetime.now().isoformat(),
+        "settings": settings,
+        "modes": {mode_id: mode_data["description"] for mode_id, mode_data in MODES.items()},
+        "themes": {theme_id: theme_data["name"] for theme_id, theme_data in THEMES.items()},
+        "sequences": sequences
+    }, indent=None, separators=(",", ":"))
+
+    return counts
+
+
+def main():
+    """
+    Build the viewer's sequence manifest, re-reading only new or changed sequences.
+    """
+    parser = argparse.ArgumentParser(
+        description="Index every generated sequence in one sequences.json for the web viewer"
+    )
+    parser.add_argument(
+        "base_dir",
+        nargs="?",
+        default="../assets/generated_sequences",
+        help="Directory containing the sequences"
+    )
+    parser.add_argument(
+        "--output",
+        help=f"Manifest path (default: BASE_DIR/{MANIFEST_FILENAME}; URLs are relative to it)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="metadata.json files read in parallel"
+    )
+    parser.add_argument(
+        "--curve-points",
+        type=int,
+        default=100,
+        help="Maximum points of each noise-variance curve (0 = every step)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-read every sequence, even if its metadata.json did not change"
+    )
+    args = parser.parse_args()
+
+    if not Path(args.base_dir).is_dir():
+        parser.error(f"{args.base_dir} is not a directory")
+    output = Path(args.output) if args.output else Path(args.base_dir) / MANIFEST_FILENAME
+
+    print("\n" + "="*70)
+    print(f"BUILDING SEQUENCE MANIFEST: {output}")
+    print("="*70)
+
+    counts = build_manifest(args.base_dir, output, args.workers, args.curve_points, args.force)
+
+    print("\n" + "="*70)
+    print(
+        f"✓ {counts['added']} ADDED, {counts['updated']} UPDATED, {counts['unchanged']} UP TO DATE, "
+        f"{counts['removed']} REMOVED, {counts['failed']} FAILED"
+    )
+    print("="*70)
+
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
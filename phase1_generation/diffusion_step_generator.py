@@ -12,118 +12,758 @@ Enhanced version captures additional data for Phase 3 analysis:
 """
 
 import torch
-from diffusers import StableDiffusionPipeline
-from PIL import Image
+from diffusers import DDIMScheduler, DDPMScheduler, PNDMScheduler
+from diffusers.utils.torch_utils import randn_tensor
 import json
 import os
 from datetime import datetime
 from pathlib import Path
 import numpy as np
 
+from atomic_write import write_atomic, write_json_atomic
+from attention_capture import CrossAttentionStore, install_attention_capture
+from early_exit import ConvergenceMonitor, predict_original_sample
+from frame_writer import FrameWriter
+from latent_decoding import LatentPreviewDecoder, decode_latents, vae_decode
+from pipeline_registry import registry
+from prompt_cache import PromptEmbeddingCache
+from sequence_recorder import SequenceRecorder
+from step_observers import default_observers
+from step_stream import StepRecord, StepStream
+
+
+# Schedulers selectable by name (all parameterized by alphas_cumprod, which
+# early exit and predicted-x0 frames rely on)
+SCHEDULER_TYPES = {
+    "pndm": PNDMScheduler,
+    "ddim": DDIMScheduler,
+    "ddpm": DDPMScheduler
+}
+
 
 class DiffusionStepCapture:
-    def __init__(self, model_id="runwayml/stable-diffusion-v1-5", device="mps", capture_attention=True):
+    def __init__(
+        self,
+        model_id="runwayml/stable-diffusion-v1-5",
+        device="mps",
+        capture_attention=True,
+        torch_dtype=None,
+        pipeline_registry=None,
+        decode_mode="sync",
+        decode_batch_size=8,
+        frame_writer_workers=4,
+        prompt_cache_dir=None,
+        observer_strides=None,
+        adaptive_frames=None,
+        decode_memory_budget=None,
+        long_trajectory=False,
+        scheduler=None,
+        frame_renditions=None,
+        profile_observers=False
+    ):
         """
         Initialize the diffusion model with step-by-step capture capabilities.
 
+        The pipeline comes from a process-wide registry, so creating several
+        generators with the same configuration only loads the model once.
+
         Args:
             model_id: HuggingFace model identifier
             device: "cuda", "mps" (for Mac M1/M2), or "cpu"
             capture_attention: Whether to capture attention maps (adds overhead)
+            torch_dtype: Override the model dtype (None = float16 on CUDA, float32 elsewhere)
+            pipeline_registry: PipelineRegistry to draw from (None = shared default)
+            decode_mode: When intermediate latents are decoded to images:
+                "sync" (inside the step callback), "deferred" (in batches after
+                generation), or "background" (in batches on a worker thread)
+            decode_batch_size: Latents per VAE call for deferred/background decoding
+            frame_writer_workers: Threads encoding and saving step frames during generation
+            prompt_cache_dir: Directory for persisting prompt embeddings across runs
+                (None = in-memory cache only)
+            observer_strides: Capture stride per step observer ("latents", "frames",
+                "x0_frames", "stats", "attention"); 0 turns an observer off (default:
+                every step, except x0_frames which is off unless given a stride)
+            adaptive_frames: Save frames only when the latents changed enough - keyword
+                arguments for step_observers.AdaptiveFrameObserver (threshold,
+                max_interval, min_frames, max_frames); None = save every frame
+            decode_memory_budget: Bytes a VAE decode may use; larger decodes (high
+                resolutions, batches) are split into overlapping tiles sized to fit,
+                for step frames and the final image alike (None = no limit)
+            long_trajectory: Keep memory flat for runs of hundreds of steps: deferred
+                frames are decoded batch by batch as the run goes instead of at the
+                end, and per-step logging is thinned out
+            scheduler: Denoising scheduler, "pndm", "ddim", or "ddpm" (None = the
+                model's own, PNDM for SD 1.x). Named schedulers can run schedules
+                of up to the 1000 training timesteps (DDPM-style long trajectories)
+            frame_renditions: frame_writer.FrameRenditions written for every step frame
+                besides the lossless PNG, e.g. frame_writer.STANDARD_RENDITIONS (a 64px
+                WebP thumbnail, a full-size WebP preview, and a 256px WebP for CLIP
+                analysis); listed in metadata.json
+            profile_observers: Wait for the device before and after every step
+                observer, so observer_cost holds the real time of its GPU work
+                rather than only the time to launch it (slower: syncs per observer
+                and step; makes no difference on the CPU)
         """
-        print(f"Loading model: {model_id}")
+        if decode_mode not in ("sync", "deferred", "background"):
+            raise ValueError(f"Unknown decode_mode: {decode_mode}")
+
+        self.model_id = model_id
         self.device = device
         self.capture_attention = capture_attention
+        self.decode_mode = decode_mode
+        self.decode_batch_size = decode_batch_size
+        self.decode_memory_budget = decode_memory_budget
+        self.long_trajectory = long_trajectory
+        self.frame_renditions = tuple(frame_renditions or ())
+        self.profile_observers = profile_observers
+
+        # Prompt embeddings are computed once per (tokenizer, prompt)
+        self.prompt_cache = PromptEmbeddingCache(cache_dir=prompt_cache_dir)
+
+        # Frames are encoded and written in the background as they are produced
+        self.frame_writer = FrameWriter(max_workers=frame_writer_workers)
 
-        # Load the pipeline
-        self.pipe = StableDiffusionPipeline.from_pretrained(
-            model_id,
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            safety_checker=None  # Disable for artistic freedom
+        # Load (or reuse) the pipeline
+        self.pipeline_registry = pipeline_registry or registry
+        self._pipeline_entry = self.pipeline_registry.acquire(
+            model_id, device, torch_dtype=torch_dtype, capture_attention=capture_attention
         )
-        self.pipe = self.pipe.to(device)
+        self.pipe = self._pipeline_entry.pipe
+
+        # Each generator keeps its own scheduler and installs it on the shared
+        # pipeline when it runs, so generators with different schedulers can coexist
+        if scheduler is None:
+            self.scheduler = self.pipe.scheduler
+        elif scheduler in SCHEDULER_TYPES:
+            # Schedules start at timestep 0, so all training timesteps can be used
+            self.scheduler = SCHEDULER_TYPES[scheduler].from_config(self.pipe.scheduler.config, steps_offset=0)
+        else:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
 
-        # Storage for intermediate steps
+        # Cheap latent->RGB projection for preview frames (replaceable with a
+        # calibrated decoder via LatentPreviewDecoder.calibrate)
+        self.preview_decoder = LatentPreviewDecoder(upscale=self.pipe.vae_scale_factor)
+        self._preview = False
+        self._keyframes = None
+
+        # Intermediate images and step metadata of the latest generate_sequence() call
         self.intermediate_images = []
         self.metadata = []
 
-        # Storage for Phase 3 interpretability data
-        self.latent_vectors = []
-        self.predicted_noise = []
-        self.attention_maps = []
+        # One SequenceRecorder per batch element of the running generation
+        # (owns that sequence's frames, Phase 3 arrays, and step metadata)
+        self._recorders = []
+
+        # Per-step capture, one observer per feature (see step_observers.py)
+        self.observers = {}
+        for observer in default_observers(self.capture_attention, observer_strides, adaptive_frames):
+            self.register_observer(observer)
 
         # Attention capture setup
         if self.capture_attention:
             self._setup_attention_hooks()
 
+    def register_observer(self, observer):
+        """
+        Add a step observer (replacing any observer with the same name).
+
+        Args:
+            observer: StepObserver instance
+        """
+        if self.profile_observers:
+            device_type = torch.device(self.device).type
+            if device_type == "cuda":
+                observer.synchronize = torch.cuda.synchronize
+            elif device_type == "mps":
+                observer.synchronize = torch.mps.synchronize
+        self.observers[observer.name] = observer
+
+    def remove_observer(self, name):
+        """
+        Stop capturing one feature, e.g. remove_observer("attention").
+
+        Args:
+            name: Observer name
+        """
+        self.observers.pop(name, None)
+
     def _setup_attention_hooks(self):
         """
-        Set up hooks to capture cross-attention maps during generation.
+        Set up capture of cross-attention maps during generation.
         Cross-attention maps show which image regions correspond to which prompt tokens.
+
+        The UNet's cross-attention processors are swapped for capture processors
+        that average heads and layers on the device. They live on the shared
+        pipeline, so they are installed once per registry entry.
+        """
+        if self._pipeline_entry.attention_store is None:
+            store = CrossAttentionStore()
+            handle = install_attention_capture(self.pipe.unet, store)
+            self._pipeline_entry.hook_handles.append(handle)
+            self._pipeline_entry.attention_store = store
+
+        self.attention_store = self._pipeline_entry.attention_store
+
+    def _prompt_token_layout(self, prompt):
         """
-        self.attention_store = []
+        Map prompt words to CLIP token positions, so attention maps can be read per word.
 
-        def hook_fn(module, input, output):
-            """Hook to capture attention weights from cross-attention layers"""
-            # Cross-attention output contains attention weights
-            if hasattr(output, 'attentions') and output.attentions is not None:
-                # Store attention weights (detach to avoid gradient tracking)
-                self.attention_store.append(output.attentions.detach().cpu())
+        Args:
+            prompt: Text prompt
 
-        # Register hooks on cross-attention layers in the UNet
-        # These layers map text tokens to image regions
-        for name, module in self.pipe.unet.named_modules():
-            if 'attn2' in name and 'processor' not in name:  # attn2 = cross-attention
-                module.register_forward_hook(hook_fn)
+        Returns:
+            (token strings including start/end tokens, list of token indices per word)
+        """
+        tokenizer = self.pipe.tokenizer
+        input_ids = tokenizer(prompt, truncation=True, max_length=tokenizer.model_max_length).input_ids
+        tokens = tokenizer.convert_ids_to_tokens(input_ids)
+
+        # CLIP splits on whitespace before BPE, so words tokenize independently
+        word_tokens = []
+        position = 1  # Skip the start token
+        for word in prompt.split():
+            num_word_tokens = len(tokenizer(word, add_special_tokens=False).input_ids)
+            word_tokens.append([i for i in range(position, position + num_word_tokens) if i < len(input_ids) - 1])
+            position += num_word_tokens
+
+        return tokens, word_tokens
+
+    def close(self, evict=False):
+        """
+        Release the shared pipeline.
+
+        Args:
+            evict: Also unload the model (and its hooks) if no other generator uses it
+        """
+        if self._pipeline_entry is None:
+            return
+
+        self.frame_writer.close()
+        self.pipeline_registry.release(self._pipeline_entry, evict=evict)
+        self._pipeline_entry = None
+        self.pipe = None
+
+    def _is_keyframe(self, frame_index):
+        """
+        Decide whether a frame gets a full VAE decode or a cheap preview.
+
+        Args:
+            frame_index: Index of the captured frame
+
+        Returns:
+            True if the frame should be decoded with the VAE
+        """
+        if not self._preview:
+            return True
+        if self._keyframes is None:
+            return False
+        if isinstance(self._keyframes, int):
+            return frame_index % self._keyframes == 0
+        return frame_index in self._keyframes
 
-    def step_callback(self, step, timestep, latents):
+    def _record_step(self, state, frame_index, num_frames):
         """
-        Callback function that captures each denoising step.
+        Capture one completed denoising step.
         This is where the "invisible" becomes visible.
 
-        Enhanced to capture:
+        Sample i of the batch belongs to the i-th active SequenceRecorder.
+        Without recorders (streaming only) nothing is decoded up front - each
+        StepRecord decodes its frame when a consumer asks for it.
+
+        The registered step observers do the capturing, each at its own stride:
         - Decoded images (as before)
-        - Raw latent vectors
-        - Predicted noise (computed during denoising)
+        - Raw latent vectors and predicted noise (the UNet's guided noise prediction)
+        - Step statistics
         - Attention maps (if enabled)
+        Each observer's wall time and output size go into the step's metadata.
+
+        Args:
+            state: Step state yielded by _denoise_steps()
+            frame_index: Index of the captured frame within the sequence
+            num_frames: Number of frames the whole sequence will have
+
+        Returns:
+            List of StepRecords, one per batch element
+        """
+        latents = state["latents"]
+        noise_pred = state["noise_pred"]
+        batch_size = latents.shape[0]
+
+        timestamp = datetime.now().isoformat()
+        entries = [
+            {"step": state["step"], "timestep": state["timestep"], "timestamp": timestamp}
+            for _ in range(batch_size)
+        ]
+
+        # Filled in by the step observers
+        step = {
+            "frame_index": frame_index,
+            "num_frames": num_frames,
+            "final": state["final"],
+            "step": state["step"],
+            "timestep": state["timestep"],
+            "latents": latents,
+            "noise_pred": noise_pred,
+            "sample": state["sample"],
+            "entries": entries,
+            "stats": [{} for _ in range(batch_size)],
+            "images": [None] * batch_size,
+            "attention_maps": [{} for _ in range(batch_size)]
+        }
+
+        step_cost = {}
+        for name, observer in self.observers.items():
+            if observer.wants(frame_index):
+                seconds, num_bytes = observer.run(observer.observe, self, step, self._recorders)
+                if num_bytes is not None:
+                    step_cost[name] = {"ms": 1000 * seconds, "bytes": num_bytes}
+
+        if self._is_keyframe(frame_index):
+            decode = lambda sample: decode_latents(self.pipe.vae, sample, self.decode_memory_budget)[0]
+        else:
+            decode = lambda sample: self.preview_decoder.decode(sample)[0]
+
+        # Statistics may still be on the device; reading them from a record syncs once
+        stats_observer = self.observers.get("stats")
+        resolve_stats = stats_observer.flush if stats_observer is not None else None
+
+        records = []
+        for i, entry in enumerate(entries):
+            entry["observer_cost"] = step_cost
+
+            if self._recorders:
+                self._recorders[i].add_step(entry)
+
+            records.append(StepRecord(
+                index=frame_index,
+                step=state["step"],
+                timestep=state["timestep"],
+                latents=latents[i:i + 1],
+                noise_pred=noise_pred[i:i + 1],
+                stats=step["stats"][i],
+                resolve_stats=resolve_stats,
+                metadata=entry,
+                attention_maps=step["attention_maps"][i],
+                image=step["images"][i],
+                decode=decode
+            ))
+
+        if not self.long_trajectory or frame_index % max(1, num_frames // 20) == 0 or state["final"]:
+            print(f"  Step {state['step']}: timestep={state['timestep']}")
+
+        return records
+
+    def encode_prompt(self, prompt):
+        """
+        Get CLIP text embeddings for a prompt, running the text encoder only on a cache miss.
+
+        Args:
+            prompt: Text prompt (also used for negative prompts)
+
+        Returns:
+            Tensor of shape (1, 77, hidden_size) on the pipeline's device
+        """
+        device = self.pipe._execution_device
+        key = PromptEmbeddingCache.make_key(self.pipe.tokenizer, prompt)
+
+        prompt_embeds = self.prompt_cache.get(key)
+        if prompt_embeds is None:
+            prompt_embeds, _ = self.pipe.encode_prompt(prompt, device, 1, False)
+            self.prompt_cache.put(key, prompt_embeds)
+
+        return prompt_embeds.to(device=device, dtype=self.pipe.text_encoder.dtype)
+
+    def _schedule_config(self):
+        """
+        Describe the scheduler settings that decide which timesteps are run.
+
+        Two schedulers of the same class can still step through different
+        timesteps (e.g. the model's PNDM with steps_offset=1 and
+        scheduler="pndm" with 0), so checkpoints and forks compare these too.
+
+        Returns:
+            Dict for metadata.json and checkpoints
+        """
+        config = self.scheduler.config
+        return {
+            "steps_offset": config.get("steps_offset", 0),
+            "timestep_spacing": config.get("timestep_spacing", "leading"),
+            "prediction_type": config.get("prediction_type", "epsilon")
+        }
+
+    def _captured_step_indices(self, num_inference_steps):
+        """
+        Find the denoising loop iterations that are reported to the step callback.
+
+        Args:
+            num_inference_steps: Number of denoising steps
+
+        Returns:
+            List of loop indices; captured frame j comes from loop index result[j]
+        """
+        scheduler = self.scheduler
+        scheduler.set_timesteps(num_inference_steps)
+        num_timesteps = len(scheduler.timesteps)
+        num_warmup_steps = num_timesteps - num_inference_steps * scheduler.order
+
+        return [
+            i for i in range(num_timesteps)
+            if i == num_timesteps - 1 or ((i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0)
+        ]
+
+    def _count_captured_steps(self, num_inference_steps):
+        """
+        Count how many steps the denoising loop will report to the step callback.
+
+        Args:
+            num_inference_steps: Number of denoising steps
+
+        Returns:
+            Number of callback invocations (used to pre-size streamed arrays)
         """
-        # Store raw latent vectors (for Phase 3 analysis)
-        self.latent_vectors.append(latents.detach().cpu().numpy())
+        return len(self._captured_step_indices(num_inference_steps))
 
-        # Decode latents to image
-        with torch.no_grad():
-            # Scale and decode
-            latents_scaled = 1 / 0.18215 * latents
-            image = self.pipe.vae.decode(latents_scaled).sample
+    def _encode_batch(self, prompts, negative_prompts, guidance_scales):
+        """
+        Build the UNet text conditioning for a batch.
+
+        Args:
+            prompts: One prompt per batch element
+            negative_prompts: One negative prompt per batch element
+            guidance_scales: One guidance scale per batch element
+
+        Returns:
+            (prompt_embeds, guidance) - with classifier-free guidance the embeddings are
+            [negative, positive] and guidance is a (batch, 1, 1, 1) tensor, otherwise None
+        """
+        device = self.pipe._execution_device
+
+        # Encode prompts (cached across runs)
+        prompt_embeds = torch.cat([self.encode_prompt(p) for p in prompts])
+        if max(guidance_scales) <= 1.0:
+            return prompt_embeds, None
+
+        negative_prompt_embeds = torch.cat([self.encode_prompt(p) for p in negative_prompts])
+        prompt_embeds = torch.cat([negative_prompt_embeds, prompt_embeds])
+
+        # One guidance scale per batch element, broadcast over (C, H, W)
+        guidance = torch.tensor(guidance_scales, device=device, dtype=prompt_embeds.dtype).view(-1, 1, 1, 1)
+
+        return prompt_embeds, guidance
+
+    def _predict_noise(self, latents, timestep, prompt_embeds, guidance=None):
+        """
+        Run the UNet for one denoising step and apply classifier-free guidance.
+
+        Args:
+            latents: Current latents, shape (batch, C, H, W)
+            timestep: Scheduler timestep
+            prompt_embeds, guidance: Conditioning from _encode_batch()
+
+        Returns:
+            Guided noise prediction, shape (batch, C, H, W)
+        """
+        # Expand the latents for classifier-free guidance
+        latent_model_input = torch.cat([latents] * 2) if guidance is not None else latents
+        latent_model_input = self.pipe.scheduler.scale_model_input(latent_model_input, timestep)
+
+        # Predict the noise residual
+        noise_pred = self.pipe.unet(
+            latent_model_input,
+            timestep,
+            encoder_hidden_states=prompt_embeds,
+            return_dict=False
+        )[0]
+
+        # Perform guidance
+        if guidance is not None:
+            noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+            noise_pred = noise_pred_uncond + guidance * (noise_pred_text - noise_pred_uncond)
+
+        return noise_pred
+
+    def _draw_seed_latent(self, generator, height, width):
+        """
+        Draw initial noise for one image exactly as the pipeline would.
+
+        Repeating this latent along the batch axis starts every batch element
+        from the same noise, so batched results match single-image runs.
+
+        Args:
+            generator: torch.Generator (or None)
+            height, width: Output size in pixels
+
+        Returns:
+            Tensor of shape (1, C, height / 8, width / 8)
+        """
+        latent_shape = (
+            1,
+            self.pipe.unet.config.in_channels,
+            height // self.pipe.vae_scale_factor,
+            width // self.pipe.vae_scale_factor
+        )
+        return randn_tensor(
+            latent_shape,
+            generator=generator,
+            device=self.pipe._execution_device,
+            dtype=self.pipe.text_encoder.dtype
+        )
+
+    @torch.no_grad()
+    def _denoise_steps(
+        self,
+        prompt,
+        negative_prompt,
+        num_inference_steps,
+        guidance_scale,
+        generator,
+        height,
+        width,
+        latents=None,
+        resume_state=None,
+        checkpoint_every=None,
+        on_checkpoint=None,
+        convergence=None
+    ):
+        """
+        Run the Stable Diffusion denoising loop (mirrors StableDiffusionPipeline.__call__),
+        yielding after every completed step.
+
+        The loop is spelled out here so consumers can also see the guided
+        noise prediction, which the stock pipeline does not expose.
+
+        Args:
+            prompt: Text prompt, or a list of prompts (one per batch element)
+            negative_prompt: What to avoid in the image (one for all, or one per prompt)
+            num_inference_steps: Number of denoising steps
+            guidance_scale: Classifier-free guidance scale, or a list with one
+                scale per batch element
+            generator: torch.Generator (or None)
+            height, width: Output size in pixels
+            latents: Initial noise of shape (batch, C, height / 8, width / 8)
+                (None = drawn from generator)
+            resume_state: Checkpoint dict ("next_index", "latents", "scheduler_state",
+                "rng_state") to continue an interrupted loop from
+            checkpoint_every: Call on_checkpoint after every N completed steps
+            on_checkpoint: Optional callable(next_index, latents)
+            convergence: Optional ConvergenceMonitor; once it reports the latents
+                have settled, the loop stops and jumps to the predicted clean latents
+
+        Yields:
+            Dict with "loop_index", "step", "timestep" (an int), "latents",
+            "noise_pred", "sample" (the latents noise_pred was predicted for),
+            "prompt_embeds", "converged" (the loop exits after this step), and
+            "final" (last recorded step) - a consumer may replace "latents" to
+            steer the loop
+
+        Returns:
+            List of final PIL Images, one per batch element
+        """
+        pipe = self.pipe
+        pipe.scheduler = self.scheduler
+        device = pipe._execution_device
+
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        batch_size = len(prompts)
+        negative_prompts = [negative_prompt] * batch_size if isinstance(negative_prompt, str) else list(negative_prompt)
+        guidance_scales = [guidance_scale] * batch_size if isinstance(guidance_scale, (int, float)) else list(guidance_scale)
+
+        if len(negative_prompts) != batch_size or len(guidance_scales) != batch_size:
+            raise ValueError("_denoise needs one negative prompt and guidance scale per prompt")
+
+        prompt_embeds, guidance = self._encode_batch(prompts, negative_prompts, guidance_scales)
+
+        # Prepare timesteps and initial noise
+        pipe.scheduler.set_timesteps(num_inference_steps, device=device)
+        timesteps = pipe.scheduler.timesteps
+        # Read back once: converting a device tensor step by step would sync every step
+        timestep_values = timesteps.tolist()
 
-            # Convert to PIL Image
-            image = (image / 2 + 0.5).clamp(0, 1)
-            image = image.cpu().permute(0, 2, 3, 1).numpy()
-            image = (image * 255).round().astype("uint8")
-            pil_image = Image.fromarray(image[0])
+        start_index = 0
+        if resume_state is not None:
+            # Continue exactly where the checkpoint left off
+            start_index = resume_state["next_index"]
+            latents = resume_state["latents"].to(device)
+            pipe.scheduler.__dict__.update(resume_state["scheduler_state"])
+            if generator is not None and resume_state["rng_state"] is not None:
+                generator.set_state(resume_state["rng_state"])
+        else:
+            latents = pipe.prepare_latents(
+                batch_size,
+                pipe.unet.config.in_channels,
+                height,
+                width,
+                prompt_embeds.dtype,
+                device,
+                generator,
+                latents
+            )
+        extra_step_kwargs = pipe.prepare_extra_step_kwargs(generator, 0.0)
+
+        # Denoising loop
+        num_warmup_steps = len(timesteps) - num_inference_steps * pipe.scheduler.order
+        for i, t in enumerate(pipe.progress_bar(timesteps[start_index:]), start_index):
+            noise_pred = self._predict_noise(latents, t, prompt_embeds, guidance)
+
+            # Compute the previous noisy sample x_t -> x_t-1
+            sample = latents
+            latents = pipe.scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
 
-        # Store the image and metadata
-        self.intermediate_images.append(pil_image)
+            # Like the pipeline's step callback, skip scheduler warmup and
+            # intermediate higher-order substeps
+            is_completed_step = i == len(timesteps) - 1 or (
+                (i + 1) > num_warmup_steps and (i + 1) % pipe.scheduler.order == 0
+            )
+            if not is_completed_step:
+                continue
+
+            is_last_step = i == len(timesteps) - 1
+            converged = (
+                convergence is not None and not is_last_step
+                and convergence.update(latents, i // pipe.scheduler.order + 1)
+            )
+
+            state = {
+                "loop_index": i,
+                "step": i // pipe.scheduler.order,
+                "timestep": timestep_values[i],
+                "latents": latents,
+                "noise_pred": noise_pred,
+                "sample": sample,
+                "prompt_embeds": prompt_embeds,
+                "converged": converged,
+                "final": converged or is_last_step
+            }
+            yield state
+            latents = state["latents"]
+
+            if converged:
+                # Skip the remaining steps: jump straight to the clean latents (x0)
+                # estimated from this step's noise prediction
+                latents = predict_original_sample(pipe.scheduler, sample, noise_pred, timestep_values[i])
+                break
+
+            if (
+                on_checkpoint is not None and checkpoint_every
+                and (i // pipe.scheduler.order + 1) % checkpoint_every == 0
+                and i < len(timesteps) - 1
+            ):
+                on_checkpoint(i + 1, latents)
+
+        # Decode the final latents
+        image = vae_decode(pipe.vae, latents / pipe.vae.config.scaling_factor, self.decode_memory_budget)
+        return pipe.image_processor.postprocess(image, output_type="pil")
+
+    def _denoise(
+        self,
+        prompt,
+        negative_prompt,
+        num_inference_steps,
+        guidance_scale,
+        generator,
+        height,
+        width,
+        latents=None,
+        callback_on_step_end=None,
+        callback_on_step_end_tensor_inputs=("latents",)
+    ):
+        """
+        Run the denoising loop to completion with a diffusers-style step callback.
 
-        # Calculate noise variance (approximation)
-        noise_variance = float(latents.std().cpu().numpy())
+        Args:
+            prompt, negative_prompt, num_inference_steps, guidance_scale,
+            generator, height, width, latents: As in _denoise_steps()
+            callback_on_step_end: Optional callable(pipe, step, timestep, callback_kwargs) -> dict
+            callback_on_step_end_tensor_inputs: Tensors passed in callback_kwargs
+                ("latents", "noise_pred", "prompt_embeds")
 
-        # Capture attention maps for this step
-        if self.capture_attention and len(self.attention_store) > 0:
-            # Store attention from this step and clear buffer
-            self.attention_maps.append(self.attention_store.copy())
-            self.attention_store.clear()
+        Returns:
+            List of final PIL Images, one per batch element
+        """
+        steps = self._denoise_steps(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            generator=generator,
+            height=height,
+            width=width,
+            latents=latents
+        )
+
+        try:
+            while True:
+                state = next(steps)
+                if callback_on_step_end is not None:
+                    callback_kwargs = {k: state[k] for k in callback_on_step_end_tensor_inputs}
+                    callback_outputs = callback_on_step_end(self.pipe, state["step"], state["timestep"], callback_kwargs)
+                    state["latents"] = callback_outputs.pop("latents", state["latents"])
+        except StopIteration as stop:
+            return stop.value
+
+    def iter_steps(
+        self,
+        prompt,
+        output_dir=None,
+        num_inference_steps=50,
+        guidance_scale=7.5,
+        seed=None,
+        negative_prompt="",
+        height=512,
+        width=512,
+        preview=False,
+        keyframes=None,
+        checkpoint_every=None,
+        resume=False,
+        early_exit=None
+    ):
+        """
+        Generate a diffusion sequence one step at a time.
+
+        Nothing runs until the stream is iterated. Each completed step yields a
+        StepRecord (index, timestep, latents, stats, attention maps, and a
+        frame decoded on first access), so consumers can process frames online
+        and memory stays constant in the number of steps.
+
+        Args:
+            prompt: Text prompt for generation
+            output_dir: Directory to save the sequence to as it streams
+                (None = only stream; nothing is written and frames are decoded on demand)
+            num_inference_steps, guidance_scale, seed, negative_prompt, height, width,
+            preview, keyframes, checkpoint_every, resume, early_exit: As in generate_sequence
+                (checkpoint_every and resume need an output_dir)
+
+        Returns:
+            StepStream; once exhausted its final_image, frames, and metadata are set
+            (frames is None without an output_dir)
+        """
+        sequences = self._iter_sequences(
+            prompt=prompt,
+            output_dirs=[output_dir],
+            guidance_scales=[guidance_scale],
+            num_inference_steps=num_inference_steps,
+            seed=seed,
+            negative_prompt=negative_prompt,
+            height=height,
+            width=width,
+            preview=preview,
+            keyframes=keyframes,
+            checkpoint_every=checkpoint_every,
+            resume=resume,
+            early_exit=early_exit
+        )
 
-        self.metadata.append({
-            "step": step,
-            "timestep": int(timestep),
-            "noise_variance": noise_variance,
-            "timestamp": datetime.now().isoformat()
-        })
+        def steps():
+            try:
+                while True:
+                    yield next(sequences)[0]
+            except StopIteration as stop:
+                final_image, frames, full_metadata = stop.value[0]
 
-        print(f"  Step {step}: timestep={timestep}, noise_var={noise_variance:.4f}")
+            self.metadata = full_metadata["steps"]
+            return final_image, frames, full_metadata
 
-        return latents  # Return latents for pipeline to continue
+        return StepStream(steps())
 
     def generate_sequence(
         self,
@@ -134,7 +774,12 @@ class DiffusionStepCapture:
         seed=None,
         negative_prompt="",
         height=512,
-        width=512
+        width=512,
+        preview=False,
+        keyframes=None,
+        checkpoint_every=None,
+        resume=False,
+        early_exit=None
     ):
         """
         Generate a complete diffusion sequence with all intermediate steps saved.
@@ -146,99 +791,721 @@ class DiffusionStepCapture:
             guidance_scale: How closely to follow prompt (higher = more literal, can cause oversaturation)
             seed: Random seed for reproducibility
             negative_prompt: What to avoid in the image
+            preview: Save intermediate frames as cheap latent previews instead of VAE decodes
+            keyframes: With preview=True, frames that still get a full VAE decode -
+                an int stride (every Nth frame) or a collection of frame indices.
+                final.png is always VAE decoded.
+            checkpoint_every: Save a resumable checkpoint to phase3_data/ every N steps
+            resume: Continue from a checkpoint in output_dir if one matches these parameters
+            early_exit: Stop once the image has settled - keyword arguments for
+                early_exit.ConvergenceMonitor (tolerance, window, min_steps); the final
+                image then comes from the model's x0 estimate and metadata.json records
+                the exit step. None = run every step
+
+        Returns:
+            (final_image, intermediate_images, metadata) - intermediate images are
+            read back from the saved frames on access
         """
-        # Reset storage
-        self.intermediate_images = []
-        self.metadata = []
-        self.latent_vectors = []
-        self.predicted_noise = []
-        self.attention_maps = []
+        stream = self.iter_steps(
+            prompt=prompt,
+            output_dir=output_dir,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            seed=seed,
+            negative_prompt=negative_prompt,
+            height=height,
+            width=width,
+            preview=preview,
+            keyframes=keyframes,
+            checkpoint_every=checkpoint_every,
+            resume=resume,
+            early_exit=early_exit
+        )
+        final_image, self.intermediate_images, full_metadata = stream.run()
+
+        return final_image, self.intermediate_images, full_metadata
+
+    def generate_guidance_sweep(
+        self,
+        prompt,
+        output_dirs,
+        guidance_scales,
+        num_inference_steps=50,
+        seed=None,
+        negative_prompt="",
+        height=512,
+        width=512,
+        preview=False,
+        keyframes=None,
+        max_batch_size=4,
+        checkpoint_every=None,
+        resume=False,
+        early_exit=None
+    ):
+        """
+        Generate one full sequence per guidance scale in batched denoising loops.
+
+        Every scale starts from the same seed latent, so each sequence is
+        identical to what generate_sequence would produce with that scale -
+        but the UNet runs once per step for the whole sweep.
+
+        Args:
+            prompt: Text prompt shared by the sweep
+            output_dirs: One output directory per guidance scale
+            guidance_scales: Classifier-free guidance scales to sweep
+            num_inference_steps: Number of denoising steps
+            seed: Random seed for the shared initial latent
+            negative_prompt: What to avoid in the images
+            preview, keyframes, checkpoint_every, resume, early_exit: As in generate_sequence
+                (a batch exits once all of its sequences have settled)
+            max_batch_size: Maximum scales per denoising loop (bounds memory)
+
+        Returns:
+            List of (final_image, intermediate_images, metadata) tuples, in scale order
+        """
+        if len(guidance_scales) != len(output_dirs):
+            raise ValueError("generate_guidance_sweep needs one output directory per guidance scale")
+
+        if seed is None:
+            seed = torch.randint(0, 2**32, (1,)).item()
+
+        results = []
+        for start in range(0, len(guidance_scales), max_batch_size):
+            results.extend(self._generate_sequences(
+                prompt=prompt,
+                output_dirs=output_dirs[start:start + max_batch_size],
+                guidance_scales=guidance_scales[start:start + max_batch_size],
+                num_inference_steps=num_inference_steps,
+                seed=seed,
+                negative_prompt=negative_prompt,
+                height=height,
+                width=width,
+                preview=preview,
+                keyframes=keyframes,
+                checkpoint_every=checkpoint_every,
+                resume=resume,
+                early_exit=early_exit,
+                extra_metadata={"guidance_sweep": list(guidance_scales)}
+            ))
+
+        return results
+
+    def _generate_sequences(self, **kwargs):
+        """
+        Generate one full sequence per guidance scale in a single batched denoising loop.
+
+        Args:
+            See _iter_sequences
+
+        Returns:
+            List of (final_image, intermediate_images, metadata) tuples
+        """
+        sequences = self._iter_sequences(**kwargs)
+        try:
+            while True:
+                next(sequences)
+        except StopIteration as stop:
+            return stop.value
+
+    def _iter_sequences(
+        self,
+        prompt,
+        output_dirs,
+        guidance_scales,
+        num_inference_steps,
+        seed,
+        negative_prompt,
+        height,
+        width,
+        preview,
+        keyframes,
+        checkpoint_every=None,
+        resume=False,
+        early_exit=None,
+        fork=None,
+        extra_metadata=None
+    ):
+        """
+        Run one batched denoising loop for several sequences, yielding each step as it completes.
+
+        Args:
+            See generate_sequence; output_dirs and guidance_scales have one entry per sequence.
+                output_dirs=[None] streams a single sequence without saving anything.
+            fork: Branch point prepared by fork_sequence() ("parent_dir", "first_frame",
+                "resume_state"); the loop continues from the parent's state
+            extra_metadata: Additional fields for every sequence's metadata.json
+
+        A checkpoint holds the whole batch (latents, scheduler and RNG state, and
+        each recorder's progress) and is written to every sequence's phase3_data/.
+
+        Yields:
+            List of StepRecords, one per sequence
+
+        Returns:
+            List of (final_image, intermediate_images, metadata) tuples
+        """
+        recording = output_dirs[0] is not None
+        capture_attention = self.capture_attention and "attention" in self.observers
+        self._preview = preview
+        self._keyframes = keyframes if isinstance(keyframes, (int, type(None))) else set(keyframes)
+
+        attention_tokens, attention_word_tokens = self._prompt_token_layout(prompt)
         if self.capture_attention:
-            self.attention_store = []
+            self.attention_store.reset(
+                latent_hw=(height // self.pipe.vae_scale_factor, width // self.pipe.vae_scale_factor),
+                conditional_only=max(guidance_scales) > 1.0,
+                num_tokens=len(attention_tokens)
+            )
 
-        # Create output directory
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
+        # One recorder per sequence, with streamed arrays pre-sized to the captured steps
+        # (a fork only records the steps after its branch point)
+        first_frame = fork["first_frame"] if fork is not None else 0
+        num_captured_steps = self._count_captured_steps(num_inference_steps) - first_frame
+        self._recorders = [] if not recording else [
+            SequenceRecorder(
+                output_dir,
+                num_steps=num_captured_steps,
+                frame_writer=self.frame_writer,
+                vae=self.pipe.vae,
+                decode_mode=self.decode_mode,
+                decode_batch_size=self.decode_batch_size,
+                capture_attention=capture_attention,
+                first_frame=first_frame,
+                decode_memory_budget=self.decode_memory_budget,
+                bounded_memory=self.long_trajectory,
+                renditions=self.frame_renditions
+            )
+            for output_dir in output_dirs
+        ]
 
-        # Create subdirectory for Phase 3 data
-        phase3_dir = output_path / "phase3_data"
-        phase3_dir.mkdir(exist_ok=True)
+        # Everything that must match for a checkpoint to be resumed
+        run_params = {
+            "prompt": prompt,
+            "output_dirs": [str(output_dir) for output_dir in output_dirs],
+            "guidance_scales": list(guidance_scales),
+            "num_inference_steps": num_inference_steps,
+            "seed": seed,
+            "negative_prompt": negative_prompt,
+            "height": height,
+            "width": width,
+            "preview": preview,
+            "keyframes": repr(keyframes),
+            "capture_attention": self.capture_attention,
+            "model_id": self.model_id,
+            "scheduler": type(self.scheduler).__name__,
+            "scheduler_config": self._schedule_config(),
+            "renditions": {rendition.name: rendition.describe() for rendition in self.frame_renditions},
+            "observers": {name: observer.config() for name, observer in self.observers.items()},
+            "early_exit": early_exit,
+            "fork": [fork["parent_dir"], first_frame] if fork is not None else None
+        }
+        checkpoint = self._load_checkpoint(run_params) if resume and recording else None
 
         # Set seed for reproducibility
-        if seed is not None:
-            generator = torch.Generator(device=self.device).manual_seed(seed)
-        else:
-            generator = None
+        if checkpoint is not None:
+            seed = checkpoint["seed"]
+        if seed is None:
             seed = torch.randint(0, 2**32, (1,)).item()
 
+        # Always seeded, so the recorded seed reproduces the run
+        generator = torch.Generator(device=self.device).manual_seed(seed)
+
         print(f"\nGenerating: '{prompt}'")
-        print(f"Steps: {num_inference_steps}, Guidance: {guidance_scale}, Seed: {seed}")
+        print(f"Steps: {num_inference_steps}, Guidance: {', '.join(str(g) for g in guidance_scales)}, Seed: {seed}")
 
-        # Generate with callback
-        # Note: callback is called during denoising loop
-        output = self.pipe(
-            prompt=prompt,
+        for observer in self.observers.values():
+            observer.reset()
+        convergence = ConvergenceMonitor(**early_exit) if early_exit else None
+
+        seed_latent = None
+        resume_state = checkpoint
+        if checkpoint is not None:
+            for recorder, state in zip(self._recorders, checkpoint["recorders"]):
+                recorder.load_state_dict(state)
+            for name, state in checkpoint["observers"].items():
+                self.observers[name].load_state_dict(state)
+            if convergence is not None:
+                convergence.load_state_dict(checkpoint["convergence"])
+            print(f"Resuming from checkpoint after step {first_frame + self._recorders[0].num_frames}")
+        elif fork is not None:
+            resume_state = fork["resume_state"]
+            print(f"Forking after step {first_frame} of {fork['parent_dir']}")
+        else:
+            # Every sequence starts from the same noise
+            seed_latent = self._draw_seed_latent(generator, height, width).repeat(len(output_dirs), 1, 1, 1)
+
+        def save_checkpoint(next_index, latents):
+            self._save_checkpoint(run_params, seed, next_index, latents, generator, convergence)
+
+        steps = self._denoise_steps(
+            prompt=[prompt] * len(output_dirs),
             negative_prompt=negative_prompt,
             num_inference_steps=num_inference_steps,
-            guidance_scale=guidance_scale,
+            guidance_scale=list(guidance_scales),
             generator=generator,
             height=height,
             width=width,
-            callback=self.step_callback,
-            callback_steps=1  # Capture every step
+            latents=seed_latent,
+            resume_state=resume_state,
+            checkpoint_every=checkpoint_every,
+            on_checkpoint=save_checkpoint if recording else None,
+            convergence=convergence
         )
 
-        # Save all intermediate images
-        print(f"\nSaving {len(self.intermediate_images)} intermediate frames...")
-        for i, img in enumerate(self.intermediate_images):
-            img.save(output_path / f"step_{i:04d}.png")
-
-        # Save final image
-        final_image = output.images[0]
-        final_image.save(output_path / "final.png")
-
-        # Save Phase 3 interpretability data
-        print(f"Saving Phase 3 interpretability data...")
-
-        # Save latent vectors
-        if len(self.latent_vectors) > 0:
-            latents_array = np.array(self.latent_vectors)
-            np.save(phase3_dir / "latent_vectors.npy", latents_array)
-            print(f"  ✓ Saved latent vectors: {latents_array.shape}")
-
-        # Save attention maps (if captured)
-        if self.capture_attention and len(self.attention_maps) > 0:
-            # Save as compressed numpy array
-            # Note: attention maps are complex nested structures, we'll save them as pickle for now
-            import pickle
-            with open(phase3_dir / "attention_maps.pkl", "wb") as f:
-                pickle.dump(self.attention_maps, f)
-            print(f"  ✓ Saved attention maps: {len(self.attention_maps)} steps")
-
-        # Save metadata
-        full_metadata = {
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
-            "num_inference_steps": num_inference_steps,
-            "guidance_scale": guidance_scale,
-            "seed": seed,
-            "height": height,
-            "width": width,
-            "generated_at": datetime.now().isoformat(),
-            "steps": self.metadata,
-            "phase3_data_available": {
-                "latent_vectors": len(self.latent_vectors) > 0,
-                "attention_maps": len(self.attention_maps) > 0
+        # Without recorders the step metadata is only kept here
+        step_metadata = [[] for _ in output_dirs]
+        frame_index = first_frame + (self._recorders[0].num_frames if self._recorders else 0)
+        exit_state = None
+
+        # Attention hooks only run for frames an attention observer captures
+        if self.capture_attention:
+            self.attention_store.enabled = capture_attention
+
+        try:
+            while True:
+                for observer in self.observers.values():
+                    observer.before_step(self, frame_index)
+
+                try:
+                    state = next(steps)
+                except StopIteration as stop:
+                    final_images = stop.value
+                    break
+
+                records = self._record_step(state, frame_index, first_frame + num_captured_steps)
+                if state["converged"]:
+                    exit_state = {"exit_step": state["step"], "exit_frame": frame_index}
+                    print(f"  ✓ Converged after step {state['step']}, jumping to the final image")
+                frame_index += 1
+                if not recording:
+                    for metadata, record in zip(step_metadata, records):
+                        metadata.append(record.metadata)
+
+                yield records
+
+            # Decode whatever was deferred, then wait for the frame writer
+            for observer in self.observers.values():
+                observer.run(observer.finish, self, self._recorders, count_step=False)
+            for recorder in self._recorders:
+                recorder.finish_frames()
+            observer_costs = {name: observer.cost() for name, observer in self.observers.items()}
+
+            intermediate_images = [recorder.frames() for recorder in self._recorders]
+            if recording:
+                print(f"\nFinishing {sum(len(images) for images in intermediate_images)} intermediate frames...")
+                self.frame_writer.flush()
+
+            results = []
+            for i, (guidance_scale, final_image) in enumerate(zip(guidance_scales, final_images)):
+                sequence_metadata = {
+                    "prompt": prompt,
+                    "negative_prompt": negative_prompt,
+                    "num_inference_steps": num_inference_steps,
+                    "guidance_scale": guidance_scale,
+                    "seed": seed,
+                    "height": height,
+                    "width": width,
+                    "preview": preview,
+                    "scheduler": type(self.scheduler).__name__,
+                    "scheduler_config": self._schedule_config()
+                }
+                sequence_metadata.update(extra_metadata or {})
+                if convergence is not None:
+                    sequence_metadata["early_exit"] = {
+                        **convergence.config(),
+                        "exit_step": None,
+                        "exit_frame": None,
+                        "skipped_frames": 0,
+                        **(exit_state or {})
+                    }
+                    if exit_state is not None:
+                        sequence_metadata["early_exit"]["skipped_frames"] = (
+                            first_frame + num_captured_steps - 1 - exit_state["exit_frame"]
+                        )
+
+                if recording:
+                    full_metadata = self._recorders[i].save(
+                        final_image, sequence_metadata, attention_tokens, attention_word_tokens, observer_costs
+                    )
+                    results.append((final_image, intermediate_images[i], full_metadata))
+                else:
+                    sequence_metadata.update({
+                        "generated_at": datetime.now().isoformat(),
+                        "steps": step_metadata[i],
+                        "observers": observer_costs
+                    })
+                    results.append((final_image, None, sequence_metadata))
+
+            return results
+        finally:
+            # A stream abandoned early stays resumable from its last checkpoint
+            self._recorders = []
+            if self.capture_attention:
+                self.attention_store.enabled = True
+
+    def fork_sequence(
+        self,
+        parent_dir,
+        fork_step,
+        output_dir,
+        prompt=None,
+        guidance_scale=None,
+        negative_prompt=None,
+        preview=False,
+        keyframes=None,
+        checkpoint_every=None,
+        resume=False,
+        early_exit=None
+    ):
+        """
+        Branch a new generation from an intermediate step of a saved sequence.
+
+        The branch shares the parent's first fork_step + 1 steps: it continues
+        from the parent's stored latents with a new prompt and/or guidance
+        scale, so only the remaining steps are denoised. Shared frames are not
+        copied - metadata.json references the parent's frames instead, and the
+        branch's own frames keep the parent's numbering.
+
+        Args:
+            parent_dir: Sequence directory with phase3_data/latent_vectors.npy
+                and predicted_noise.npy (not itself a fork)
+            fork_step: Index of the last shared frame
+            output_dir: Directory to save the branch
+            prompt: Prompt for the remaining steps (None = parent's prompt)
+            guidance_scale: Guidance for the remaining steps (None = parent's)
+            negative_prompt: Negative prompt for the remaining steps (None = parent's)
+            preview, keyframes, checkpoint_every, resume, early_exit: As in generate_sequence
+
+        Returns:
+            (final_image, intermediate_images, metadata) - intermediate images
+            cover only the steps after the branch point
+        """
+        parent_path = Path(parent_dir)
+        with open(parent_path / "metadata.json", "r") as f:
+            parent = json.load(f)
+
+        # A fork's arrays start at its branch point and its prefix lives in another directory
+        if parent.get("fork"):
+            raise ValueError(
+                f"{parent_path} is itself a fork of {parent['fork']['parent_dir']}; "
+                f"fork the original sequence instead"
+            )
+
+        available = parent.get("phase3_data_available", {})
+        if not (available.get("latent_vectors") and available.get("predicted_noise")):
+            raise ValueError(f"{parent_path} has no stored latents and predicted noise to fork from")
+        if parent.get("observers", {}).get("latents", {}).get("stride", 1) != 1:
+            raise ValueError(f"{parent_path} stored latents only every few steps, so it cannot be forked")
+
+        num_inference_steps = parent["num_inference_steps"]
+        captured_indices = self._captured_step_indices(num_inference_steps)
+        if not 0 <= fork_step < len(captured_indices) - 1:
+            raise ValueError(f"fork_step must be between 0 and {len(captured_indices) - 2}")
+        parent_scheduler = parent.get("scheduler", type(self.scheduler).__name__)
+        if parent_scheduler != type(self.scheduler).__name__:
+            raise ValueError(f"{parent_path} was generated with {parent_scheduler}, not {type(self.scheduler).__name__}")
+        # Metadata from before scheduler_config was recorded only has the class name
+        parent_config = parent.get("scheduler_config", self._schedule_config())
+        if parent_config != self._schedule_config():
+            raise ValueError(
+                f"{parent_path} was generated with scheduler settings {parent_config}, "
+                f"not {self._schedule_config()} (use the same scheduler= as the parent)"
+            )
+        exit_frame = (parent.get("early_exit") or {}).get("exit_frame")
+        if exit_frame is not None and fork_step > exit_frame:
+            raise ValueError(f"{parent_path} exited early after frame {exit_frame}, so fork_step must not exceed it")
+
+        resume_state = self._replay_prefix(parent, parent_path / "phase3_data", captured_indices[:fork_step + 1])
+
+        first_frame = fork_step + 1
+        parent_ref = Path(os.path.relpath(parent_path, output_dir)).as_posix()
+
+        final_image, self.intermediate_images, full_metadata = self._generate_sequences(
+            prompt=parent["prompt"] if prompt is None else prompt,
+            output_dirs=[output_dir],
+            guidance_scales=[parent["guidance_scale"] if guidance_scale is None else guidance_scale],
+            num_inference_steps=num_inference_steps,
+            seed=parent["seed"],
+            negative_prompt=parent["negative_prompt"] if negative_prompt is None else negative_prompt,
+            height=parent["height"],
+            width=parent["width"],
+            preview=preview,
+            keyframes=keyframes,
+            checkpoint_every=checkpoint_every,
+            resume=resume,
+            early_exit=early_exit,
+            fork={"parent_dir": str(parent_path), "first_frame": first_frame, "resume_state": resume_state},
+            extra_metadata={
+                "fork": {
+                    "parent_dir": parent_ref,  # Relative to this sequence's directory
+                    "parent_prompt": parent["prompt"],
+                    "parent_guidance_scale": parent["guidance_scale"],
+                    "fork_step": fork_step,
+                    "first_frame": first_frame,
+                    "prefix_frames": [
+                        f"{parent_ref}/step_{j:04d}.png"
+                        for j in parent.get("frame_indices", range(first_frame))
+                        if j < first_frame
+                    ]
+                }
             }
+        )[0]
+        self.metadata = full_metadata["steps"]
+
+        return final_image, self.intermediate_images, full_metadata
+
+    @torch.no_grad()
+    def _replay_prefix(self, parent, phase3_dir, prefix_indices):
+        """
+        Rebuild the loop state a saved sequence had after its first captured steps.
+
+        Multistep schedulers (like the default PNDM) keep a history of noise
+        predictions, so the stored latents alone are not enough to continue.
+        The scheduler is stepped with the parent's stored noise predictions
+        instead of running the UNet; only loop iterations the parent never
+        captured (e.g. PNDM's warmup step) are recomputed. After every captured
+        step the latents are reset to the stored ones.
+
+        Args:
+            parent: Parent metadata dict
+            phase3_dir: Parent's phase3_data directory
+            prefix_indices: Loop indices of the shared captured steps
+
+        Returns:
+            Resume state for _denoise ("next_index", "latents", "scheduler_state", "rng_state")
+        """
+        pipe = self.pipe
+        pipe.scheduler = self.scheduler
+        device = pipe._execution_device
+        dtype = pipe.text_encoder.dtype
+
+        stored_latents = np.load(phase3_dir / "latent_vectors.npy", mmap_mode="r")
+        stored_noise = np.load(phase3_dir / "predicted_noise.npy", mmap_mode="r")
+        captured_frames = {loop_index: frame for frame, loop_index in enumerate(prefix_indices)}
+
+        # Same initial noise as the parent
+        generator = torch.Generator(device=self.device).manual_seed(parent["seed"])
+        latents = self._draw_seed_latent(generator, parent["height"], parent["width"])
+
+        pipe.scheduler.set_timesteps(parent["num_inference_steps"], device=device)
+        latents = latents * pipe.scheduler.init_noise_sigma
+        extra_step_kwargs = pipe.prepare_extra_step_kwargs(generator, 0.0)
+
+        conditioning = None
+        if self.capture_attention:
+            self.attention_store.enabled = False
+
+        try:
+            for i, t in enumerate(pipe.scheduler.timesteps[:prefix_indices[-1] + 1]):
+                if i in captured_frames:
+                    noise_pred = torch.from_numpy(np.array(stored_noise[captured_frames[i]])).to(device, dtype)
+                else:
+                    if conditioning is None:
+                        conditioning = self._encode_batch(
+                            [parent["prompt"]], [parent["negative_prompt"]], [parent["guidance_scale"]]
+                        )
+                    noise_pred = self._predict_noise(latents, t, *conditioning)
+
+                latents = pipe.scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+                if i in captured_frames:
+                    latents = torch.from_numpy(np.array(stored_latents[captured_frames[i]])).to(device, dtype)
+        finally:
+            if self.capture_attention:
+                self.attention_store.enabled = True
+
+        return {
+            "next_index": prefix_indices[-1] + 1,
+            "latents": latents,
+            "scheduler_state": dict(vars(pipe.scheduler)),
+            "rng_state": generator.get_state()
         }
 
-        with open(output_path / "metadata.json", "w") as f:
-            json.dump(full_metadata, f, indent=2)
+    def _save_checkpoint(self, run_params, seed, next_index, latents, generator, convergence=None):
+        """
+        Write a resumable checkpoint of the running generation.
 
-        print(f"✓ Sequence saved to: {output_path}")
-        print(f"✓ Phase 3 data saved to: {phase3_dir}")
+        Deferred statistics, transfers, and frames are completed first, so every
+        step the checkpoint counts as recorded is complete on disk.
 
-        return final_image, self.intermediate_images, full_metadata
+        Args:
+            run_params: Parameters identifying the run (see _generate_sequences)
+            seed: Seed actually used
+            next_index: Index into the scheduler's timesteps to continue from
+            latents: Current batch latents
+            generator: torch.Generator of the run (or None)
+            convergence: ConvergenceMonitor of the run (or None)
+        """
+        for observer in self.observers.values():
+            observer.run(observer.flush, count_step=False)
+        for recorder in self._recorders:
+            recorder.drain_frames()
+        self.frame_writer.flush()
+
+        checkpoint = {
+            "run_params": run_params,
+            "seed": seed,
+            "next_index": next_index,
+            "latents": latents.detach().cpu(),
+            "scheduler_state": dict(vars(self.scheduler)),
+            "rng_state": generator.get_state() if generator is not None else None,
+            "recorders": [recorder.state_dict() for recorder in self._recorders],
+            "observers": {name: observer.state_dict() for name, observer in self.observers.items()},
+            "convergence": convergence.state_dict() if convergence is not None else None,
+            "saved_at": datetime.now().isoformat()
+        }
+
+        for recorder in self._recorders:
+            write_atomic(recorder.checkpoint_path, lambda tmp_path: torch.save(checkpoint, tmp_path))
+
+        print(f"  ↺ Checkpoint saved after step {self._recorders[0].first_frame + self._recorders[0].num_frames}")
+
+    def _load_checkpoint(self, run_params):
+        """
+        Find a checkpoint every active recorder can resume from.
+
+        Args:
+            run_params: Parameters of the requested run (see _generate_sequences)
+
+        Returns:
+            Checkpoint dict, or None if there is no matching checkpoint
+        """
+        checkpoint_paths = [recorder.checkpoint_path for recorder in self._recorders]
+        if not all(path.exists() for path in checkpoint_paths):
+            return None
+
+        # Loaded on the CPU, since the RNG state must stay there
+        checkpoint = torch.load(checkpoint_paths[0], map_location="cpu", weights_only=False)
+        if checkpoint["run_params"] != run_params:
+            print("Ignoring checkpoint from a run with different parameters")
+            return None
+
+        def to_device(value):
+            if torch.is_tensor(value):
+                return value.to(self.pipe._execution_device)
+            if isinstance(value, (list, tuple)):
+                return type(value)(to_device(v) for v in value)
+            return value
+
+        checkpoint["scheduler_state"] = {k: to_device(v) for k, v in checkpoint["scheduler_state"].items()}
+
+        return checkpoint
+
+    def generate_batch(
+        self,
+        prompts,
+        output_dirs,
+        num_inference_steps=50,
+        guidance_scale=7.5,
+        seed=None,
+        negative_prompt="",
+        height=512,
+        width=512,
+        max_batch_size=4
+    ):
+        """
+        Generate several prompts from one shared seed latent in batched denoising loops.
+
+        Every prompt starts from the same initial noise, so results are directly
+        comparable (e.g. for token ablations). Only final images and step metadata
+        are saved - intermediate frames are skipped to keep batches cheap.
+
+        Args:
+            prompts: List of text prompts
+            output_dirs: One output directory per prompt
+            num_inference_steps: Number of denoising steps
+            guidance_scale: Classifier-free guidance scale shared by the batch
+            seed: Random seed for the shared initial latent
+            negative_prompt: What to avoid in the images
+            max_batch_size: Maximum prompts per denoising loop (bounds memory)
+
+        Returns:
+            List of final PIL Images, in prompt order
+        """
+        if len(prompts) != len(output_dirs):
+            raise ValueError("generate_batch needs one output directory per prompt")
+
+        if seed is None:
+            seed = torch.randint(0, 2**32, (1,)).item()
+
+        # Draw the seed latent exactly as the pipeline would for a single image
+        generator = torch.Generator(device=self.device).manual_seed(seed)
+        seed_latent = self._draw_seed_latent(generator, height, width)
+
+        print(f"\nGenerating {len(prompts)} prompts in batches of up to {max_batch_size}")
+        print(f"Steps: {num_inference_steps}, Guidance: {guidance_scale}, Seed: {seed}")
+
+        final_images = []
+
+        # Batched runs do not record attention
+        if self.capture_attention:
+            self.attention_store.enabled = False
+
+        try:
+            for start in range(0, len(prompts), max_batch_size):
+                batch_prompts = prompts[start:start + max_batch_size]
+                batch_size = len(batch_prompts)
+                step_metadata = [[] for _ in range(batch_size)]
+
+                def batch_callback(pipe, step, timestep, callback_kwargs):
+                    """Record per-sample step statistics for the batch."""
+                    noise_variances = callback_kwargs["latents"].flatten(1).std(dim=1).cpu().tolist()
+                    timestamp = datetime.now().isoformat()
+                    for i, noise_variance in enumerate(noise_variances):
+                        step_metadata[i].append({
+                            "step": step,
+                            "timestep": int(timestep),
+                            "noise_variance": noise_variance,
+                            "timestamp": timestamp
+                        })
+                    return callback_kwargs
+
+                print(f"  Batch {start // max_batch_size + 1}: {batch_size} prompts")
+
+                images = self._denoise(
+                    prompt=batch_prompts,
+                    negative_prompt=negative_prompt,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    generator=generator,
+                    height=height,
+                    width=width,
+                    latents=seed_latent.repeat(batch_size, 1, 1, 1),
+                    callback_on_step_end=batch_callback
+                )
+
+                for i, (prompt, image) in enumerate(zip(batch_prompts, images)):
+                    output_path = Path(output_dirs[start + i])
+                    output_path.mkdir(parents=True, exist_ok=True)
+                    image.save(output_path / "final.png")
+
+                    full_metadata = {
+                        "prompt": prompt,
+                        "negative_prompt": negative_prompt,
+                        "num_inference_steps": num_inference_steps,
+                        "guidance_scale": guidance_scale,
+                        "seed": seed,
+                        "height": height,
+                        "width": width,
+                        "generated_at": datetime.now().isoformat(),
+                        "batched": True,
+                        "steps": step_metadata[i],
+                        "phase3_data_available": {
+                            "latent_vectors": False,
+                            "attention_maps": False
+                        }
+                    }
+
+                    write_json_atomic(output_path / "metadata.json", full_metadata)
+
+                    final_images.append(image)
+        finally:
+            if self.capture_attention:
+                self.attention_store.enabled = True
+
+        print(f"✓ Saved {len(final_images)} batched sequences")
+
+        return final_images
 
 
 def main():
@@ -302,6 +1569,8 @@ def main():
         seed=42
     )
 
+    generator.close(evict=True)
+
     print("\n" + "="*60)
     print("All experiments complete!")
     print("="*60)
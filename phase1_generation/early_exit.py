@@ -0,0 +1,111 @@
+"""
+Early Exit
+Phase 1: Stop denoising once the image has settled
+
+Late denoising steps often barely move the latents. The convergence monitor
+tracks the relative latent change of every completed step (the online
+version of NoiseDecompositionAnalyzer.compute_step_changes); once it has
+stayed below a tolerance for a window of steps, the loop stops and jumps
+straight to the model's estimate of the clean latents (x0).
+"""
+
+import torch
+
+
+class ConvergenceMonitor:
+    def __init__(self, tolerance=0.01, window=3, min_steps=0):
+        """
+        Initialize the monitor.
+
+        Args:
+            tolerance: Relative latent change per step (||x_t - x_t-1|| / ||x_t-1||)
+                below which a step counts as settled
+            window: Consecutive settled steps needed to exit
+            min_steps: Never exit before this many completed steps
+        """
+        self.tolerance = tolerance
+        self.window = max(1, window)
+        self.min_steps = min_steps
+        self.reset()
+
+    def reset(self):
+        """Start monitoring a new generation."""
+        self.previous = None
+        self.settled_steps = 0
+        self.last_change = None
+
+    def config(self):
+        """Settings for metadata.json (a checkpoint only resumes with the same settings)."""
+        return {"tolerance": self.tolerance, "window": self.window, "min_steps": self.min_steps}
+
+    def update(self, latents, num_completed_steps):
+        """
+        Record one completed step.
+
+        The change and the count of settled steps stay on the device; they
+        are read back (one sync per step) only from min_steps on, when the
+        answer can be True.
+
+        Args:
+            latents: Batch latents after the step (the largest change in the batch counts)
+            num_completed_steps: Completed steps so far, including this one
+
+        Returns:
+            True if generation can stop here
+        """
+        latents = latents.detach().float()
+
+        if self.previous is not None:
+            previous = self.previous.to(latents.device)
+            change = (latents - previous).flatten(1).norm(dim=1) / previous.flatten(1).norm(dim=1).clamp_min(1e-8)
+            self.last_change = change.max()
+            self.settled_steps = (self.settled_steps + 1) * (self.last_change < self.tolerance)
+        self.previous = latents.clone()
+
+        return num_completed_steps >= self.min_steps and int(self.settled_steps) >= self.window
+
+    def state_dict(self):
+        """Describe the monitor's progress, for a checkpoint."""
+        return {
+            "previous": self.previous.cpu() if self.previous is not None else None,
+            "settled_steps": int(self.settled_steps),
+            "last_change": float(self.last_change) if self.last_change is not None else None
+        }
+
+    def load_state_dict(self, state):
+        """Continue monitoring from a checkpointed state_dict()."""
+        self.previous = state["previous"]
+        self.settled_steps = state["settled_steps"]
+        self.last_change = state["last_change"]
+
+
+def predict_original_sample(scheduler, sample, noise_pred, timestep):
+    """
+    Estimate the clean latents x0 from a noisy sample and the model's prediction.
+
+    Depends on what the model predicts (scheduler.config.prediction_type):
+    - "epsilon" (SD 1.x): x0 = (x_t - sqrt(1 - alpha_bar_t) * eps) / sqrt(alpha_bar_t)
+    - "v_prediction" (SD 2.x 768px): x0 = sqrt(alpha_bar_t) * x_t - sqrt(1 - alpha_bar_t) * v
+    - "sample": the prediction is x0
+
+    Args:
+        scheduler: The pipeline's scheduler (provides alphas_cumprod and the prediction type)
+        sample: Latents the noise was predicted for (x_t)
+        noise_pred: Guided model output for sample at timestep
+        timestep: Scheduler timestep of sample
+
+    Returns:
+        Tensor shaped like sample
+    """
+    prediction_type = getattr(scheduler.config, "prediction_type", "epsilon")
+    if prediction_type == "sample":
+        return noise_pred.to(sample.dtype)
+
+    alpha_prod = scheduler.alphas_cumprod.to(sample.device)[int(timestep)].to(torch.float32)
+    if prediction_type == "epsilon":
+        x0 = (sample.float() - (1 - alpha_prod).sqrt() * noise_pred.float()) / alpha_prod.sqrt()
+    elif prediction_type == "v_prediction":
+        x0 = alpha_prod.sqrt() * sample.float() - (1 - alpha_prod).sqrt() * noise_pred.float()
+    else:
+        raise ValueError(f"Cannot estimate x0 for prediction_type {prediction_type!r}")
+    return x0.to(sample.dtype)
@@ -0,0 +1,177 @@
+"""
+Frame Writer
+Phase 1: Encode and save step frames on a worker pool while generation runs
+
+PNG encoding (zlib compression) is slow enough that saving 50 frames in a
+serial loop after the pipeline returns adds a noticeable stall. The frame
+writer hands each frame to a thread pool as soon as it is produced, so
+compression overlaps with denoising. A bounded number of in-flight frames
+provides backpressure if encoding falls behind.
+
+Besides the lossless master, each frame can be written in smaller or lossy
+renditions (a thumbnail, a WebP preview, ...) in the same worker job, so
+viewers and analyzers can load only the resolution they need.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+
+# File extension per PIL format
+RENDITION_EXTENSIONS = {"PNG": ".png", "WEBP": ".webp", "JPEG": ".jpg"}
+
+
+class FrameRendition:
+    def __init__(self, name, max_size=None, format="WEBP", quality=80):
+        """
+        An extra encoding of every saved frame.
+
+        Renditions are written to renditions/<name>/ next to the frame, with the
+        frame's file name and the format's extension (e.g. renditions/thumb/step_0003.webp).
+
+        Args:
+            name: Rendition name (directory and metadata key)
+            max_size: Longest side in pixels (None = full size)
+            format: "WEBP", "JPEG", or "PNG"
+            quality: Encoder quality for lossy formats (0-100)
+        """
+        format = format.upper()
+        if format not in RENDITION_EXTENSIONS:
+            raise ValueError(f"Unsupported rendition format: {format}")
+
+        self.name = name
+        self.max_size = max_size
+        self.format = format
+        self.quality = quality
+
+    @property
+    def directory(self):
+        """Directory of this rendition, relative to the sequence directory."""
+        return Path("renditions") / self.name
+
+    def path(self, frame_path):
+        """Where the rendition of a frame saved at frame_path goes."""
+        frame_path = Path(frame_path)
+        return frame_path.parent / self.directory / (frame_path.stem + RENDITION_EXTENSIONS[self.format])
+
+    def render(self, image):
+        """Resize a frame to this rendition's size (the frame itself if it already fits)."""
+        if self.max_size is None or max(image.size) <= self.max_size:
+            return image
+        scale = self.max_size / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    def save(self, image, frame_path):
+        """Encode the rendition of a frame."""
+        save_kwargs = {"format": self.format}
+        if self.format == "PNG":
+            save_kwargs["compress_level"] = 6
+        else:
+            save_kwargs["quality"] = self.quality
+        self.render(image).save(self.path(frame_path), **save_kwargs)
+
+    def describe(self):
+        """
+        Describe the rendition for metadata.json.
+
+        Returns:
+            JSON-serializable dict
+        """
+        return {
+            "directory": self.directory.as_posix(),
+            "extension": RENDITION_EXTENSIONS[self.format],
+            "format": self.format,
+            "max_size": self.max_size,
+            "quality": self.quality if self.format != "PNG" else None
+        }
+
+
+# A 64px thumbnail for timelines, a full-size lossy preview for the viewer, and a
+# 256px frame for CLIP-based analysis (which works at 224px)
+STANDARD_RENDITIONS = (
+    FrameRendition("thumb", max_size=64, format="WEBP", quality=70),
+    FrameRendition("preview", max_size=None, format="WEBP", quality=80),
+    FrameRendition("analysis", max_size=256, format="WEBP", quality=90)
+)
+
+
+class FrameWriter:
+    def __init__(self, max_workers=4, max_pending=16, compress_level=6):
+        """
+        Initialize the frame writer.
+
+        Args:
+            max_workers: Number of encoder threads
+            max_pending: Maximum frames queued or encoding at once (submit blocks beyond this)
+            compress_level: PNG zlib compression level (0-9, lower = faster, larger files)
+        """
+        self.compress_level = compress_level
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._num_done = 0  # Saved frames already dropped from _futures since the last flush
+        self._lock = threading.Lock()
+
+    def _save(self, image, path, renditions, save_kwargs):
+        """Encode one frame (and its renditions) to disk and free its slot."""
+        try:
+            image.save(path, **save_kwargs)
+            for rendition in renditions:
+                rendition.save(image, path)
+        finally:
+            self._slots.release()
+
+    def submit(self, image, path, renditions=(), **save_kwargs):
+        """
+        Queue a frame for saving. Blocks while max_pending frames are in flight.
+
+        Args:
+            image: PIL Image
+            path: Output file path
+            renditions: FrameRenditions to write alongside (their directories must exist)
+            **save_kwargs: Extra arguments for PIL's Image.save
+        """
+        if str(path).endswith(".png"):
+            save_kwargs.setdefault("compress_level", self.compress_level)
+
+        self._slots.acquire()
+        future = self._executor.submit(self._save, image, path, tuple(renditions), save_kwargs)
+
+        with self._lock:
+            # Drop frames that are already saved, so long runs don't accumulate futures
+            # (errors are still raised, here or from flush())
+            done, pending = [], []
+            for f in self._futures:
+                (done if f.done() else pending).append(f)
+            self._futures = pending + [future]
+            self._num_done += len(done)
+        for done_future in done:
+            done_future.result()
+
+    def flush(self):
+        """
+        Wait until every submitted frame is on disk.
+
+        Returns:
+            Number of frames written since the last flush
+        """
+        with self._lock:
+            futures = self._futures
+            num_done = self._num_done
+            self._futures = []
+            self._num_done = 0
+
+        for future in futures:
+            future.result()  # Re-raises any encoding error
+
+        return num_done + len(futures)
+
+    def close(self):
+        """Flush pending frames and shut down the worker pool."""
+        self.flush()
+        self._executor.shutdown(wait=True)
@@ -3,9 +3,11 @@ Fake News Themed Generation Script - All Modes
 Generates each theme in 4 different modes: standard, low steps, high guidance, paradox
 """
 
+import argparse
 import sys
 from pathlib import Path
-from diffusion_step_generator import DiffusionStepCapture
+from frame_writer import STANDARD_RENDITIONS
+from matrix_scheduler import MatrixScheduler
 
 
 # Define all fake news themes
@@ -67,51 +69,168 @@ MODES = {
 }
 
 
+def build_scheduler(base_output, workers=1, device="mps", force=False, checkpoint_every=10, observer_strides=None,
+                    adaptive_frames=None, early_exit=None, decode_memory_budget=None, frame_renditions=None):
+    """
+    Queue every theme × mode combination on a MatrixScheduler.
+
+    Args:
+        base_output: Directory for the generated sequences
+        workers: Number of worker processes
+        device: Device for each worker's pipeline
+        force: Regenerate sequences that are already complete
+        checkpoint_every: Save a resumable checkpoint every N steps (None = never)
+        observer_strides: Capture stride per step observer, e.g. {"attention": 0} (see step_observers.py)
+        adaptive_frames: AdaptiveFrameObserver settings, e.g. {"threshold": 0.05} (None = save every frame)
+        early_exit: ConvergenceMonitor settings, e.g. {"tolerance": 0.01} (None = run every step)
+        decode_memory_budget: Bytes a VAE decode may use before it is tiled (None = no limit)
+        frame_renditions: Extra encodings of every step frame (frame_writer.FrameRendition list)
+
+    Returns:
+        MatrixScheduler with one job per sequence
+    """
+    scheduler = MatrixScheduler(
+        base_output,
+        workers=workers,
+        generator_kwargs={
+            "device": device,
+            # Prompt embeddings persist on disk, so reruns skip the text encoder
+            "prompt_cache_dir": Path(".prompt_cache"),
+            "observer_strides": observer_strides,
+            "adaptive_frames": adaptive_frames,
+            "decode_memory_budget": decode_memory_budget,
+            "frame_renditions": frame_renditions
+        },
+        force=force,
+        checkpoint_every=checkpoint_every
+    )
+
+    for theme_id, theme_data in THEMES.items():
+        for mode_id, mode_data in MODES.items():
+            # Special handling for paradox mode - add contradictory terms
+            prompt = theme_data["prompt"]
+            if mode_id == "paradox":
+                # Add paradoxical modifiers
+                paradox_suffix = ", simultaneously existing and non-existing, visible invisibility"
+                prompt = prompt + paradox_suffix
+
+            params = {
+                "prompt": prompt,
+                "num_inference_steps": mode_data["steps"],
+                "guidance_scale": mode_data["guidance"],
+                "seed": theme_data["seed"]
+            }
+            if early_exit:
+                params["early_exit"] = early_exit
+
+            scheduler.add_job(
+                f"fakenews_{theme_id}_{mode_id}",
+                params=params,
+                description=f"{theme_data['name']} - {mode_data['description']}"
+            )
+
+    return scheduler
+
+
 def main():
     """
     Generate all combinations of themes × modes
     Total: 6 themes × 4 modes = 24 sequences
+
+    Completed sequences are skipped, so an interrupted run can simply be restarted.
+    Modes that differ only in guidance scale (standard and high_guidance) are
+    generated together in one batched denoising loop.
     """
+    parser = argparse.ArgumentParser(
+        description="Generate every fake news theme in every mode"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes (CPU threads are split between them)"
+    )
+    parser.add_argument(
+        "--device",
+        default="mps",
+        choices=["cuda", "mps", "cpu"],
+        help="Device for generation"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate sequences that are already complete"
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=10,
+        help="Checkpoint each sequence every N steps so interrupted runs resume mid-sequence (0 = off)"
+    )
+    parser.add_argument(
+        "--stride",
+        action="append",
+        default=[],
+        metavar="OBSERVER=N",
+        help="Capture a step observer (latents, frames, x0_frames, stats, attention) only every N steps (0 = off)"
+    )
+    parser.add_argument(
+        "--adaptive-frames",
+        type=float,
+        metavar="THRESHOLD",
+        help="Only save a frame once the latents changed by this much (relative) since the last saved one"
+    )
+    parser.add_argument(
+        "--early-exit",
+        type=float,
+        metavar="TOLERANCE",
+        help="Stop a sequence once its latents change by less than this much (relative) per step"
+    )
+    parser.add_argument(
+        "--decode-memory",
+        type=int,
+        metavar="MB",
+        help="Memory budget for a VAE decode; larger decodes are split into tiles (default: no limit)"
+    )
+    parser.add_argument(
+        "--renditions",
+        action="store_true",
+        help="Also save a 64px WebP thumbnail, a WebP preview, and a 256px analysis WebP of every step frame"
+    )
+    args = parser.parse_args()
+
+    observer_strides = {}
+    for option in args.stride:
+        name, _, stride = option.partition("=")
+        if not stride.isdigit():
+            parser.error(f"--stride expects OBSERVER=N, got {option!r}")
+        observer_strides[name] = int(stride)
 
-    # Initialize generator
-    generator = DiffusionStepCapture(device="mps")
     base_output = Path("../assets/generated_sequences")
+    scheduler = build_scheduler(
+        base_output,
+        workers=args.workers,
+        device=args.device,
+        force=args.force,
+        checkpoint_every=args.checkpoint_every or None,
+        observer_strides=observer_strides,
+        adaptive_frames={"threshold": args.adaptive_frames} if args.adaptive_frames else None,
+        early_exit={"tolerance": args.early_exit} if args.early_exit else None,
+        decode_memory_budget=args.decode_memory * 2**20 if args.decode_memory else None,
+        frame_renditions=STANDARD_RENDITIONS if args.renditions else None
+    )
 
     total_sequences = len(THEMES) * len(MODES)
-    current = 0
 
     print("\n" + "="*70)
     print(f"GENERATING {total_sequences} FAKE NEWS SEQUENCES")
     print(f"{len(THEMES)} themes × {len(MODES)} modes")
     print("="*70)
 
-    for theme_id, theme_data in THEMES.items():
-        for mode_id, mode_data in MODES.items():
-            current += 1
-
-            # Create output directory name
-            output_dir = base_output / f"fakenews_{theme_id}_{mode_id}"
-
-            # Special handling for paradox mode - add contradictory terms
-            prompt = theme_data["prompt"]
-            if mode_id == "paradox":
-                # Add paradoxical modifiers
-                paradox_suffix = ", simultaneously existing and non-existing, visible invisibility"
-                prompt = prompt + paradox_suffix
-
-            print(f"\n[{current}/{total_sequences}] {theme_data['name']} - {mode_data['description']}")
-            print("="*70)
-
-            generator.generate_sequence(
-                prompt=prompt,
-                output_dir=output_dir,
-                num_inference_steps=mode_data["steps"],
-                guidance_scale=mode_data["guidance"],
-                seed=theme_data["seed"]
-            )
+    summary = scheduler.run()
 
     print("\n" + "="*70)
-    print("✓ ALL 24 SEQUENCES GENERATED")
+    print(f"✓ {summary['done']} GENERATED, {summary['skipped']} ALREADY COMPLETE, {summary['failed']} FAILED")
     print("="*70)
     print("\nThemes generated:")
     for theme_id, theme_data in THEMES.items():
@@ -119,8 +238,16 @@ def main():
     print("\nModes for each theme:")
     for mode_id, mode_data in MODES.items():
         print(f"  - {mode_id}: {mode_data['description']}")
+    print(f"\nJob manifest: {scheduler.manifest_path}")
+
+    # Imported here: the manifest builder reads THEMES and MODES from this module
+    from build_sequence_manifest import MANIFEST_FILENAME, build_manifest
+    manifest_counts = build_manifest(base_output)
+    print(f"Viewer manifest: {base_output / MANIFEST_FILENAME} ({manifest_counts['added']} new sequences)")
     print("\nRefresh your web viewer to see them!")
 
+    sys.exit(1 if summary["failed"] else 0)
+
 
 if __name__ == "__main__":
     main()
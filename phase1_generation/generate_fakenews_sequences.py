@@ -92,6 +92,8 @@ def main():
         seed=161718
     )
 
+    generator.close(evict=True)
+
     print("\n" + "="*60)
     print("✓ ALL FAKE NEWS SEQUENCES GENERATED")
     print("="*60)
@@ -0,0 +1,81 @@
+"""
+Host Transfer
+Phase 1: Copy per-step tensors off the accelerator without stalling the loop
+
+A blocking .cpu() inside the denoising loop waits for every queued kernel
+to finish before the next step can be launched. On CUDA, tensors are instead
+copied into pinned host buffers with non_blocking=True, and an event marks
+when each copy has landed; results are handed on once their event has
+fired, or all at once when the queue is drained (before checkpoints and at
+the end of a run). On CPU the tensor already lives on the host, and on MPS
+there is no pinned memory, so both fall back to an immediate copy.
+"""
+
+from collections import deque
+
+import torch
+
+
+class HostTransferQueue:
+    def __init__(self, max_pending=16):
+        """
+        Initialize the transfer queue.
+
+        Args:
+            max_pending: Copies in flight before submit() waits for the oldest
+                (bounds the pinned memory in use)
+        """
+        self.max_pending = max(1, max_pending)
+
+        self._pending = deque()
+        self._free_buffers = {}
+
+    def submit(self, tensor, on_ready):
+        """
+        Copy a tensor to the host and pass it on once the copy is complete.
+
+        Callbacks run in submission order.
+
+        Args:
+            tensor: Tensor to copy
+            on_ready: Callable(numpy array) receiving the host copy
+        """
+        tensor = tensor.detach()
+        if tensor.device.type != "cuda":
+            self.drain()
+            on_ready(tensor.cpu().numpy())
+            return
+
+        host = self._buffer(tensor)
+        host.copy_(tensor, non_blocking=True)
+        event = torch.cuda.Event()
+        event.record()
+        self._pending.append((event, host, on_ready))
+
+        self.poll()
+        while len(self._pending) > self.max_pending:
+            self._complete_oldest()
+
+    def _buffer(self, tensor):
+        """Reuse a pinned host buffer of the right shape and dtype."""
+        free = self._free_buffers.get((tuple(tensor.shape), tensor.dtype))
+        if free:
+            return free.pop()
+        return torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+
+    def _complete_oldest(self):
+        """Wait for the oldest copy and hand it on."""
+        event, host, on_ready = self._pending.popleft()
+        event.synchronize()
+        on_ready(host.numpy())
+        self._free_buffers.setdefault((tuple(host.shape), host.dtype), []).append(host)
+
+    def poll(self):
+        """Hand on every copy that has already completed, without waiting."""
+        while self._pending and self._pending[0][0].query():
+            self._complete_oldest()
+
+    def drain(self):
+        """Wait for all copies in flight and hand them on."""
+        while self._pending:
+            self._complete_oldest()
@@ -0,0 +1,420 @@
+"""
+Latent Decoding
+Phase 1: Turn captured latents into images outside the denoising loop
+
+Decoding every step through the VAE inside the pipeline callback stalls the
+UNet loop - on CPU a VAE decode costs about as much as a denoising step.
+The deferred decoder lets the callback just record latents; decoding then
+happens in batches, either after generation or on a background worker.
+
+For scrubbing previews, the latent preview decoder skips the VAE entirely:
+a linear 4->3 channel projection plus upsampling gives a rough RGB frame at
+a tiny fraction of the cost.
+
+At high resolutions a single VAE decode needs more memory than the UNet
+steps themselves (the decoder's full-resolution activations and the
+mid-block self-attention over every latent pixel). Given a memory budget,
+decodes are split into overlapping latent tiles whose size is picked to fit
+the budget, and the decoded tiles are blended with linear ramps across the
+overlap so no seams show.
+"""
+
+import queue
+import threading
+
+import torch
+from PIL import Image
+
+
+# Smallest latent tile tried before splitting the batch instead (64x64 pixels for SD)
+MIN_TILE_SIZE = 8
+
+
+def estimate_decode_memory(vae, batch_size, latent_height, latent_width):
+    """
+    Estimate the peak memory of one VAE decode call.
+
+    Counts the two dominant terms: the decoder's activations at full
+    resolution (a few tensors of the first decoder block's width) and the
+    mid-block self-attention scores over all latent pixels. A deliberately
+    conservative estimate - it only has to keep decodes inside the budget.
+
+    Args:
+        vae: The pipeline's AutoencoderKL
+        batch_size: Latents decoded per call
+        latent_height, latent_width: Latent size of the decoded region
+
+    Returns:
+        Estimated bytes
+    """
+    element_size = torch.finfo(vae.dtype).bits // 8
+    scale = 2 ** (len(vae.config.block_out_channels) - 1)
+    num_pixels = latent_height * scale * latent_width * scale
+    num_tokens = latent_height * latent_width
+
+    activations = 6 * vae.config.block_out_channels[0] * num_pixels * element_size
+    attention = 2 * num_tokens * num_tokens * element_size
+
+    return batch_size * (activations + attention)
+
+
+def plan_tiles(vae, batch_size, latent_height, latent_width, memory_budget):
+    """
+    Pick a decode plan that fits a memory budget.
+
+    Args:
+        vae: The pipeline's AutoencoderKL
+        batch_size: Latents to decode
+        latent_height, latent_width: Latent size
+        memory_budget: Bytes a decode may use (None = no limit)
+
+    Returns:
+        (tile_size, sub_batch_size) - tile_size is None when whole latents fit
+    """
+    if memory_budget is None:
+        return None, batch_size
+
+    for sub_batch_size in range(batch_size, 0, -1):
+        if estimate_decode_memory(vae, sub_batch_size, latent_height, latent_width) <= memory_budget:
+            return None, sub_batch_size
+
+    # Largest square tile (in steps of MIN_TILE_SIZE) that fits for a single latent
+    tile_size = (max(latent_height, latent_width) // MIN_TILE_SIZE) * MIN_TILE_SIZE
+    while tile_size > MIN_TILE_SIZE and estimate_decode_memory(vae, 1, tile_size, tile_size) > memory_budget:
+        tile_size -= MIN_TILE_SIZE
+    tile_size = max(MIN_TILE_SIZE, tile_size)
+
+    sub_batch_size = 1
+    while (
+        sub_batch_size < batch_size
+        and estimate_decode_memory(vae, sub_batch_size + 1, tile_size, tile_size) <= memory_budget
+    ):
+        sub_batch_size += 1
+
+    return tile_size, sub_batch_size
+
+
+def _tile_starts(size, tile_size, stride):
+    """Start offsets of tiles covering size, the last one flush with the end."""
+    if size <= tile_size:
+        return [0]
+    starts = list(range(0, size - tile_size, stride))
+    return starts + [size - tile_size]
+
+
+def _blend_ramp(length, overlap, ramp_start, ramp_end, device):
+    """1D blending weights: linear ramps over the overlap on sides that meet another tile."""
+    weights = torch.ones(length, device=device)
+    ramp = torch.arange(1, overlap + 1, device=device, dtype=torch.float32) / (overlap + 1)
+    if ramp_start and overlap:
+        weights[:overlap] = ramp
+    if ramp_end and overlap:
+        weights[-overlap:] = ramp.flip(0)
+    return weights
+
+
+def tiled_vae_decode(vae, latents_scaled, tile_size, overlap=0.25):
+    """
+    VAE decode in overlapping latent tiles, blended across the overlaps.
+
+    Args:
+        vae: The pipeline's AutoencoderKL
+        latents_scaled: Latents already divided by the scaling factor
+        tile_size: Latent size of the square tiles
+        overlap: Fraction of the tile shared with each neighbour
+
+    Returns:
+        Decoded images in [-1, 1], shape (batch, 3, height, width), float32
+    """
+    batch_size, _, latent_height, latent_width = latents_scaled.shape
+    overlap_size = min(tile_size // 2, max(1, int(tile_size * overlap)))
+    stride = tile_size - overlap_size
+
+    output = None
+    weight = None
+    for top in _tile_starts(latent_height, tile_size, stride):
+        for left in _tile_starts(latent_width, tile_size, stride):
+            tile = latents_scaled[:, :, top:top + tile_size, left:left + tile_size]
+            decoded = vae.decode(tile).sample.float()
+
+            scale = decoded.shape[2] // tile.shape[2]
+            if output is None:
+                output = torch.zeros(
+                    batch_size, decoded.shape[1], latent_height * scale, latent_width * scale,
+                    device=decoded.device
+                )
+                weight = torch.zeros(1, 1, latent_height * scale, latent_width * scale, device=decoded.device)
+
+            rows = _blend_ramp(
+                decoded.shape[2], overlap_size * scale, top > 0, top + tile.shape[2] < latent_height, decoded.device
+            )
+            columns = _blend_ramp(
+                decoded.shape[3], overlap_size * scale, left > 0, left + tile.shape[3] < latent_width, decoded.device
+            )
+            mask = rows[:, None] * columns[None, :]
+
+            y, x = top * scale, left * scale
+            output[:, :, y:y + decoded.shape[2], x:x + decoded.shape[3]] += decoded * mask
+            weight[:, :, y:y + decoded.shape[2], x:x + decoded.shape[3]] += mask
+
+    return output / weight
+
+
+def vae_decode(vae, latents_scaled, memory_budget=None):
+    """
+    VAE decode within a memory budget (splitting the batch and tiling as needed).
+
+    Args:
+        vae: The pipeline's AutoencoderKL
+        latents_scaled: Latents already divided by the scaling factor
+        memory_budget: Bytes a single decode call may use (None = decode in one call)
+
+    Returns:
+        Decoded images in [-1, 1], shape (batch, 3, height, width)
+    """
+    batch_size, _, latent_height, latent_width = latents_scaled.shape
+    tile_size, sub_batch_size = plan_tiles(vae, batch_size, latent_height, latent_width, memory_budget)
+
+    if tile_size is None and sub_batch_size == batch_size:
+        return vae.decode(latents_scaled).sample
+
+    images = []
+    for start in range(0, batch_size, sub_batch_size):
+        chunk = latents_scaled[start:start + sub_batch_size]
+        if tile_size is None:
+            images.append(vae.decode(chunk).sample)
+        else:
+            images.append(tiled_vae_decode(vae, chunk, tile_size).to(chunk.dtype))
+    return torch.cat(images)
+
+
+def decode_latents(vae, latents, memory_budget=None):
+    """
+    Decode a batch of latents to PIL Images with the VAE.
+
+    Args:
+        vae: The pipeline's AutoencoderKL
+        latents: Tensor of shape (batch, 4, height/8, width/8)
+        memory_budget: Bytes a single decode call may use (None = no limit)
+
+    Returns:
+        List of PIL Images, one per batch element
+    """
+    with torch.no_grad():
+        # Scale and decode
+        latents_scaled = 1 / vae.config.scaling_factor * latents.to(vae.dtype)
+        images = vae_decode(vae, latents_scaled, memory_budget)
+
+        # Convert to PIL Images
+        images = (images / 2 + 0.5).clamp(0, 1)
+        images = images.cpu().permute(0, 2, 3, 1).float().numpy()
+        images = (images * 255).round().astype("uint8")
+
+    return [Image.fromarray(image) for image in images]
+
+
+# Approximate Stable Diffusion 1.x latent -> RGB projection (one row per latent channel)
+SD15_LATENT_RGB_FACTORS = [
+    #   R        G        B
+    [0.3512, 0.2297, 0.3227],
+    [0.3250, 0.4974, 0.2350],
+    [-0.2829, 0.1762, 0.2721],
+    [-0.2120, -0.2616, -0.7177]
+]
+
+
+class LatentPreviewDecoder:
+    def __init__(self, factors=None, bias=None, upscale=8):
+        """
+        Cheap approximate latent-to-RGB decoder for preview frames.
+
+        Args:
+            factors: 4x3 latent-channel to RGB projection (defaults to SD 1.x factors)
+            bias: Per-channel RGB offset (defaults to zero)
+            upscale: Upsampling factor back to pixel resolution (the VAE scale factor)
+        """
+        self.factors = torch.tensor(factors or SD15_LATENT_RGB_FACTORS, dtype=torch.float32)
+        self.bias = torch.tensor(bias or [0.0, 0.0, 0.0], dtype=torch.float32)
+        self.upscale = upscale
+
+    @classmethod
+    def calibrate(cls, vae, latents, upscale=8):
+        """
+        Fit the linear projection against real VAE decodes.
+
+        Decodes the given latents once, downsamples the images to latent
+        resolution and solves a least-squares fit from latent channels to RGB.
+
+        Args:
+            vae: The pipeline's AutoencoderKL
+            latents: Tensor of shape (batch, 4, height/8, width/8) to calibrate on
+            upscale: Upsampling factor for previews
+
+        Returns:
+            Calibrated LatentPreviewDecoder
+        """
+        with torch.no_grad():
+            images = vae.decode(1 / vae.config.scaling_factor * latents.to(vae.dtype)).sample
+            images = torch.nn.functional.avg_pool2d(images.float(), upscale)
+
+        x = latents.float().permute(0, 2, 3, 1).reshape(-1, latents.shape[1]).cpu()
+        x = torch.cat([x, torch.ones(x.shape[0], 1)], dim=1)
+        y = images.permute(0, 2, 3, 1).reshape(-1, 3).cpu()
+
+        solution = torch.linalg.lstsq(x, y).solution
+
+        return cls(
+            factors=solution[:-1].tolist(),
+            bias=solution[-1].tolist(),
+            upscale=upscale
+        )
+
+    def decode(self, latents):
+        """
+        Project a batch of latents to approximate RGB preview images.
+
+        Args:
+            latents: Tensor of shape (batch, 4, height/8, width/8)
+
+        Returns:
+            List of PIL Images at (approximately) full resolution
+        """
+        with torch.no_grad():
+            factors = self.factors.to(latents.device)
+            bias = self.bias.to(latents.device)
+
+            rgb = torch.einsum("bchw,cr->brhw", latents.float(), factors) + bias[None, :, None, None]
+            rgb = ((rgb + 1.0) / 2.0).clamp(0, 1)
+            rgb = (rgb.cpu().permute(0, 2, 3, 1).numpy() * 255).round().astype("uint8")
+
+        images = []
+        for frame in rgb:
+            image = Image.fromarray(frame)
+            images.append(image.resize(
+                (image.width * self.upscale, image.height * self.upscale),
+                Image.BILINEAR
+            ))
+
+        return images
+
+
+class DeferredLatentDecoder:
+    def __init__(self, vae, batch_size=8, background=False, on_decoded=None, keep_images=True,
+                 memory_budget=None, max_pending=None):
+        """
+        Collect latents during generation and decode them in batches.
+
+        Args:
+            vae: The pipeline's AutoencoderKL
+            batch_size: Number of latents decoded per VAE call
+            background: Decode full batches on a worker thread while generation continues
+                (otherwise everything is decoded when finish() is called)
+            on_decoded: Optional callable(index, image) invoked as each frame is decoded
+            keep_images: Hold decoded images for finish() (False when on_decoded
+                already consumes them, so memory does not grow with the sequence)
+            memory_budget: Bytes a VAE call may use (batches are split and tiled to fit)
+            max_pending: Decode right away once this many latents are waiting, instead
+                of holding them all until finish() (bounds memory on long trajectories)
+        """
+        self.vae = vae
+        self.batch_size = max(1, batch_size)
+        self.background = background
+        self.on_decoded = on_decoded
+        self.keep_images = keep_images
+        self.memory_budget = memory_budget
+        self.max_pending = max_pending
+
+        self._pending = []
+        self._decoded = {}
+
+        self._queue = None
+        self._worker = None
+        self._error = None
+
+        if self.background:
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+            self._worker.start()
+
+    def submit(self, index, latents):
+        """
+        Record a latent for later decoding.
+
+        Args:
+            index: Frame index the decoded image belongs to
+            latents: Tensor of shape (1, 4, height/8, width/8)
+        """
+        self._pending.append((index, latents.detach().clone()))
+
+        if self.background and len(self._pending) >= self.batch_size:
+            self._queue.put(self._pending)
+            self._pending = []
+        elif self.max_pending is not None and len(self._pending) >= self.max_pending:
+            self.drain()
+
+    def add_image(self, index, image):
+        """
+        Record a frame that was already decoded (e.g. a preview).
+
+        Args:
+            index: Frame index
+            image: PIL Image
+        """
+        if self.keep_images:
+            self._decoded[index] = image
+
+    def _decode_batch(self, batch):
+        """Decode one batch of (index, latents) pairs into the results dict."""
+        indices = [index for index, _ in batch]
+        images = decode_latents(self.vae, torch.cat([latents for _, latents in batch]), self.memory_budget)
+        for index, image in zip(indices, images):
+            if self.keep_images:
+                self._decoded[index] = image
+            if self.on_decoded is not None:
+                self.on_decoded(index, image)
+
+    def _worker_loop(self):
+        """Background worker: decode batches until the sentinel arrives."""
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    break
+                self._decode_batch(batch)
+            except Exception as e:  # Surface the error from drain()/finish()
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """
+        Decode everything submitted so far, keeping the decoder open for more.
+
+        Used before checkpoints, so every recorded frame has been handed to on_decoded.
+        """
+        if self.background:
+            if self._pending:
+                self._queue.put(self._pending)
+                self._pending = []
+            self._queue.join()
+            if self._error is not None:
+                raise self._error
+        else:
+            for start in range(0, len(self._pending), self.batch_size):
+                self._decode_batch(self._pending[start:start + self.batch_size])
+            self._pending = []
+
+    def finish(self):
+        """
+        Decode everything still pending and wait for the worker.
+
+        Returns:
+            List of PIL Images ordered by frame index (empty if keep_images is False)
+        """
+        self.drain()
+
+        if self.background:
+            self._queue.put(None)
+            self._worker.join()
+
+        return [self._decoded[index] for index in sorted(self._decoded)]
@@ -0,0 +1,345 @@
+"""
+Matrix Scheduler
+Phase 1: Resumable, parallel generation of a matrix of sequences
+
+Generating every theme in every mode takes hours. The scheduler writes a job
+manifest up front, skips sequences whose completion marker matches the job's
+parameter hash, and marks a sequence done only after its metadata has been
+written - so a crashed run resumes where it stopped instead of starting over.
+Sequences also checkpoint periodically, so even the sequence that was
+running when the machine went away continues mid-trajectory.
+
+Jobs can run in a pool of worker processes. Each worker loads the model once
+and gets an equal share of the CPU threads, since several small workers
+beat one process whose torch intra-op threads contend with each other.
+Jobs that differ only in guidance scale are generated together as one
+batched guidance sweep.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+from atomic_write import write_json_atomic
+
+
+MANIFEST_FILENAME = "matrix_manifest.json"
+DONE_FILENAME = ".done.json"
+
+# DiffusionStepCapture arguments that only change how (and how fast) a sequence
+# is generated, not what is written - they are left out of the job hash
+RUNTIME_GENERATOR_KWARGS = {
+    "device", "pipeline_registry", "decode_mode", "decode_batch_size",
+    "frame_writer_workers", "prompt_cache_dir", "long_trajectory", "profile_observers"
+}
+
+# Per-process generator used by pool workers (created in _init_worker)
+_worker_generator = None
+
+
+def params_hash(params):
+    """
+    Hash a job's generation parameters.
+
+    Args:
+        params: Dict of keyword arguments for generate_sequence
+
+    Returns:
+        Hex digest that changes whenever any parameter changes
+    """
+    encoded = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def generator_settings(generator_kwargs):
+    """
+    Pick the generator arguments that change a sequence's output.
+
+    Args:
+        generator_kwargs: Keyword arguments for DiffusionStepCapture
+
+    Returns:
+        JSON-serializable dict of the set arguments that are not in RUNTIME_GENERATOR_KWARGS
+    """
+    settings = {}
+    for name, value in generator_kwargs.items():
+        if name in RUNTIME_GENERATOR_KWARGS or value is None or value == {} or value == ():
+            continue
+        if name == "frame_renditions":
+            value = [rendition.describe() for rendition in value]
+        settings[name] = value
+    return settings
+
+
+def is_job_done(job):
+    """
+    Check whether a job's output is complete and was made with the same parameters.
+
+    Args:
+        job: Job dict (see MatrixScheduler.add_job)
+
+    Returns:
+        True if the job can be skipped
+    """
+    marker = Path(job["output_dir"]) / DONE_FILENAME
+    if not marker.exists():
+        return False
+
+    try:
+        with open(marker, "r") as f:
+            done = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+
+    return done.get("params_hash") == job["params_hash"]
+
+
+def run_jobs(generator, jobs, checkpoint_every=None):
+    """
+    Generate a group of sequences and mark each one done.
+
+    A single job runs through generate_sequence; several jobs (which differ
+    only in guidance scale) run as one batched guidance sweep.
+
+    Args:
+        generator: DiffusionStepCapture instance
+        jobs: List of job dicts (see MatrixScheduler.add_job)
+        checkpoint_every: Checkpoint every N steps (an existing matching checkpoint is resumed)
+
+    Returns:
+        Seconds spent generating
+    """
+    markers = [Path(job["output_dir"]) / DONE_FILENAME for job in jobs]
+
+    # A stale marker must not survive a partial rewrite of the directory
+    for marker in markers:
+        if marker.exists():
+            marker.unlink()
+
+    start = time.perf_counter()
+    if len(jobs) == 1:
+        generator.generate_sequence(
+            output_dir=jobs[0]["output_dir"],
+            checkpoint_every=checkpoint_every,
+            resume=True,
+            **jobs[0]["params"]
+        )
+    else:
+        shared_params = {k: v for k, v in jobs[0]["params"].items() if k != "guidance_scale"}
+        generator.generate_guidance_sweep(
+            output_dirs=[job["output_dir"] for job in jobs],
+            guidance_scales=[job["params"]["guidance_scale"] for job in jobs],
+            max_batch_size=len(jobs),
+            checkpoint_every=checkpoint_every,
+            resume=True,
+            **shared_params
+        )
+    elapsed = time.perf_counter() - start
+
+    for job, marker in zip(jobs, markers):
+        write_json_atomic(marker, {
+            "job_id": job["job_id"],
+            "params_hash": job["params_hash"],
+            "completed_at": datetime.now().isoformat(),
+            "elapsed_seconds": elapsed
+        })
+
+    return elapsed
+
+
+def group_jobs(jobs, max_group_size):
+    """
+    Group jobs whose parameters differ only in guidance scale.
+
+    Args:
+        jobs: List of job dicts
+        max_group_size: Maximum jobs per group (1 = no grouping)
+
+    Returns:
+        List of job lists, in order of each group's first job
+    """
+    groups = {}
+    for job in jobs:
+        shared_params = {k: v for k, v in job["params"].items() if k != "guidance_scale"}
+        groups.setdefault(params_hash(shared_params), []).append(job)
+
+    max_group_size = max(1, max_group_size)
+    return [
+        group[start:start + max_group_size]
+        for group in groups.values()
+        for start in range(0, len(group), max_group_size)
+    ]
+
+
+def _init_worker(num_threads, generator_kwargs):
+    """Pool initializer: limit torch threads and load the model once per worker."""
+    global _worker_generator
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from diffusion_step_generator import DiffusionStepCapture
+    _worker_generator = DiffusionStepCapture(**generator_kwargs)
+
+
+def _run_in_worker(jobs, checkpoint_every):
+    """Pool task: run one job group on the worker's generator."""
+    return run_jobs(_worker_generator, jobs, checkpoint_every)
+
+
+class MatrixScheduler:
+    def __init__(self, base_output, workers=1, threads_per_worker=None, generator_kwargs=None, force=False,
+                 sweep_batch_size=2, checkpoint_every=10):
+        """
+        Initialize the scheduler.
+
+        Args:
+            base_output: Directory holding the sequence directories and the manifest
+            workers: Number of worker processes (1 = run in this process)
+            threads_per_worker: Torch threads per worker (None = split CPU cores evenly)
+            generator_kwargs: Keyword arguments for DiffusionStepCapture
+            force: Regenerate jobs even if they are already complete
+            sweep_batch_size: Maximum jobs differing only in guidance scale that
+                share one batched denoising loop (1 = generate every job separately)
+            checkpoint_every: Save a resumable checkpoint every N steps (None = never)
+        """
+        self.base_output = Path(base_output)
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.generator_kwargs = generator_kwargs or {}
+        self.force = force
+        self.sweep_batch_size = sweep_batch_size
+        self.checkpoint_every = checkpoint_every
+
+        self.jobs = []
+        self.manifest_path = self.base_output / MANIFEST_FILENAME
+
+    def add_job(self, job_id, params, description=""):
+        """
+        Queue one sequence.
+
+        Args:
+            job_id: Unique name, also used as the output directory name
+            params: Keyword arguments for generate_sequence (prompt, num_inference_steps, ...)
+            description: Label printed when the job starts
+        """
+        # Output-affecting generator settings (strides, renditions, ...) count as parameters
+        # too; without any, the hash is that of params alone, as for earlier runs
+        settings = generator_settings(self.generator_kwargs)
+        hashed = {"params": params, "generator": settings} if settings else params
+
+        self.jobs.append({
+            "job_id": job_id,
+            "description": description,
+            "output_dir": str(self.base_output / job_id),
+            "params": params,
+            "generator_settings": settings,
+            "params_hash": params_hash(hashed),
+            "status": "pending"
+        })
+
+    def _write_manifest(self):
+        """Persist the job list and each job's status."""
+        write_json_atomic(self.manifest_path, {
+            "updated_at": datetime.now().isoformat(),
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "total_jobs": len(self.jobs),
+            "completed_jobs": sum(job["status"] in ("done", "skipped") for job in self.jobs),
+            "jobs": self.jobs
+        })
+
+    def run(self):
+        """
+        Run every pending job.
+
+        Returns:
+            Dict with counts of "done", "skipped", and "failed" jobs
+        """
+        self.base_output.mkdir(parents=True, exist_ok=True)
+
+        pending = []
+        for job in self.jobs:
+            if not self.force and is_job_done(job):
+                job["status"] = "skipped"
+            else:
+                pending.append(job)
+
+        self._write_manifest()
+
+        total = len(self.jobs)
+        print(f"\n{total - len(pending)}/{total} sequences already complete, {len(pending)} to generate")
+        if not pending:
+            return self._summary()
+
+        print(f"Workers: {self.workers} × {self.threads_per_worker} threads")
+
+        groups = group_jobs(pending, self.sweep_batch_size)
+        if self.workers == 1:
+            self._run_serial(groups)
+        else:
+            self._run_parallel(groups)
+
+        return self._summary()
+
+    def _run_serial(self, groups):
+        """Run job groups one after another in this process."""
+        from diffusion_step_generator import DiffusionStepCapture
+
+        generator = DiffusionStepCapture(**self.generator_kwargs)
+        try:
+            for position, jobs in enumerate(groups, 1):
+                labels = " + ".join(job["description"] or job["job_id"] for job in jobs)
+                print(f"\n[{position}/{len(groups)}] {labels}")
+                print("="*70)
+                try:
+                    elapsed = run_jobs(generator, jobs, self.checkpoint_every)
+                    self._mark(jobs, "done", elapsed_seconds=elapsed)
+                except Exception as e:
+                    self._mark(jobs, "failed", error=repr(e))
+                    print(f"✗ {', '.join(job['job_id'] for job in jobs)} failed: {e}")
+                self._write_manifest()
+        finally:
+            generator.close(evict=True)
+
+    def _run_parallel(self, groups):
+        """Run job groups on a pool of worker processes."""
+        # Spawn, not fork: forked torch thread pools can deadlock
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, self.generator_kwargs)
+        ) as pool:
+            futures = {pool.submit(_run_in_worker, jobs, self.checkpoint_every): jobs for jobs in groups}
+
+            for position, future in enumerate(as_completed(futures), 1):
+                jobs = futures[future]
+                job_ids = ", ".join(job["job_id"] for job in jobs)
+                try:
+                    elapsed = future.result()
+                    self._mark(jobs, "done", elapsed_seconds=elapsed)
+                    print(f"[{position}/{len(groups)}] ✓ {job_ids} ({elapsed:.0f}s)")
+                except Exception as e:
+                    self._mark(jobs, "failed", error=repr(e))
+                    print(f"[{position}/{len(groups)}] ✗ {job_ids} failed: {e}")
+                self._write_manifest()
+
+    @staticmethod
+    def _mark(jobs, status, **fields):
+        """Set the status (and extra manifest fields) of every job in a group."""
+        for job in jobs:
+            job["status"] = status
+            job.update(fields)
+
+    def _summary(self):
+        """Count jobs by final status."""
+        return {
+            status: sum(job["status"] == status for job in self.jobs)
+            for status in ("done", "skipped", "failed")
+        }
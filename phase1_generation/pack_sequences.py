@@ -0,0 +1,310 @@
+"""
+Sequence Packer
+Phase 1 -> Phase 2: Pack each sequence's step frames into one file for the web viewer
+
+A sequence is 50+ separate step_XXXX.png files, so the viewer makes one
+HTTP request per frame - over a thousand for the fake news matrix. The
+packer writes, per sequence, either a binary frame bundle (the encoded
+frame files back to back) or a sprite atlas (downscaled frames on one
+grid image), and records an offset index under "packed" in metadata.json.
+The viewer then needs one request per sequence and slices frames out of it.
+
+Packing is incremental: a signature of the source frames (names, sizes,
+modification times) and the packing settings is stored with the index,
+and sequences whose signature is unchanged are skipped.
+
+Forked sequences only pack their own frames; their prefix frames are in the
+parent sequence's pack.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from atomic_write import write_atomic, write_json_atomic
+
+
+BUNDLE_FILENAME = "frames.bin"
+ATLAS_FILENAME = "frames_atlas.webp"
+
+MIME_TYPES = {".png": "image/png", ".webp": "image/webp", ".jpg": "image/jpeg"}
+
+# WebP images are limited to 16383 pixels per side
+MAX_ATLAS_SIDE = 16383
+
+
+def frame_files(sequence_dir, metadata, rendition=None):
+    """
+    List a sequence's step frames in order.
+
+    Args:
+        sequence_dir: Sequence directory
+        metadata: Its parsed metadata.json
+        rendition: Name of a frame rendition to pack instead of the PNG masters
+
+    Returns:
+        List of (frame_index, path)
+    """
+    if "frame_indices" in metadata:
+        indices = metadata["frame_indices"]
+    else:
+        # Sequences from before frame_indices was recorded: every step has a frame
+        indices = sorted(int(path.stem.split("_")[1]) for path in sequence_dir.glob("step_*.png"))
+
+    if rendition is None:
+        return [(index, sequence_dir / f"step_{index:04d}.png") for index in indices]
+
+    described = metadata.get("renditions", {}).get(rendition)
+    if described is None:
+        raise ValueError(f"{sequence_dir} has no '{rendition}' rendition")
+    directory = sequence_dir / described["directory"]
+    return [(index, directory / f"step_{index:04d}{described['extension']}") for index in indices]
+
+
+def source_signature(files, settings):
+    """
+    Fingerprint the frames and settings a pack is built from.
+
+    Args:
+        files: List of (frame_index, path)
+        settings: Dict of packing settings
+
+    Returns:
+        Hex digest that changes when any frame is added, removed, or rewritten
+    """
+    entries = []
+    for index, path in files:
+        stat = path.stat()
+        entries.append([index, path.name, stat.st_size, stat.st_mtime_ns])
+
+    encoded = json.dumps({"frames": entries, "settings": settings}, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def write_bundle(files, output_path):
+    """
+    Concatenate the encoded frame files into one bundle.
+
+    Args:
+        files: List of (frame_index, path)
+        output_path: Bundle path
+
+    Returns:
+        Index dict for metadata.json (offset and length of each frame in bytes)
+    """
+    frames = []
+
+    def write(tmp_path):
+        offset = 0
+        with open(tmp_path, "wb") as bundle:
+            for index, path in files:
+                data = path.read_bytes()
+                bundle.write(data)
+                frames.append({"frame": index, "offset": offset, "length": len(data)})
+                offset += len(data)
+
+    write_atomic(output_path, write)
+
+    return {
+        "file": output_path.name,
+        "mime": MIME_TYPES.get(files[0][1].suffix, "application/octet-stream"),
+        "bytes": sum(frame["length"] for frame in frames),
+        "frames": frames
+    }
+
+
+def write_atlas(files, output_path, tile_size=128, quality=85):
+    """
+    Draw downscaled frames onto one sprite atlas.
+
+    Args:
+        files: List of (frame_index, path)
+        output_path: Atlas path (.webp)
+        tile_size: Longest side of each frame in the atlas (frames are never enlarged)
+        quality: WebP quality
+
+    Returns:
+        Index dict for metadata.json (pixel position of each frame)
+    """
+    with Image.open(files[0][1]) as first:
+        scale = min(1.0, tile_size / max(first.size))
+        tile_width = max(1, round(first.width * scale))
+        tile_height = max(1, round(first.height * scale))
+
+    # Roughly square grid, shrinking tiles if the atlas would get too large
+    columns = math.ceil(math.sqrt(len(files) * tile_height / tile_width))
+    rows = math.ceil(len(files) / columns)
+    shrink = min(1.0, MAX_ATLAS_SIDE / (columns * tile_width), MAX_ATLAS_SIDE / (rows * tile_height))
+    tile_width = max(1, int(tile_width * shrink))
+    tile_height = max(1, int(tile_height * shrink))
+
+    atlas = Image.new("RGB", (columns * tile_width, rows * tile_height))
+    frames = []
+    for position, (index, path) in enumerate(files):
+        x = (position % columns) * tile_width
+        y = (position // columns) * tile_height
+        with Image.open(path) as image:
+            image.draft("RGB", (tile_width, tile_height))
+            atlas.paste(image.convert("RGB").resize((tile_width, tile_height), Image.BILINEAR, reducing_gap=2.0), (x, y))
+        frames.append({"frame": index, "x": x, "y": y})
+
+    write_atomic(output_path, lambda tmp_path: atlas.save(tmp_path, format="WEBP", quality=quality))
+
+    return {
+        "file": output_path.name,
+        "mime": "image/webp",
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+        "columns": columns,
+        "frames": frames
+    }
+
+
+def pack_sequence(sequence_dir, kinds=("bundle",), rendition=None, tile_size=128, quality=85, force=False):
+    """
+    Pack one sequence's frames and record the index in its metadata.json.
+
+    Args:
+        sequence_dir: Sequence directory (with a complete metadata.json)
+        kinds: What to write - "bundle", "atlas", or both
+        rendition: Frame rendition to pack instead of the PNG masters
+        tile_size: Longest side of atlas tiles
+        quality: WebP quality of the atlas
+        force: Repack even if nothing changed
+
+    Returns:
+        "packed", "unchanged", or "empty"
+    """
+    sequence_dir = Path(sequence_dir)
+    metadata_path = sequence_dir / "metadata.json"
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    files = frame_files(sequence_dir, metadata, rendition)
+    files = [(index, path) for index, path in files if path.exists()]
+    if not files:
+        return "empty"
+
+    settings = {"kinds": sorted(kinds), "rendition": rendition, "tile_size": tile_size, "quality": quality}
+    signature = source_signature(files, settings)
+
+    packed = metadata.get("packed") or {}
+    outputs_exist = all((sequence_dir / packed.get(kind, {}).get("file", "")).is_file() for kind in kinds)
+    if not force and packed.get("signature") == signature and outputs_exist:
+        return "unchanged"
+
+    packed = {"signature": signature, "rendition": rendition}
+    if "bundle" in kinds:
+        packed["bundle"] = write_bundle(files, sequence_dir / BUNDLE_FILENAME)
+    if "atlas" in kinds:
+        packed["atlas"] = write_atlas(files, sequence_dir / ATLAS_FILENAME, tile_size, quality)
+
+    # Rewritten atomically, like the recorder writes it
+    metadata["packed"] = packed
+    write_json_atomic(metadata_path, metadata)
+
+    return "packed"
+
+
+def find_sequences(base_dir):
+    """
+    Find complete sequences below a directory.
+
+    Args:
+        base_dir: Directory to search (e.g. assets/generated_sequences)
+
+    Returns:
+        Sorted list of sequence directories that have a metadata.json
+    """
+    return sorted(path.parent for path in Path(base_dir).rglob("metadata.json"))
+
+
+def main():
+    """
+    Pack every sequence under a directory, skipping those that are up to date.
+    """
+    parser = argparse.ArgumentParser(
+        description="Pack step frames into one bundle or sprite atlas per sequence for the web viewer"
+    )
+    parser.add_argument(
+        "base_dir",
+        nargs="?",
+        default="../assets/generated_sequences",
+        help="Directory containing the sequences"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["bundle", "atlas", "both"],
+        default="bundle",
+        help="Binary frame bundle (exact frames), sprite atlas (downscaled), or both"
+    )
+    parser.add_argument(
+        "--rendition",
+        help="Pack this frame rendition (e.g. preview) instead of the PNG masters"
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=128,
+        help="Longest side of a frame in the sprite atlas"
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=85,
+        help="WebP quality of the sprite atlas"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Sequences packed in parallel"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Repack sequences even if their frames did not change"
+    )
+    args = parser.parse_args()
+
+    kinds = ("bundle", "atlas") if args.format == "both" else (args.format,)
+    sequences = find_sequences(args.base_dir)
+
+    print("\n" + "="*70)
+    print(f"PACKING {len(sequences)} SEQUENCES ({', '.join(kinds)})")
+    print("="*70)
+
+    def pack(sequence_dir):
+        try:
+            return pack_sequence(sequence_dir, kinds, args.rendition, args.tile_size, args.quality, args.force)
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            return f"failed: {e}"
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        for sequence_dir, result in zip(sequences, executor.map(pack, sequences)):
+            status = result.split(":")[0]
+            counts[status] = counts.get(status, 0) + 1
+            if status == "packed":
+                print(f"  ✓ {sequence_dir}")
+            elif status == "failed":
+                print(f"  ✗ {sequence_dir}: {result}")
+
+    print("\n" + "="*70)
+    print(
+        f"✓ {counts.get('packed', 0)} PACKED, {counts.get('unchanged', 0)} UP TO DATE, "
+        f"{counts.get('empty', 0)} WITHOUT FRAMES, {counts.get('failed', 0)} FAILED"
+    )
+    print("="*70)
+
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Pipeline Registry
+Phase 1: Share loaded diffusion pipelines across generators and analyses
+
+Loading Stable Diffusion (~4GB) dominates runtime on CPU machines, so every
+DiffusionStepCapture draws its pipeline from a process-wide registry instead of
+calling from_pretrained itself. Pipelines are keyed by
+(model_id, device, dtype, capture config), reference counted, and only dropped
+when explicitly evicted - which also removes any hooks attached to them.
+"""
+
+import gc
+import threading
+
+import torch
+from diffusers import StableDiffusionPipeline
+
+
+def resolve_dtype(device, torch_dtype=None):
+    """
+    Pick the dtype a pipeline is loaded with.
+
+    Args:
+        device: "cuda", "mps", or "cpu"
+        torch_dtype: Explicit dtype override (None = float16 on CUDA, float32 elsewhere)
+
+    Returns:
+        torch.dtype
+    """
+    if torch_dtype is not None:
+        return torch_dtype
+    return torch.float16 if device == "cuda" else torch.float32
+
+
+class PipelineEntry:
+    """A loaded pipeline plus the hooks and capture buffers attached to it."""
+
+    def __init__(self, key, pipe):
+        self.key = key
+        self.pipe = pipe
+        self.refcount = 0
+
+        # Hook handles (anything with a .remove() method) attached to the pipeline
+        self.hook_handles = []
+
+        # Shared CrossAttentionStore the capture processors write into
+        self.attention_store = None
+
+    def remove_hooks(self):
+        """Detach every hook registered on this pipeline and drop buffered captures."""
+        for handle in self.hook_handles:
+            handle.remove()
+        self.hook_handles = []
+        self.attention_store = None
+
+
+class PipelineRegistry:
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        Most code should use the module-level `registry` instead of creating its own.
+        """
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(model_id, device, torch_dtype=None, capture_attention=False):
+        """
+        Build the registry key for a pipeline configuration.
+
+        Args:
+            model_id: HuggingFace model identifier
+            device: "cuda", "mps", or "cpu"
+            torch_dtype: Explicit dtype (None = device default)
+            capture_attention: Whether the pipeline carries attention capture hooks
+
+        Returns:
+            Hashable key tuple
+        """
+        dtype = resolve_dtype(device, torch_dtype)
+        return (model_id, str(device), str(dtype), bool(capture_attention))
+
+    def acquire(self, model_id, device, torch_dtype=None, capture_attention=False):
+        """
+        Get the shared pipeline for a configuration, loading it on first use.
+
+        Args:
+            model_id: HuggingFace model identifier
+            device: "cuda", "mps", or "cpu"
+            torch_dtype: Explicit dtype (None = device default)
+            capture_attention: Whether the pipeline carries attention capture hooks
+
+        Returns:
+            PipelineEntry (call release() when done with it)
+        """
+        key = self.make_key(model_id, device, torch_dtype, capture_attention)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                print(f"Loading model: {model_id}")
+                pipe = StableDiffusionPipeline.from_pretrained(
+                    model_id,
+                    torch_dtype=resolve_dtype(device, torch_dtype),
+                    safety_checker=None  # Disable for artistic freedom
+                )
+                pipe = pipe.to(device)
+                entry = PipelineEntry(key, pipe)
+                self._entries[key] = entry
+            else:
+                print(f"Reusing loaded model: {model_id} ({device})")
+
+            entry.refcount += 1
+            return entry
+
+    def release(self, entry, evict=False):
+        """
+        Give back a pipeline obtained from acquire().
+
+        The pipeline stays loaded for later reuse unless evict=True and no
+        other user still holds it.
+
+        Args:
+            entry: PipelineEntry returned by acquire()
+            evict: Unload the pipeline once nobody references it
+        """
+        with self._lock:
+            entry.refcount = max(0, entry.refcount - 1)
+            if evict and entry.refcount == 0:
+                self.evict(entry.key)
+
+    def evict(self, key):
+        """
+        Unload a pipeline, removing its hooks and freeing device memory.
+
+        Args:
+            key: Registry key (see make_key)
+
+        Returns:
+            True if a pipeline was unloaded
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+        if entry is None:
+            return False
+
+        entry.remove_hooks()
+        entry.pipe = None
+        gc.collect()
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        if torch.backends.mps.is_available():
+            torch.mps.empty_cache()
+
+        return True
+
+    def clear(self):
+        """Unload every registered pipeline."""
+        with self._lock:
+            keys = list(self._entries.keys())
+        for key in keys:
+            self.evict(key)
+
+    def loaded_keys(self):
+        """Return the keys of all currently loaded pipelines."""
+        with self._lock:
+            return list(self._entries.keys())
+
+
+# Process-wide registry shared by all generators
+registry = PipelineRegistry()
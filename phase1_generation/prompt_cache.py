@@ -0,0 +1,108 @@
+"""
+Prompt Embedding Cache
+Phase 1: Encode each prompt with the CLIP text encoder only once
+
+A generation matrix reuses the same few prompts many times (every theme in
+every mode, the empty negative prompt in every run), and token attribution
+re-encodes near-identical prompts. The cache keeps prompt embeddings in an
+LRU keyed by (tokenizer, prompt) and can optionally persist them to disk so
+reruns skip the text encoder entirely.
+"""
+
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+
+import torch
+
+from atomic_write import write_atomic
+
+
+class PromptEmbeddingCache:
+    def __init__(self, max_entries=64, cache_dir=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Embeddings kept in memory (least recently used are dropped)
+            cache_dir: Optional directory for persisting embeddings across runs
+        """
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tokenizer, prompt):
+        """
+        Build the cache key for a prompt.
+
+        Args:
+            tokenizer: The pipeline's tokenizer (identified by its name_or_path)
+            prompt: Text prompt
+
+        Returns:
+            Hashable key tuple
+        """
+        return (tokenizer.name_or_path, prompt)
+
+    def _disk_path(self, key):
+        """File holding a persisted embedding."""
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.pt"
+
+    def get(self, key):
+        """
+        Look up an embedding in memory, then on disk.
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            Embedding tensor, or None on a miss
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                embeds = torch.load(path, map_location="cpu")
+                self._remember(key, embeds)
+                self.hits += 1
+                return embeds
+
+        self.misses += 1
+        return None
+
+    def put(self, key, embeds):
+        """
+        Store an embedding (and persist it if a cache directory is set).
+
+        Args:
+            key: Key from make_key()
+            embeds: Embedding tensor
+        """
+        self._remember(key, embeds)
+
+        if self.cache_dir is not None:
+            # Write-then-rename, so parallel workers never read a partial file
+            embeds = embeds.detach().cpu()
+            write_atomic(self._disk_path(key), lambda tmp_path: torch.save(embeds, tmp_path))
+
+    def _remember(self, key, embeds):
+        """Insert into the in-memory LRU."""
+        self._entries[key] = embeds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop in-memory entries (persisted files are kept)."""
+        self._entries.clear()
@@ -0,0 +1,424 @@
+"""
+Sequence Recorder
+Phase 1: Everything written for one generated sequence
+
+A batched denoising loop can produce several sequences at once (e.g. one
+prompt swept over several guidance scales). Each sequence gets its own
+recorder holding its output directory, streamed Phase 3 arrays, frames, and
+step metadata, so the generator's step callback only has to slice the batch
+and hand each sample to its recorder.
+
+Recorders can also describe their progress for a checkpoint and pick it up
+again, so an interrupted generation continues where it stopped.
+
+Frames are not kept in memory once they are handed to the frame writer;
+FrameSequence reads them back from disk on access. Predicted-x0 frames form
+an optional second track (x0_step_XXXX.png) that is always decoded in batches.
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from atomic_write import write_json_atomic
+from attention_store import AttentionStoreWriter
+from host_transfer import HostTransferQueue
+from latent_decoding import DeferredLatentDecoder
+from trajectory_store import StepArrayWriter
+
+
+CHECKPOINT_FILENAME = "checkpoint.pt"
+
+
+class FrameSequence:
+    def __init__(self, paths):
+        """
+        Read-only list of saved step frames, each loaded from disk when accessed.
+
+        Args:
+            paths: Frame file paths in step order
+        """
+        self.paths = list(paths)
+
+    @staticmethod
+    def _load(path):
+        image = Image.open(path)
+        image.load()
+        return image
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrameSequence(self.paths[index])
+        return self._load(self.paths[index])
+
+    def __iter__(self):
+        for path in self.paths:
+            yield self._load(path)
+
+
+class SequenceRecorder:
+    def __init__(self, output_dir, num_steps, frame_writer, vae=None, decode_mode="sync",
+                 decode_batch_size=8, capture_attention=False, first_frame=0, decode_memory_budget=None,
+                 bounded_memory=False, renditions=()):
+        """
+        Create the output directories and streaming writers for one sequence.
+
+        Args:
+            output_dir: Directory to save the sequence
+            num_steps: Number of steps the denoising loop will report (pre-sizes arrays)
+            frame_writer: Shared FrameWriter saving step frames in the background
+            vae: VAE for deferred decoding (only needed when decode_mode != "sync")
+            decode_mode: "sync", "deferred", or "background" (see DiffusionStepCapture)
+            decode_batch_size: Latents per VAE call for deferred/background decoding
+            capture_attention: Whether attention maps are recorded
+            first_frame: Number of the first frame file (non-zero for sequences forked
+                from another sequence, whose earlier frames live in the parent)
+            decode_memory_budget: Bytes a deferred VAE decode may use (None = no limit)
+            bounded_memory: Decode deferred frames as soon as a batch is full instead of
+                holding every latent until the end (for long trajectories)
+            renditions: FrameRenditions written for every step frame besides the PNG
+        """
+        self.output_path = Path(output_dir)
+        self.first_frame = first_frame
+        self.output_path.mkdir(parents=True, exist_ok=True)
+
+        # Create subdirectory for Phase 3 data
+        self.phase3_dir = self.output_path / "phase3_data"
+        self.phase3_dir.mkdir(exist_ok=True)
+
+        self.frame_writer = frame_writer
+
+        self.renditions = tuple(renditions)
+        for rendition in self.renditions:
+            (self.output_path / rendition.directory).mkdir(parents=True, exist_ok=True)
+        self.vae = vae
+        self.decode_mode = decode_mode
+        self.decode_batch_size = decode_batch_size
+        self.decode_memory_budget = decode_memory_budget
+        self.max_pending_frames = decode_batch_size if bounded_memory else None
+
+        # Step metadata (frames go straight to disk)
+        self.metadata = []
+
+        # Latents and predicted noise stream straight into phase3_data/*.npy
+        self._latent_writer = StepArrayWriter(
+            self.phase3_dir / "latent_vectors.npy",
+            num_steps=num_steps
+        )
+        self._noise_writer = StepArrayWriter(
+            self.phase3_dir / "predicted_noise.npy",
+            num_steps=num_steps,
+            dtype=np.float16
+        )
+        # Arrays reach the writers through non-blocking copies off the device
+        self._transfer = HostTransferQueue()
+
+        self._attention_writer = None
+        if capture_attention:
+            self._attention_writer = AttentionStoreWriter(
+                self.phase3_dir / "attention",
+                num_steps=num_steps
+            )
+
+        self._deferred_decoder = None
+        if decode_mode != "sync":
+            self._deferred_decoder = DeferredLatentDecoder(
+                vae,
+                batch_size=decode_batch_size,
+                background=decode_mode == "background",
+                on_decoded=self._write_frame,
+                keep_images=False,
+                memory_budget=decode_memory_budget,
+                max_pending=self.max_pending_frames
+            )
+        # Created when the first predicted-x0 frame arrives
+        self._x0_decoder = None
+
+    @property
+    def num_frames(self):
+        """Number of steps recorded so far."""
+        return len(self.metadata)
+
+    @property
+    def checkpoint_path(self):
+        """Where this sequence's generation checkpoint is kept."""
+        return self.phase3_dir / CHECKPOINT_FILENAME
+
+    def frame_path(self, frame_index):
+        """Path of an intermediate step frame (frame_index counts this recorder's frames)."""
+        return self.output_path / f"step_{self.first_frame + frame_index:04d}.png"
+
+    def x0_frame_path(self, frame_index):
+        """Path of a predicted-x0 frame (frame_index counts this recorder's frames)."""
+        return self.output_path / f"x0_step_{self.first_frame + frame_index:04d}.png"
+
+    def _write_frame(self, frame_index, image):
+        """
+        Hand a decoded step frame to the background frame writer.
+
+        Args:
+            frame_index: Index of the captured frame
+            image: PIL Image
+        """
+        self.frame_writer.submit(image, self.frame_path(frame_index), renditions=self.renditions)
+
+    def write_arrays(self, latents, noise_pred):
+        """
+        Stream one step's raw latent vectors and predicted noise to disk (for Phase 3 analysis).
+
+        The copies off the device do not block; they are written once they
+        arrive (at the latest when the recorder is checkpointed or saved).
+
+        Args:
+            latents: Latents of this sequence, shape (1, C, H, W)
+            noise_pred: Guided noise prediction, shape (1, C, H, W)
+
+        Returns:
+            Number of bytes written
+        """
+        # Predicted noise is stored as float16, so convert before the transfer
+        noise_pred = noise_pred.to(torch.float16)
+
+        self._transfer.submit(latents, self._latent_writer.write)
+        self._transfer.submit(noise_pred, self._noise_writer.write)
+
+        return latents.numel() * latents.element_size() + noise_pred.numel() * noise_pred.element_size()
+
+    def add_frame(self, image, latents):
+        """
+        Save the frame of the step being recorded.
+
+        Args:
+            image: Already decoded frame, or None to VAE decode it later (deferred modes)
+            latents: Latents of this sequence, shape (1, C, H, W)
+
+        Returns:
+            File name of the frame (recorded in the step's metadata)
+        """
+        if image is None:
+            self._deferred_decoder.submit(self.num_frames, latents)
+        else:
+            self._write_frame(self.num_frames, image)
+
+        return self.frame_path(self.num_frames).name
+
+    def add_x0_frame(self, latents):
+        """
+        Queue the predicted clean latents of the step being recorded for batched decoding.
+
+        Args:
+            latents: Predicted x0 latents of this sequence, shape (1, C, H, W)
+
+        Returns:
+            File name of the x0 frame (recorded in the step's metadata)
+        """
+        if self._x0_decoder is None:
+            self._x0_decoder = DeferredLatentDecoder(
+                self.vae,
+                batch_size=self.decode_batch_size,
+                background=self.decode_mode == "background",
+                on_decoded=lambda frame_index, image: self.frame_writer.submit(
+                    image, self.x0_frame_path(frame_index)
+                ),
+                keep_images=False,
+                memory_budget=self.decode_memory_budget,
+                max_pending=self.max_pending_frames
+            )
+        self._x0_decoder.submit(self.num_frames, latents)
+
+        return self.x0_frame_path(self.num_frames).name
+
+    def write_attention(self, attention_maps):
+        """
+        Store the attention maps of the step being recorded.
+
+        Args:
+            attention_maps: Dict mapping "HxW" to [tokens, H, W] arrays
+
+        Returns:
+            True if the maps were stored (the recorder was set up to capture attention)
+        """
+        if self._attention_writer is None:
+            return False
+        self._attention_writer.write_step(attention_maps)
+        return True
+
+    def add_step(self, entry):
+        """
+        Finish recording a step (call after its arrays, frame, and attention maps).
+
+        Args:
+            entry: The step's metadata entry (step, timestep, statistics, ...)
+        """
+        self.metadata.append(entry)
+
+    def drain_frames(self):
+        """Decode every deferred frame recorded so far (frames still go through the frame writer)."""
+        if self._deferred_decoder is not None:
+            self._deferred_decoder.drain()
+        if self._x0_decoder is not None:
+            self._x0_decoder.drain()
+
+    def state_dict(self):
+        """
+        Describe what has been recorded, for a checkpoint.
+
+        Call after drain_frames() and after the frame writer has been flushed,
+        so every recorded step's frame is on disk.
+
+        Returns:
+            Dict that load_state_dict() accepts
+        """
+        self._transfer.drain()
+        self._latent_writer.flush()
+        self._noise_writer.flush()
+
+        return {
+            "metadata": [dict(entry) for entry in self.metadata],
+            "latent_count": self._latent_writer.count,
+            "noise_count": self._noise_writer.count,
+            "attention": self._attention_writer.state_dict() if self._attention_writer is not None else None
+        }
+
+    def load_state_dict(self, state):
+        """
+        Continue a sequence from a checkpoint by reopening the streamed arrays.
+
+        Args:
+            state: Dict returned by state_dict()
+        """
+        self.metadata = [dict(entry) for entry in state["metadata"]]
+        self._latent_writer.reopen(state["latent_count"])
+        self._noise_writer.reopen(state["noise_count"])
+        if self._attention_writer is not None and state["attention"] is not None:
+            self._attention_writer.load_state_dict(state["attention"])
+
+    def finish_frames(self):
+        """Decode whatever was deferred and queue the remaining frames for writing."""
+        if self._deferred_decoder is not None:
+            print(f"\nDecoding {len(self.frames())} deferred frames...")
+            self._deferred_decoder.finish()
+            self._deferred_decoder = None
+        if self._x0_decoder is not None:
+            print(f"\nDecoding {len(self.x0_frames())} predicted-x0 frames...")
+            self._x0_decoder.finish()
+            self._x0_decoder = None
+
+    def frames(self):
+        """
+        List the frames saved for this sequence.
+
+        Returns:
+            FrameSequence in step order (readable once the frame writer has been
+            flushed); steps saved without a frame have no "frame" entry
+        """
+        return FrameSequence(self.output_path / entry["frame"] for entry in self.metadata if "frame" in entry)
+
+    def x0_frames(self):
+        """
+        List the predicted-x0 frames saved for this sequence.
+
+        Returns:
+            FrameSequence in step order (readable once the frame writer has been flushed)
+        """
+        return FrameSequence(self.output_path / entry["x0_frame"] for entry in self.metadata if "x0_frame" in entry)
+
+    def save(self, final_image, sequence_metadata, attention_tokens=None, attention_word_tokens=None,
+             observer_costs=None):
+        """
+        Save the final image, finalize the Phase 3 arrays, and write metadata.json.
+
+        Call after finish_frames() and after the frame writer has been flushed.
+
+        Args:
+            final_image: Final PIL Image
+            sequence_metadata: Generation parameters (prompt, seed, ...) for metadata.json
+            attention_tokens: CLIP token strings of the prompt
+            attention_word_tokens: Token indices per prompt word
+            observer_costs: Dict mapping step observer names to their accounted cost
+
+        Returns:
+            The full metadata dict
+        """
+        # Save final image
+        final_image.save(self.output_path / "final.png")
+
+        # Save Phase 3 interpretability data
+        print(f"Saving Phase 3 interpretability data...")
+
+        # Finalize latent vectors
+        self._transfer.drain()
+        latents_shape = self._latent_writer.close()
+        if latents_shape is not None:
+            print(f"  ✓ Saved latent vectors: {latents_shape}")
+
+        # Finalize predicted noise
+        noise_shape = self._noise_writer.close()
+        if noise_shape is not None:
+            print(f"  ✓ Saved predicted noise: {noise_shape}")
+
+        # Finalize attention store (if captured)
+        attention_steps = 0
+        if self._attention_writer is not None:
+            attention_steps = self._attention_writer.close()
+            self._attention_writer = None
+            if attention_steps > 0:
+                print(f"  ✓ Saved attention maps: {attention_steps} steps")
+
+        # Save metadata
+        full_metadata = dict(sequence_metadata)
+        full_metadata.update({
+            "generated_at": datetime.now().isoformat(),
+            "steps": self.metadata,
+            # Frame numbers that have a step_XXXX.png (steps in between can be interpolated)
+            "frame_indices": [
+                self.first_frame + frame_index
+                for frame_index, entry in enumerate(self.metadata)
+                if "frame" in entry
+            ],
+            "x0_frame_indices": [
+                self.first_frame + frame_index
+                for frame_index, entry in enumerate(self.metadata)
+                if "x0_frame" in entry
+            ],
+            # Frames of the rows in latent_vectors.npy / predicted_noise.npy and of the
+            # attention store's steps (every frame unless the observers had a stride > 1)
+            "latent_frame_indices": [
+                self.first_frame + frame_index
+                for frame_index, entry in enumerate(self.metadata)
+                if entry.get("phase3_latents")
+            ],
+            "attention_frame_indices": [
+                self.first_frame + frame_index
+                for frame_index, entry in enumerate(self.metadata)
+                if entry.get("phase3_attention")
+            ],
+            # Extra encodings of every step frame (same file names, see FrameRendition)
+            "renditions": {rendition.name: rendition.describe() for rendition in self.renditions},
+            "attention_tokens": attention_tokens,
+            "attention_word_tokens": attention_word_tokens,
+            "observers": observer_costs or {},
+            "phase3_data_available": {
+                "latent_vectors": latents_shape is not None,
+                "predicted_noise": noise_shape is not None,
+                "attention_maps": attention_steps > 0
+            }
+        })
+
+        # Written last and atomically: a complete metadata.json means a complete sequence
+        write_json_atomic(self.output_path / "metadata.json", full_metadata)
+
+        # The sequence is complete, so there is nothing left to resume
+        if self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+        print(f"✓ Sequence saved to: {self.output_path}")
+        print(f"✓ Phase 3 data saved to: {self.phase3_dir}")
+
+        return full_metadata
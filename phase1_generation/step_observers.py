@@ -0,0 +1,492 @@
+"""
+Step Observers
+Phase 1: Pluggable per-step capture with cost accounting
+
+Everything captured after a denoising step - Phase 3 arrays, frames,
+statistics, attention maps - is a registered observer with its own capture
+stride. The generator times every observer and counts the bytes it
+produces, and both go into metadata.json, so a run shows which capture
+features cost what and the expensive ones can be thinned out or turned off.
+"""
+
+import math
+import time
+
+import torch
+
+from early_exit import predict_original_sample
+from latent_decoding import decode_latents
+
+
+class StepObserver:
+    name = None
+    # Stride used by default_observers() when none is given (0 = off unless requested)
+    default_stride = 1
+    # Waits for queued device work (set by DiffusionStepCapture(profile_observers=True));
+    # without it, time on a GPU covers launching the observer's work, not running it
+    synchronize = None
+
+    def __init__(self, stride=1):
+        """
+        Base class for per-step capture.
+
+        Args:
+            stride: Observe every Nth frame (frames whose index is a multiple of stride)
+        """
+        self.stride = max(1, int(stride))
+        self.reset()
+
+    def wants(self, frame_index):
+        """Whether this observer captures the given frame."""
+        return frame_index % self.stride == 0
+
+    def before_step(self, capture, frame_index):
+        """
+        Prepare for the UNet call(s) producing a frame (e.g. switch capture hooks on or off).
+
+        Args:
+            capture: DiffusionStepCapture running the generation
+            frame_index: Index of the upcoming frame
+        """
+
+    def observe(self, capture, step, recorders):
+        """
+        Capture one completed step.
+
+        Args:
+            capture: DiffusionStepCapture running the generation
+            step: Step context built by DiffusionStepCapture._record_step - the
+                batch's "latents", "noise_pred", and "sample" (the latents the noise
+                was predicted for) plus per-sample metadata
+                "entries", "stats", "images", and "attention_maps" to fill in
+            recorders: Active SequenceRecorders, one per batch element
+                (empty when the generation is only streamed)
+
+        Returns:
+            Number of bytes produced, or None if the observer decided to skip the step
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Complete deferred work for the steps observed so far (called before checkpoints)."""
+
+    def finish(self, capture, recorders):
+        """
+        Complete work left over at the end of a generation (e.g. deferred decoding).
+
+        Returns:
+            Number of bytes produced
+        """
+        self.flush()
+        return 0
+
+    def run(self, method, *args, count_step=True):
+        """
+        Call one of the observer's methods and account its wall time and output.
+
+        Returns:
+            (seconds, bytes) spent by this call - bytes is None if the step was skipped
+        """
+        if self.synchronize is not None:
+            self.synchronize()
+        start = time.perf_counter()
+        num_bytes = method(*args)
+        if self.synchronize is not None:
+            self.synchronize()
+        seconds = time.perf_counter() - start
+
+        self.seconds += seconds
+        self.bytes += num_bytes or 0
+        if count_step and num_bytes is not None:
+            self.steps += 1
+
+        return seconds, num_bytes
+
+    def reset(self):
+        """Start a new generation (clears the accounted cost)."""
+        self.steps = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def config(self):
+        """
+        Describe the observer's settings (a checkpoint only resumes with the same settings).
+
+        Returns:
+            JSON-serializable dict
+        """
+        return {"stride": self.stride}
+
+    def cost(self):
+        """
+        Summarize the settings and accounted cost.
+
+        Returns:
+            Dict for metadata.json (totals and per observed step)
+        """
+        return {
+            **self.config(),
+            # "host": time to run (on a GPU: to launch) the observer's work; "device": until it finished
+            "timing": "device" if self.synchronize is not None else "host",
+            "steps": self.steps,
+            "seconds": self.seconds,
+            "bytes": self.bytes,
+            "ms_per_step": 1000 * self.seconds / self.steps if self.steps else 0.0,
+            "bytes_per_step": self.bytes / self.steps if self.steps else 0.0
+        }
+
+    def state_dict(self):
+        """
+        Describe the observer's progress, for a checkpoint.
+
+        Returns:
+            Dict that load_state_dict() accepts
+        """
+        return {"steps": self.steps, "seconds": self.seconds, "bytes": self.bytes}
+
+    def load_state_dict(self, state):
+        """Continue a generation from a checkpointed state_dict()."""
+        self.steps = state["steps"]
+        self.seconds = state["seconds"]
+        self.bytes = state["bytes"]
+
+
+class LatentObserver(StepObserver):
+    name = "latents"
+
+    def observe(self, capture, step, recorders):
+        """
+        Stream latents and predicted noise into phase3_data/*.npy.
+
+        Rows are written back to back, so with a stride > 1 the step entries
+        are marked and metadata.json lists the frame of every row
+        ("latent_frame_indices").
+        """
+        num_bytes = 0
+        for i, recorder in enumerate(recorders):
+            num_bytes += recorder.write_arrays(step["latents"][i:i + 1], step["noise_pred"][i:i + 1])
+            step["entries"][i]["phase3_latents"] = True
+        return num_bytes
+
+
+class FrameObserver(StepObserver):
+    name = "frames"
+
+    def observe(self, capture, step, recorders):
+        """
+        Decode and save the step frames: full VAE for keyframes (unless
+        deferred for batching), cheap linear projection for preview frames.
+        """
+        latents = step["latents"]
+        use_vae = capture._is_keyframe(step["frame_index"])
+
+        for entry in step["entries"]:
+            entry["decoder"] = "vae" if use_vae else "preview"
+
+        if not recorders:
+            return 0
+
+        # Decode the whole batch at once
+        images = [None] * len(recorders)
+        if not use_vae:
+            images = capture.preview_decoder.decode(latents)
+        elif capture.decode_mode == "sync":
+            images = decode_latents(capture.pipe.vae, latents, capture.decode_memory_budget)
+
+        for i, (recorder, image) in enumerate(zip(recorders, images)):
+            step["entries"][i]["frame"] = recorder.add_frame(image, latents[i:i + 1])
+        step["images"] = images
+
+        # Raw RGB size (deferred frames are decoded to the same size later)
+        scale = capture.pipe.vae_scale_factor
+        return len(recorders) * latents.shape[2] * scale * latents.shape[3] * scale * 3
+
+    def finish(self, capture, recorders):
+        """Decode whatever was deferred."""
+        for recorder in recorders:
+            recorder.finish_frames()
+        return super().finish(capture, recorders)
+
+
+class AdaptiveFrameObserver(FrameObserver):
+    def __init__(self, threshold=0.05, max_interval=None, min_frames=None, max_frames=None, stride=1):
+        """
+        Save frames only once the latents have changed enough since the last saved frame.
+
+        Late steps of long runs barely change the image, so decoding and saving
+        every one of them is mostly wasted. The relative change of the latents
+        is measured on the device each step and accumulated; a frame is saved
+        when the sum crosses the threshold. The first and last frames (including
+        the exit frame of an early exit) are always saved, and metadata.json
+        lists the saved frames so viewers and analyzers can interpolate between
+        them. Deciding whether to save needs the accumulated change on the
+        host, so this opt-in policy syncs once per step it has to decide on
+        (steps ruled out by max_frames, and the first and last frames, do not).
+
+        Args:
+            threshold: Accumulated relative latent change (||x_t - x_t-1|| / ||x_t-1||,
+                summed over steps) that triggers a frame
+            max_interval: Also save a frame once this many seconds passed since the last one
+            min_frames: Save at least about this many frames (forces a frame after
+                num_frames / min_frames steps without one)
+            max_frames: Save at most about this many frames (keeps saved frames at
+                least num_frames / max_frames steps apart)
+            stride: Only consider every Nth frame
+        """
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        super().__init__(stride=stride)
+
+    def reset(self):
+        super().reset()
+        self._previous = None
+        self._change = 0.0
+        self._last_frame = None
+        self._last_time = time.perf_counter()
+
+    def config(self):
+        return {
+            "stride": self.stride,
+            "policy": "adaptive",
+            "threshold": self.threshold,
+            "max_interval": self.max_interval,
+            "min_frames": self.min_frames,
+            "max_frames": self.max_frames
+        }
+
+    def _saves_frame(self, frame_index, num_frames, final):
+        """Decide whether the current frame is saved (after the change was accumulated)."""
+        if self._last_frame is None or final:
+            return True
+
+        gap = frame_index - self._last_frame
+        if self.min_frames and gap >= max(1, num_frames // self.min_frames):
+            return True
+        if self.max_frames and gap < math.ceil(num_frames / self.max_frames):
+            return False
+
+        # The only read of the accumulated change (one sync per frame that gets this far)
+        if float(self._change) >= self.threshold:
+            return True
+        return self.max_interval is not None and time.perf_counter() - self._last_time >= self.max_interval
+
+    def observe(self, capture, step, recorders):
+        """Accumulate the latent change and save a frame once it is large enough."""
+        latents = step["latents"]
+
+        if self._previous is not None:
+            # Largest relative change in the batch, accumulated on the device
+            previous = self._previous.to(latents.device).flatten(1).float()
+            delta = (latents.flatten(1).float() - previous).norm(dim=1) / previous.norm(dim=1).clamp_min(1e-8)
+            self._change = self._change + delta.max()
+        self._previous = latents.detach().clone()
+
+        if not self._saves_frame(step["frame_index"], step["num_frames"], step["final"]):
+            return None
+
+        self._change = 0.0
+        self._last_frame = step["frame_index"]
+        self._last_time = time.perf_counter()
+
+        return super().observe(capture, step, recorders)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state.update({
+            "previous": self._previous.cpu() if self._previous is not None else None,
+            "change": float(self._change),
+            "last_frame": self._last_frame
+        })
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self._previous = state["previous"]
+        self._change = state["change"]
+        self._last_frame = state["last_frame"]
+        self._last_time = time.perf_counter()
+
+
+class X0FrameObserver(StepObserver):
+    name = "x0_frames"
+    default_stride = 0
+
+    def observe(self, capture, step, recorders):
+        """
+        Save the scheduler's prediction of the clean image as a parallel frame track.
+
+        Frames of noisy latents show little for most of the trajectory; the
+        predicted x0 shows where each step is heading. The predictions are
+        only queued here and VAE decoded in batches (on the background worker
+        in "background" decode mode, otherwise when the sequence finishes) into
+        x0_step_XXXX.png.
+        """
+        if not recorders:
+            return 0
+
+        x0 = predict_original_sample(capture.pipe.scheduler, step["sample"], step["noise_pred"], step["timestep"])
+        for i, recorder in enumerate(recorders):
+            step["entries"][i]["x0_frame"] = recorder.add_x0_frame(x0[i:i + 1])
+
+        # Raw RGB size of the frames decoded later
+        scale = capture.pipe.vae_scale_factor
+        return len(recorders) * x0.shape[2] * scale * x0.shape[3] * scale * 3
+
+
+class StatsObserver(StepObserver):
+    name = "stats"
+
+    def reset(self):
+        super().reset()
+        self._buffer = None
+        self._rows = 0
+        self._pending = []
+        self._previous = None
+
+    def observe(self, capture, step, recorders):
+        """
+        Compute per-sample step statistics without leaving the device.
+
+        Each step's statistics go into one row of a preallocated device tensor;
+        they are copied to the host in one transfer when flushed (at
+        checkpoints, at the end of the run, or when a StepRecord's stats are read).
+
+        Statistics per sample:
+        - noise_variance: Standard deviation of the latents (approximation)
+        - latent_mean: Mean of the latents
+        - channel_mean, channel_std: Per latent channel moments
+        - delta_norm: L2 norm of the change since the previous step (None for the first)
+        """
+        latents = step["latents"].detach()
+        batch_size, num_channels = latents.shape[:2]
+
+        if self._buffer is None:
+            self._buffer = torch.full(
+                (step["num_frames"], batch_size, 3 + 2 * num_channels),
+                float("nan"),
+                device=latents.device,
+                dtype=torch.float32
+            )
+
+        flat = latents.float().flatten(2)
+        row = self._buffer[self._rows]
+        row[:, 0] = flat.flatten(1).std(dim=1)
+        row[:, 1] = flat.flatten(1).mean(dim=1)
+        row[:, 2:2 + num_channels] = flat.mean(dim=2)
+        row[:, 2 + num_channels:2 + 2 * num_channels] = flat.std(dim=2)
+        if self._previous is not None:
+            row[:, -1] = (flat - self._previous.to(flat.device)).flatten(1).norm(dim=1)
+        self._previous = flat.clone()
+
+        self._rows += 1
+        self._pending.append(list(zip(step["stats"], step["entries"])))
+
+        return row.numel() * row.element_size()
+
+    def flush(self):
+        """Copy the collected rows to the host (one sync) and fill in the metadata."""
+        if not self._pending:
+            return
+
+        values = self._buffer[:self._rows].cpu().numpy()
+        num_channels = (values.shape[2] - 3) // 2
+
+        for step_values, targets in zip(values, self._pending):
+            for sample_values, (stats, entry) in zip(step_values, targets):
+                delta_norm = float(sample_values[-1])
+                sample_stats = {
+                    "noise_variance": float(sample_values[0]),
+                    "latent_mean": float(sample_values[1]),
+                    "channel_mean": sample_values[2:2 + num_channels].tolist(),
+                    "channel_std": sample_values[2 + num_channels:2 + 2 * num_channels].tolist(),
+                    "delta_norm": None if math.isnan(delta_norm) else delta_norm
+                }
+                stats.update(sample_stats)
+                entry.update(sample_stats)
+
+        self._buffer.fill_(float("nan"))
+        self._rows = 0
+        self._pending = []
+
+    def state_dict(self):
+        state = super().state_dict()
+        state["previous"] = self._previous.cpu() if self._previous is not None else None
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self._previous = state["previous"]
+
+
+class AttentionObserver(StepObserver):
+    name = "attention"
+
+    def before_step(self, capture, frame_index):
+        """Only run the attention hooks for frames this observer captures."""
+        capture.attention_store.enabled = self.wants(frame_index)
+
+    def observe(self, capture, step, recorders):
+        """
+        Collect this step's attention maps (already averaged on the device).
+
+        Like the latents, stored steps are marked in the step entries, and
+        metadata.json lists their frames ("attention_frame_indices").
+        """
+        step_maps = capture.attention_store.pop_step()
+
+        num_bytes = 0
+        for i, attention_maps in enumerate(step["attention_maps"]):
+            attention_maps.update({resolution: maps[i] for resolution, maps in step_maps.items()})
+            num_bytes += sum(maps.nbytes for maps in attention_maps.values())
+            if recorders and attention_maps and recorders[i].write_attention(attention_maps):
+                step["entries"][i]["phase3_attention"] = True
+
+        return num_bytes
+
+    def finish(self, capture, recorders):
+        capture.attention_store.enabled = True
+        return super().finish(capture, recorders)
+
+
+# Observer classes by name, in the order they run
+OBSERVER_TYPES = {
+    observer_type.name: observer_type
+    for observer_type in (LatentObserver, FrameObserver, X0FrameObserver, StatsObserver, AttentionObserver)
+}
+
+
+def default_observers(capture_attention=True, strides=None, adaptive_frames=None):
+    """
+    Build the standard observers.
+
+    Args:
+        capture_attention: Include the attention observer
+        strides: Optional dict mapping observer names to strides
+            (0 or None turns that observer off; observers with a default_stride
+            of 0, such as "x0_frames", only run when given a stride)
+        adaptive_frames: Keyword arguments for AdaptiveFrameObserver, which then
+            replaces the fixed-stride frame observer (None = save every frame)
+
+    Returns:
+        List of StepObservers
+    """
+    strides = strides or {}
+    unknown = set(strides) - set(OBSERVER_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown step observers: {', '.join(sorted(unknown))}")
+
+    observers = []
+    for name, observer_type in OBSERVER_TYPES.items():
+        if name == "attention" and not capture_attention:
+            continue
+        stride = strides.get(name, observer_type.default_stride)
+        if not stride:
+            continue
+        if name == "frames" and adaptive_frames is not None:
+            observers.append(AdaptiveFrameObserver(stride=stride, **adaptive_frames))
+        else:
+            observers.append(observer_type(stride=stride))
+
+    return observers
@@ -0,0 +1,103 @@
+"""
+Step Stream
+Phase 1: Consume a generation one denoising step at a time
+
+Returning every intermediate PIL image at the end of a generation keeps the
+whole sequence in memory. DiffusionStepCapture.iter_steps() instead yields a
+StepRecord as each step completes - its latents, statistics, attention maps,
+and a frame that is only decoded when asked for - so consumers can process
+frames online while memory stays constant in the number of steps.
+"""
+
+
+class StepRecord:
+    def __init__(self, index, step, timestep, latents, noise_pred, stats, resolve_stats=None,
+                 metadata=None, attention_maps=None, image=None, decode=None):
+        """
+        One completed denoising step of one sequence.
+
+        Args:
+            index: Frame index of the step within the sequence
+            step: Step index reported by the denoising loop
+            timestep: Scheduler timestep
+            latents: Latents after the step, shape (1, C, H, W) (a view, not a copy)
+            noise_pred: Guided noise prediction of the step, shape (1, C, H, W)
+            stats: Dict of per-step statistics (e.g. noise_variance), possibly
+                filled in later when statistics are collected on the device
+            resolve_stats: Callable that fills in deferred statistics (run on first access)
+            metadata: The step's entry for metadata.json
+            attention_maps: Dict mapping "HxW" to [tokens, H, W] arrays (empty if not captured)
+            image: Frame that was already decoded for saving, if any
+            decode: Callable(latents) -> PIL Image used to decode the frame on first access
+        """
+        self.index = index
+        self.step = step
+        self.timestep = timestep
+        self.latents = latents
+        self.noise_pred = noise_pred
+        self._stats = stats
+        self._resolve_stats = resolve_stats
+        self.metadata = metadata
+        self.attention_maps = attention_maps or {}
+
+        self._image = image
+        self._decode = decode
+
+    @property
+    def stats(self):
+        """The step's statistics (waits for deferred statistics on first access)."""
+        if self._resolve_stats is not None:
+            self._resolve_stats()
+            self._resolve_stats = None
+        return self._stats
+
+    @property
+    def image(self):
+        """The step's frame as a PIL Image (decoded on first access)."""
+        if self._image is None and self._decode is not None:
+            self._image = self._decode(self.latents)
+        return self._image
+
+    def __repr__(self):
+        return f"StepRecord(index={self.index}, step={self.step}, timestep={self.timestep})"
+
+
+class StepStream:
+    def __init__(self, steps):
+        """
+        Iterator over the StepRecords of a running generation.
+
+        Once exhausted, final_image, frames, and metadata describe the finished sequence.
+
+        Args:
+            steps: Generator yielding StepRecords and returning
+                (final_image, frames, metadata) when generation completes
+        """
+        self._steps = steps
+        self.final_image = None
+        self.frames = None
+        self.metadata = None
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._steps)
+        except StopIteration as stop:
+            if not self.finished:
+                self.final_image, self.frames, self.metadata = stop.value
+                self.finished = True
+            raise
+
+    def run(self):
+        """
+        Consume the remaining steps.
+
+        Returns:
+            (final_image, frames, metadata)
+        """
+        for _ in self:
+            pass
+        return self.final_image, self.frames, self.metadata
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The phase 1 scripts import each other by module name, as when run from phase1_generation/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
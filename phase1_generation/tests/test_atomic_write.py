@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from atomic_write import write_atomic, write_json_atomic
+
+
+def test_json_replaces_file_without_leftovers(tmp_path):
+    path = tmp_path / "metadata.json"
+    path.write_text("old")
+
+    assert write_json_atomic(path, {"a": [1, 2]}) == path
+    assert json.loads(path.read_text()) == {"a": [1, 2]}
+    assert "\n  " in path.read_text()
+
+    write_json_atomic(path, {"a": [1, 2]}, indent=None, separators=(",", ":"))
+    assert path.read_text() == '{"a":[1,2]}'
+    assert [file.name for file in tmp_path.iterdir()] == ["metadata.json"]
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = tmp_path / "checkpoint.pt"
+    path.write_bytes(b"complete")
+
+    def write(tmp_path):
+        tmp_path.write_bytes(b"part")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(path, write)
+    assert path.read_bytes() == b"complete"
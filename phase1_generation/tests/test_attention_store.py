@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from attention_store import AttentionStoreReader, AttentionStoreWriter
+
+
+NUM_STEPS = 12
+NUM_TOKENS = 3
+
+
+def step_maps(step):
+    # float16-exact values that identify step, token and pixel
+    return {
+        resolution: np.stack([
+            np.full((size, size), step * 10 + token, dtype=np.float32) + np.eye(size, dtype=np.float32)
+            for token in range(NUM_TOKENS)
+        ])
+        for resolution, size in (("8x8", 8), ("4x4", 4))
+    }
+
+
+@pytest.mark.parametrize("checkpoint_step", [5, 7])
+def test_resume_round_trip(tmp_path, checkpoint_step):
+    store_dir = tmp_path / "attention"
+
+    # First run crosses the first chunk boundary, checkpoints, and writes one more step before dying
+    writer = AttentionStoreWriter(store_dir, NUM_STEPS, chunk_size=5)
+    for step in range(checkpoint_step):
+        writer.write_step(step_maps(step))
+    state = writer.state_dict()
+    writer.write_step(step_maps(99))
+
+    resumed = AttentionStoreWriter(store_dir, NUM_STEPS, chunk_size=5)
+    resumed.load_state_dict(state)
+    for step in range(checkpoint_step, NUM_STEPS):
+        resumed.write_step(step_maps(step))
+    assert resumed.close() == NUM_STEPS
+
+    reader = AttentionStoreReader(store_dir)
+    assert len(reader) == NUM_STEPS
+    assert reader.num_tokens == NUM_TOKENS
+    assert sorted(reader.resolutions) == ["4x4", "8x8"]
+    for resolution in reader.resolutions:
+        chunks = reader.index["resolutions"][resolution]["chunks"]
+        assert [(chunk["start_step"], chunk["num_steps"]) for chunk in chunks] == [(0, 5), (5, 5), (10, 2)]
+
+    for step in range(NUM_STEPS):
+        loaded = reader[step]
+        for resolution, expected in step_maps(step).items():
+            assert loaded[resolution].dtype == np.float16
+            np.testing.assert_array_equal(loaded[resolution], expected)
+
+    token = reader.load_token(2, "4x4")
+    assert token.shape == (NUM_STEPS, 4, 4)
+    np.testing.assert_array_equal(token, np.stack([step_maps(step)["4x4"][2] for step in range(NUM_STEPS)]))
+
+    assert list(reader.load_step(3, resolutions=["8x8"])) == ["8x8"]
+    with pytest.raises(IndexError):
+        reader.load_step(NUM_STEPS)
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+
+from build_sequence_manifest import MANIFEST_FILENAME, build_manifest, load_manifest
+
+
+def write_metadata(sequence_dir, **metadata):
+    sequence_dir.mkdir(parents=True, exist_ok=True)
+    metadata_path = sequence_dir / "metadata.json"
+    existed = metadata_path.exists()
+    stat = metadata_path.stat() if existed else None
+
+    metadata.setdefault("frame_indices", [0, 1, 2])
+    metadata.setdefault("steps", [{"step": i, "noise_variance": 1.0 - i / 4} for i in range(3)])
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f)
+
+    # Make a rewrite visible even on filesystems with coarse timestamps
+    if existed:
+        os.utime(metadata_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def make_tree(base_dir):
+    write_metadata(base_dir / "01_standard", prompt="a cat")
+    write_metadata(base_dir / "fakenews_truth_vs_lies_paradox", prompt="a headline")
+    # Forks record their parent relative to their own directory
+    write_metadata(
+        base_dir / "forks" / "cat_fork",
+        prompt="a dog",
+        frame_indices=[2],
+        fork={"parent_dir": "../../01_standard", "fork_step": 1, "first_frame": 2, "prefix_frames": []}
+    )
+
+
+def test_second_run_reuses_every_entry(tmp_path):
+    make_tree(tmp_path)
+
+    assert build_manifest(tmp_path) == {"added": 3, "updated": 0, "unchanged": 0, "failed": 0, "removed": 0}
+    first = load_manifest(tmp_path / MANIFEST_FILENAME)
+
+    assert build_manifest(tmp_path) == {"added": 0, "updated": 0, "unchanged": 3, "failed": 0, "removed": 0}
+    assert load_manifest(tmp_path / MANIFEST_FILENAME)["sequences"] == first["sequences"]
+
+
+def test_only_touched_sequence_is_rebuilt(tmp_path):
+    make_tree(tmp_path)
+    build_manifest(tmp_path)
+
+    write_metadata(tmp_path / "01_standard", prompt="a different cat")
+    shutil.rmtree(tmp_path / "fakenews_truth_vs_lies_paradox")
+
+    assert build_manifest(tmp_path) == {"added": 0, "updated": 1, "unchanged": 1, "failed": 0, "removed": 1}
+    entries = {entry["id"]: entry for entry in load_manifest(tmp_path / MANIFEST_FILENAME)["sequences"]}
+    assert sorted(entries) == ["01_standard", "forks/cat_fork"]
+    assert entries["01_standard"]["prompt"] == "a different cat"
+
+
+def test_changed_settings_rebuild_everything(tmp_path):
+    make_tree(tmp_path)
+    build_manifest(tmp_path)
+
+    assert build_manifest(tmp_path, curve_points=2)["updated"] == 3
+    assert build_manifest(tmp_path, curve_points=2, force=True)["updated"] == 3
+
+
+def test_fork_parent_resolves_to_a_sequence(tmp_path):
+    make_tree(tmp_path)
+    manifest_path = tmp_path / "viewer" / MANIFEST_FILENAME
+    build_manifest(tmp_path, manifest_path)
+
+    manifest = load_manifest(manifest_path)
+    entries = {entry["id"]: entry for entry in manifest["sequences"]}
+    fork = entries["forks/cat_fork"]["fork"]
+    assert fork["parent"] == "01_standard"
+    assert fork["parent"] in entries
+    assert fork["first_frame"] == 2
+
+    # URLs are relative to the manifest, which is outside the sequence directory here
+    assert entries["forks/cat_fork"]["frames"] == ["../forks/cat_fork/step_0002.png"]
+    assert entries["01_standard"]["final"] == "../01_standard/final.png"
+    assert (entries["fakenews_truth_vs_lies_paradox"]["theme"], entries["fakenews_truth_vs_lies_paradox"]["mode"]) == (
+        "truth_vs_lies", "paradox"
+    )
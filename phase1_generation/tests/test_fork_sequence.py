@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+
+from diffusion_step_generator import DiffusionStepCapture
+
+
+def write_metadata(sequence_dir, **metadata):
+    sequence_dir.mkdir(parents=True)
+    with open(sequence_dir / "metadata.json", "w") as f:
+        json.dump(metadata, f)
+
+
+def test_fork_of_a_fork_is_rejected(tmp_path):
+    # A fork's stored arrays start at its branch point, so replaying them from frame 0 would be wrong
+    write_metadata(
+        tmp_path / "f1",
+        prompt="a cat",
+        num_inference_steps=12,
+        phase3_data_available={"latent_vectors": True, "predicted_noise": True},
+        fork={"parent_dir": "../parent", "fork_step": 3, "first_frame": 4, "prefix_frames": []}
+    )
+
+    # The parent is checked before the pipeline is touched, so no model is needed
+    generator = DiffusionStepCapture.__new__(DiffusionStepCapture)
+    with pytest.raises(ValueError, match="itself a fork"):
+        generator.fork_sequence(tmp_path / "f1", 7, tmp_path / "f2")
+
+    assert not (tmp_path / "f2").exists()
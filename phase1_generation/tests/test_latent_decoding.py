@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from latent_decoding import MIN_TILE_SIZE, _tile_starts, estimate_decode_memory, plan_tiles, tiled_vae_decode
+
+
+class FakeVAE:
+    """Stands in for an SD AutoencoderKL: the estimate only reads dtype and config, decode upsamples 8x."""
+
+    dtype = torch.float32
+    config = SimpleNamespace(block_out_channels=[128, 256, 512, 512])
+
+    def decode(self, latents):
+        return SimpleNamespace(sample=torch.nn.functional.interpolate(latents[:, :3], scale_factor=8, mode="nearest"))
+
+
+def test_budget_fitting_the_whole_batch_does_not_tile():
+    vae = FakeVAE()
+    budget = estimate_decode_memory(vae, 4, 64, 64)
+
+    assert plan_tiles(vae, 4, 64, 64, budget) == (None, 4)
+    assert plan_tiles(vae, 4, 64, 64, None) == (None, 4)
+
+
+def test_budget_for_one_latent_splits_the_batch():
+    vae = FakeVAE()
+    budget = estimate_decode_memory(vae, 1, 64, 64)
+
+    assert plan_tiles(vae, 4, 64, 64, budget) == (None, 1)
+
+
+def test_budget_below_one_latent_forces_tiles():
+    vae = FakeVAE()
+    budget = estimate_decode_memory(vae, 1, 32, 32)
+
+    tile_size, sub_batch_size = plan_tiles(vae, 4, 64, 64, budget)
+    assert tile_size == 32
+    assert tile_size % MIN_TILE_SIZE == 0
+    assert 1 <= sub_batch_size <= 4
+    assert estimate_decode_memory(vae, sub_batch_size, tile_size, tile_size) <= budget
+
+
+def test_tiny_budget_falls_back_to_min_tile():
+    assert plan_tiles(FakeVAE(), 2, 64, 64, 1) == (MIN_TILE_SIZE, 1)
+
+
+@pytest.mark.parametrize("size", [1, 7, 8, 9, 16, 19, 20, 64, 97, 128])
+@pytest.mark.parametrize("tile_size,stride", [(8, 6), (8, 4), (8, 8), (16, 12), (32, 24)])
+def test_tile_starts_cover_flush_and_overlap(size, tile_size, stride):
+    starts = _tile_starts(size, tile_size, stride)
+
+    assert starts[0] == 0
+    assert starts == sorted(set(starts))
+    if size <= tile_size:
+        assert starts == [0]
+    else:
+        # The edge tile ends exactly at the border, never past it
+        assert starts[-1] + tile_size == size
+    for previous, start in zip(starts, starts[1:]):
+        overlap = previous + tile_size - start
+        assert 0 <= overlap < tile_size
+
+
+@pytest.mark.parametrize("latent_size,tile_size", [(16, 8), (19, 8), (24, 16), (8, 8)])
+def test_tiled_decode_matches_whole_decode(latent_size, tile_size):
+    vae = FakeVAE()
+    latents = torch.randn(2, 4, latent_size, latent_size + 3)
+
+    tiled = tiled_vae_decode(vae, latents, tile_size)
+
+    torch.testing.assert_close(tiled, vae.decode(latents).sample)
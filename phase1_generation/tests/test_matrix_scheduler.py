@@ -0,0 +1,135 @@
+import pytest
+
+from frame_writer import STANDARD_RENDITIONS
+from matrix_scheduler import (
+    MatrixScheduler, generator_settings, group_jobs, is_job_done, params_hash, run_jobs
+)
+
+
+PARAMS = {"prompt": "a cat", "num_inference_steps": 20, "guidance_scale": 7.5, "seed": 42}
+
+
+def job_hash(tmp_path, generator_kwargs, params=PARAMS):
+    scheduler = MatrixScheduler(tmp_path, generator_kwargs=generator_kwargs)
+    scheduler.add_job("job", dict(params))
+    return scheduler.jobs[0]["params_hash"]
+
+
+def test_params_hash_ignores_key_order():
+    assert params_hash(PARAMS) == params_hash(dict(reversed(list(PARAMS.items()))))
+    assert params_hash(PARAMS) != params_hash(dict(PARAMS, seed=43))
+
+
+def test_generator_settings_keep_only_output_affecting_options():
+    settings = generator_settings({
+        "device": "cuda",
+        "decode_mode": "deferred",
+        "frame_writer_workers": 8,
+        "profile_observers": True,
+        "long_trajectory": True,
+        "decode_memory_budget": None,
+        "observer_strides": {},
+        "capture_attention": False,
+        "frame_renditions": STANDARD_RENDITIONS
+    })
+
+    assert settings == {
+        "capture_attention": False,
+        "frame_renditions": [rendition.describe() for rendition in STANDARD_RENDITIONS]
+    }
+
+
+def test_hash_without_generator_settings_matches_earlier_runs(tmp_path):
+    assert job_hash(tmp_path, None) == params_hash(PARAMS)
+    assert job_hash(tmp_path, {"device": "cpu"}) == params_hash(PARAMS)
+
+
+@pytest.mark.parametrize("runtime_kwargs", [
+    {"device": "cuda"},
+    {"decode_mode": "deferred", "decode_batch_size": 4},
+    {"frame_writer_workers": 1, "prompt_cache_dir": "/tmp/cache"},
+    {"long_trajectory": True, "profile_observers": True},
+])
+def test_runtime_only_options_keep_the_hash(tmp_path, runtime_kwargs):
+    base = {"device": "cpu", "observer_strides": {"x0_preview": 5}}
+
+    assert job_hash(tmp_path, dict(base, **runtime_kwargs)) == job_hash(tmp_path, base)
+
+
+@pytest.mark.parametrize("changed_kwargs", [
+    {"observer_strides": {"x0_preview": 2}},
+    {"adaptive_frames": 0.05},
+    {"scheduler": "pndm"},
+    {"capture_attention": False},
+    {"frame_renditions": STANDARD_RENDITIONS},
+])
+def test_output_affecting_options_change_the_hash(tmp_path, changed_kwargs):
+    base = {"device": "cpu", "observer_strides": {"x0_preview": 5}}
+
+    assert job_hash(tmp_path, dict(base, **changed_kwargs)) != job_hash(tmp_path, base)
+
+
+def make_jobs(*overrides):
+    return [
+        {"job_id": f"job{i}", "output_dir": f"out/job{i}", "params": dict(PARAMS, **override)}
+        for i, override in enumerate(overrides)
+    ]
+
+
+def group_ids(groups):
+    return [[job["job_id"] for job in group] for group in groups]
+
+
+def test_group_jobs_merges_only_guidance_differences():
+    jobs = make_jobs(
+        {},
+        {"guidance_scale": 15.0},
+        {"seed": 7},
+        {"guidance_scale": 1.0},
+        {"seed": 7, "guidance_scale": 3.0},
+        {"prompt": "a dog", "guidance_scale": 15.0},
+    )
+
+    assert group_ids(group_jobs(jobs, 4)) == [["job0", "job1", "job3"], ["job2", "job4"], ["job5"]]
+
+
+def test_group_jobs_respects_max_group_size():
+    jobs = make_jobs({}, {"guidance_scale": 2.0}, {"guidance_scale": 3.0})
+
+    assert group_ids(group_jobs(jobs, 2)) == [["job0", "job1"], ["job2"]]
+    assert group_ids(group_jobs(jobs, 1)) == [["job0"], ["job1"], ["job2"]]
+    assert group_ids(group_jobs(jobs, 0)) == [["job0"], ["job1"], ["job2"]]
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = []
+
+    def generate_sequence(self, **kwargs):
+        self.calls.append(("sequence", kwargs))
+
+    def generate_guidance_sweep(self, **kwargs):
+        self.calls.append(("sweep", kwargs))
+
+
+def test_run_jobs_sweeps_a_group_and_marks_it_done(tmp_path):
+    scheduler = MatrixScheduler(tmp_path)
+    scheduler.add_job("low", dict(PARAMS, guidance_scale=3.0))
+    scheduler.add_job("high", dict(PARAMS, guidance_scale=12.0))
+    for job in scheduler.jobs:
+        (tmp_path / job["job_id"]).mkdir()
+    assert not any(is_job_done(job) for job in scheduler.jobs)
+
+    generator = FakeGenerator()
+    run_jobs(generator, scheduler.jobs, checkpoint_every=5)
+
+    [(kind, kwargs)] = generator.calls
+    assert kind == "sweep"
+    assert kwargs["guidance_scales"] == [3.0, 12.0]
+    assert kwargs["output_dirs"] == [str(tmp_path / "low"), str(tmp_path / "high")]
+    assert "guidance_scale" not in kwargs
+    assert all(is_job_done(job) for job in scheduler.jobs)
+
+    # A job whose parameters changed since it was marked is not done
+    changed = dict(scheduler.jobs[0], params_hash=params_hash(dict(PARAMS, seed=1)))
+    assert not is_job_done(changed)
@@ -0,0 +1,79 @@
+import json
+import os
+
+from PIL import Image
+
+from pack_sequences import ATLAS_FILENAME, BUNDLE_FILENAME, find_sequences, pack_sequence
+
+
+def make_sequence(sequence_dir, frame_indices, size=(16, 12)):
+    sequence_dir.mkdir(parents=True)
+    for index in frame_indices:
+        Image.new("RGB", size, (index * 20 % 256, 0, 0)).save(sequence_dir / f"step_{index:04d}.png")
+    with open(sequence_dir / "metadata.json", "w") as f:
+        json.dump({"prompt": sequence_dir.name, "frame_indices": frame_indices}, f)
+
+
+def read_metadata(sequence_dir):
+    with open(sequence_dir / "metadata.json") as f:
+        return json.load(f)
+
+
+def bump_mtime(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_bundle_slices_back_to_frames(tmp_path):
+    make_sequence(tmp_path / "a", [0, 2, 4])
+
+    assert pack_sequence(tmp_path / "a") == "packed"
+
+    packed = read_metadata(tmp_path / "a")["packed"]
+    data = (tmp_path / "a" / BUNDLE_FILENAME).read_bytes()
+    assert packed["bundle"]["bytes"] == len(data)
+    assert [frame["frame"] for frame in packed["bundle"]["frames"]] == [0, 2, 4]
+    for frame in packed["bundle"]["frames"]:
+        source = (tmp_path / "a" / f"step_{frame['frame']:04d}.png").read_bytes()
+        assert data[frame["offset"]:frame["offset"] + frame["length"]] == source
+
+
+def test_second_run_skips_and_only_touched_sequence_is_repacked(tmp_path):
+    for name in ("a", "b", "c"):
+        make_sequence(tmp_path / name, [0, 1, 2])
+    sequences = find_sequences(tmp_path)
+    assert [path.name for path in sequences] == ["a", "b", "c"]
+
+    assert [pack_sequence(path, ("bundle", "atlas")) for path in sequences] == ["packed"] * 3
+    signatures = {path.name: read_metadata(path)["packed"]["signature"] for path in sequences}
+
+    assert [pack_sequence(path, ("bundle", "atlas")) for path in sequences] == ["unchanged"] * 3
+
+    # Rewrite one frame of b only
+    frame = tmp_path / "b" / "step_0001.png"
+    Image.new("RGB", (16, 12), (0, 255, 0)).save(frame)
+    bump_mtime(frame)
+
+    assert [pack_sequence(path, ("bundle", "atlas")) for path in sequences] == ["unchanged", "packed", "unchanged"]
+    assert read_metadata(tmp_path / "b")["packed"]["signature"] != signatures["b"]
+    assert read_metadata(tmp_path / "a")["packed"]["signature"] == signatures["a"]
+
+
+def test_changed_settings_or_missing_output_repack(tmp_path):
+    make_sequence(tmp_path / "a", [0, 1])
+    assert pack_sequence(tmp_path / "a") == "packed"
+
+    assert pack_sequence(tmp_path / "a", ("bundle", "atlas")) == "packed"
+    assert (tmp_path / "a" / ATLAS_FILENAME).is_file()
+
+    (tmp_path / "a" / BUNDLE_FILENAME).unlink()
+    assert pack_sequence(tmp_path / "a", ("bundle", "atlas")) == "packed"
+    assert pack_sequence(tmp_path / "a", ("bundle", "atlas")) == "unchanged"
+    assert pack_sequence(tmp_path / "a", ("bundle", "atlas"), force=True) == "packed"
+
+
+def test_sequence_without_frames_is_empty(tmp_path):
+    make_sequence(tmp_path / "a", [])
+
+    assert pack_sequence(tmp_path / "a") == "empty"
+    assert "packed" not in read_metadata(tmp_path / "a")
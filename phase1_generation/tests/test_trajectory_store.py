@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from trajectory_store import StepArrayWriter, _header_bytes
+
+
+def steps(count, shape=(2, 3, 4), start=0):
+    ramp = np.arange(np.prod(shape), dtype=np.float32).reshape(shape)
+    return [ramp + (start + i) for i in range(count)]
+
+
+def assert_saved(path, expected):
+    np.testing.assert_array_equal(np.load(path), expected)
+    mapped = np.load(path, mmap_mode="r")
+    assert mapped.shape == np.shape(expected)
+    np.testing.assert_array_equal(mapped, expected)
+    del mapped
+
+
+def test_full_file_loads(tmp_path):
+    path = tmp_path / "latents.npy"
+    written = steps(5)
+
+    writer = StepArrayWriter(path, 5)
+    for step in written:
+        writer.write(step)
+
+    assert writer.close() == (5, 2, 3, 4)
+    assert_saved(path, np.stack(written))
+
+
+def test_early_close_shrinks_file(tmp_path):
+    path = tmp_path / "latents.npy"
+    written = steps(3)
+
+    writer = StepArrayWriter(path, 10, dtype=np.float16)
+    for step in written:
+        writer.write(step)
+
+    assert writer.close() == (3, 2, 3, 4)
+    assert np.load(path).dtype == np.float16
+    assert_saved(path, np.stack(written).astype(np.float16))
+
+
+def test_write_past_num_steps_is_rejected(tmp_path):
+    writer = StepArrayWriter(tmp_path / "latents.npy", 2)
+    writer.write(steps(1)[0])
+    writer.write(steps(1)[0])
+
+    with pytest.raises(IndexError):
+        writer.write(steps(1)[0])
+    writer.close()
+
+
+def test_reopen_appends_after_checkpointed_steps(tmp_path):
+    path = tmp_path / "latents.npy"
+    first, rest = steps(4), steps(3, start=4)
+
+    # An interrupted run: steps past the checkpoint were written but are not kept
+    writer = StepArrayWriter(path, 10)
+    for step in first + steps(2, start=100):
+        writer.write(step)
+    writer.flush()
+    writer._file.close()
+
+    resumed = StepArrayWriter(path, 10)
+    resumed.reopen(len(first))
+    for step in rest:
+        resumed.write(step)
+
+    assert resumed.close() == (7, 2, 3, 4)
+    assert_saved(path, np.stack(first + rest))
+
+
+def test_reopen_rewrites_header_of_other_length(tmp_path):
+    # A file from another writer may pad its header differently; the new header
+    # then does not fit in place and the steps are copied behind it
+    path = tmp_path / "latents.npy"
+    written = steps(3)
+
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (10, 2, 3, 4), }"
+    header += " " * (192 - 10 - len(header) - 1) + "\n"
+    with open(path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        for step in written:
+            f.write(step.tobytes())
+        f.truncate(10 + len(header) + 10 * written[0].nbytes)
+    assert len(_header_bytes("<f4", (3, 2, 3, 4))) != 10 + len(header)
+
+    writer = StepArrayWriter(path, 10)
+    writer.reopen(2)
+    writer.write(written[2])
+
+    assert writer.close() == (3, 2, 3, 4)
+    assert_saved(path, np.stack(written))
+    assert [file.name for file in tmp_path.iterdir()] == ["latents.npy"]
+
+
+def test_reopen_at_zero_starts_over(tmp_path):
+    path = tmp_path / "latents.npy"
+    path.write_bytes(b"partial")
+    written = steps(2)
+
+    writer = StepArrayWriter(path, 4)
+    writer.reopen(0)
+    for step in written:
+        writer.write(step)
+
+    assert writer.close() == (2, 2, 3, 4)
+    assert_saved(path, np.stack(written))
@@ -0,0 +1,156 @@
+"""
+Trajectory Store
+Phase 1: Stream per-step arrays straight to disk during generation
+
+Accumulating latents in a Python list and converting the whole list with
+np.array() at the end needs about twice the trajectory in memory. Instead,
+each step is written into a pre-sized .npy file as soon as it is captured,
+so only one step is held in RAM at a time. Steps are written with plain
+positioned file writes rather than through a memory map: written pages of a
+map stay in the process's resident memory, which would grow with the
+trajectory length. The files are plain .npy arrays, readable with np.load
+like before.
+"""
+
+import io
+from pathlib import Path
+
+import numpy as np
+
+from atomic_write import write_atomic
+
+
+def _header_bytes(dtype, shape):
+    """Encode a .npy (format 1.0) header."""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": shape
+    })
+    return header.getvalue()
+
+
+class StepArrayWriter:
+    def __init__(self, path, num_steps, dtype=None):
+        """
+        Initialize a streaming writer for one per-step array.
+
+        The file is created on the first write, once the per-step shape and
+        dtype are known, with room for num_steps entries.
+
+        Args:
+            path: Output .npy path
+            num_steps: Maximum number of steps that will be written
+            dtype: Storage dtype (None = dtype of the first written array)
+        """
+        self.path = Path(path)
+        self.num_steps = num_steps
+        self.dtype = dtype
+
+        self.count = 0
+
+        self._file = None
+        self._step_shape = None
+        self._data_offset = None
+
+    def _open(self, dtype, step_shape, capacity):
+        """Start a new file sized for capacity steps."""
+        self.dtype = np.dtype(dtype)
+        self._step_shape = tuple(step_shape)
+        header = _header_bytes(self.dtype, (capacity,) + self._step_shape)
+
+        self._file = open(self.path, "w+b")
+        self._file.write(header)
+        self._data_offset = len(header)
+        self._file.truncate(self._data_offset + capacity * self._step_bytes)
+
+    @property
+    def _step_bytes(self):
+        return int(np.prod(self._step_shape, dtype=np.int64)) * self.dtype.itemsize
+
+    def write(self, step_array):
+        """
+        Append one step to the file.
+
+        Args:
+            step_array: numpy array for this step (same shape every step)
+        """
+        if self._file is None:
+            self._open(self.dtype or step_array.dtype, step_array.shape, self.num_steps)
+
+        if self.count >= self.num_steps:
+            raise IndexError(f"{self.path.name} was sized for {self.num_steps} steps")
+
+        data = np.ascontiguousarray(step_array, dtype=self.dtype)
+        self._file.seek(self._data_offset + self.count * self._step_bytes)
+        self._file.write(data.data)
+        self.count += 1
+
+    def flush(self):
+        """Flush the steps written so far to disk (the file stays open for more)."""
+        if self._file is not None:
+            self._file.flush()
+
+    def reopen(self, count):
+        """
+        Continue an interrupted file: keep its first `count` steps and append after them.
+
+        Args:
+            count: Number of steps already written (e.g. recorded in a checkpoint)
+        """
+        self.count = count
+        if count == 0:
+            self._file = None
+            return
+
+        self._file = open(self.path, "r+b")
+        if np.lib.format.read_magic(self._file) == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(self._file)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(self._file)
+        self._data_offset = self._file.tell()
+
+        self.dtype = dtype
+        self._step_shape = tuple(shape[1:])
+        self.num_steps = shape[0]
+
+    def close(self):
+        """
+        Flush the file, shrinking it if fewer steps than num_steps were written.
+
+        Returns:
+            Final array shape, or None if nothing was written
+        """
+        if self._file is None:
+            return None
+
+        shape = (self.count,) + self._step_shape
+
+        if self.count < self.num_steps:
+            header = _header_bytes(self.dtype, shape)
+            if len(header) == self._data_offset:
+                # Same header size (the usual case): patch the shape and cut the file
+                self._file.seek(0)
+                self._file.write(header)
+                self._file.truncate(self._data_offset + self.count * self._step_bytes)
+            else:
+                # Header length changed, so copy the written steps into a right-sized file
+                def copy(tmp_path):
+                    with open(tmp_path, "wb") as tmp:
+                        tmp.write(header)
+                        self._file.seek(self._data_offset)
+                        remaining = self.count * self._step_bytes
+                        while remaining:
+                            chunk = self._file.read(min(remaining, 1 << 24))
+                            tmp.write(chunk)
+                            remaining -= len(chunk)
+                    self._file.close()
+                    self._file = None
+
+                write_atomic(self.path, copy)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return shape
@@ -35,7 +35,8 @@ def print_header(text):
     print("="*70 + "\n")
 
 
-def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False, device="mps"):
+def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False, device="mps",
+                     attribution_batch_size=None):
     """
     Run all Phase 3 analyses on a sequence.
 
@@ -44,6 +45,7 @@ def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False,
         skip_attribution: Skip token attribution (saves time)
         skip_semantic: Skip semantic emergence (requires CLIP)
         device: Device for token attribution generation
+        attribution_batch_size: Batch ablations in loops of this size (None = one generation per token)
     """
     sequence_dir = Path(sequence_dir)
 
@@ -68,7 +70,7 @@ def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False,
         # Visualize key steps
         print("Generating token-specific attention maps...")
         for step in [0, 10, 25, 49]:
-            if step < len(viz.attention_maps):
+            if viz.attention_position(step) is not None:
                 viz.visualize_token_attention(step)
 
         # Visualize evolution for key tokens
@@ -158,7 +160,10 @@ def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False,
 
             # Run attribution study
             print("Running attribution study...")
-            attribution_results = analyzer.run_attribution_study()
+            attribution_results = analyzer.run_attribution_study(
+                batched=attribution_batch_size is not None,
+                max_batch_size=attribution_batch_size or 4
+            )
 
             # Visualizations
             print("Creating visualizations...")
@@ -167,6 +172,7 @@ def analyze_sequence(sequence_dir, skip_attribution=False, skip_semantic=False,
 
             print("Exporting data...")
             analyzer.export_attribution_data(attribution_results)
+            analyzer.close()
 
             duration = time.time() - start
             results['token_attribution'] = {'success': True, 'duration': duration}
@@ -226,13 +232,21 @@ def main():
         help="Device for token attribution generation"
     )
 
+    parser.add_argument(
+        "--attribution-batch-size",
+        type=int,
+        default=None,
+        help="Run token ablations in batched denoising loops of this size"
+    )
+
     args = parser.parse_args()
 
     success = analyze_sequence(
         args.sequence_dir,
         skip_attribution=args.skip_attribution,
         skip_semantic=args.skip_semantic,
-        device=args.device
+        device=args.device,
+        attribution_batch_size=args.attribution_batch_size
     )
 
     sys.exit(0 if success else 1)
@@ -19,6 +19,11 @@ import json
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 from tqdm import tqdm
+import sys
+
+# Add parent directory to path to import the Phase 1 attention store
+sys.path.append(str(Path(__file__).parent.parent / "phase1_generation"))
+from attention_store import AttentionStoreReader
 
 
 class AttentionVisualizer:
@@ -36,48 +41,156 @@ class AttentionVisualizer:
         with open(self.sequence_dir / "metadata.json", "r") as f:
             self.metadata = json.load(f)
 
-        # Load attention maps if available
+        # Open attention maps if available. The chunked store is memory-mapped
+        # lazily, so only the steps/tokens actually visualized are read.
         self.attention_maps = None
-        attention_path = self.phase3_dir / "attention_maps.pkl"
-        if attention_path.exists():
-            with open(attention_path, "rb") as f:
+        store_dir = self.phase3_dir / "attention"
+        legacy_path = self.phase3_dir / "attention_maps.pkl"
+        if (store_dir / "index.json").exists():
+            self.attention_maps = AttentionStoreReader(store_dir)
+            print(f"Opened attention store with {len(self.attention_maps)} steps")
+        elif legacy_path.exists():
+            with open(legacy_path, "rb") as f:
                 self.attention_maps = pickle.load(f)
             print(f"Loaded attention maps for {len(self.attention_maps)} steps")
         else:
-            raise FileNotFoundError(f"No attention maps found at {attention_path}")
+            raise FileNotFoundError(f"No attention maps found in {self.phase3_dir}")
+
+        # Frame of every stored attention step: with an attention stride > 1 only
+        # every Nth frame was stored (older metadata stored every frame)
+        first_frame = (self.metadata.get("fork") or {}).get("first_frame", 0)
+        self.attention_frames = self.metadata.get(
+            "attention_frame_indices",
+            list(range(first_frame, first_frame + len(self.attention_maps)))
+        )
 
         # Parse prompt into tokens (approximate - actual tokenization is more complex)
         self.prompt = self.metadata["prompt"]
         self.tokens = self.prompt.split()
 
+    def word_token_indices(self, word_idx):
+        """
+        Get the CLIP token positions belonging to a prompt word.
+
+        Args:
+            word_idx: Index into self.tokens (whitespace-split prompt words)
+
+        Returns:
+            List of token positions in the captured attention maps
+        """
+        word_tokens = self.metadata.get("attention_word_tokens")
+        if word_tokens is not None:
+            return word_tokens[word_idx]
+
+        # Older metadata: assume one CLIP token per word, after the start token
+        return [word_idx + 1]
+
+    @staticmethod
+    def _upsample_maps(maps, resolution):
+        """
+        Bilinearly resize a stack of [N, H, W] maps to [N, resolution, resolution].
+        """
+        maps = np.asarray(maps, dtype=np.float32)
+        return np.stack([
+            np.array(Image.fromarray(m, mode="F").resize((resolution, resolution), Image.BILINEAR))
+            for m in maps
+        ])
+
+    def attention_position(self, step_idx):
+        """
+        Find where a frame's attention maps are stored.
+
+        Args:
+            step_idx: Frame index (as in step_XXXX.png)
+
+        Returns:
+            Index into self.attention_maps, or None if that frame's attention was not stored
+        """
+        try:
+            return self.attention_frames.index(step_idx)
+        except ValueError:
+            return None
+
     def aggregate_attention(self, step_idx, resolution=64):
         """
         Aggregate attention weights from all UNet layers for a given step.
 
+        Layers were already averaged per resolution during capture; here each
+        resolution is upsampled to a common size, the resolutions are averaged,
+        and CLIP tokens are pooled back into prompt words.
+
         Args:
-            step_idx: Which denoising step to analyze
+            step_idx: Which denoising step to analyze (frame index)
             resolution: Target resolution for attention maps
 
         Returns:
             Attention map of shape (num_tokens, height, width)
         """
-        if self.attention_maps is None or step_idx >= len(self.attention_maps):
+        position = self.attention_position(step_idx) if self.attention_maps is not None else None
+        if position is None or position >= len(self.attention_maps):
             return None
 
-        step_attentions = self.attention_maps[step_idx]
+        step_attentions = self.attention_maps[position]
 
-        # Aggregate attention from multiple layers
-        # This is a simplified version - actual implementation depends on attention structure
-        # For now, we'll create a mock visualization structure
+        # Upsample every resolution's [tokens, H, W] map and average them
+        token_attention = np.mean([
+            self._upsample_maps(token_maps, resolution)
+            for token_maps in step_attentions.values()
+        ], axis=0)
 
+        # Pool CLIP tokens into prompt words
         num_tokens = len(self.tokens)
-        attention_map = np.random.rand(num_tokens, resolution, resolution)
+        attention_map = np.zeros((num_tokens, resolution, resolution), dtype=np.float32)
+        for word_idx in range(num_tokens):
+            indices = [i for i in self.word_token_indices(word_idx) if i < len(token_attention)]
+            if indices:
+                attention_map[word_idx] = token_attention[indices].mean(axis=0)
 
         # Normalize
-        attention_map = attention_map / attention_map.sum(axis=(1, 2), keepdims=True)
+        totals = attention_map.sum(axis=(1, 2), keepdims=True)
+        attention_map = attention_map / np.where(totals > 0, totals, 1.0)
 
         return attention_map
 
+    def word_attention_over_steps(self, word_idx, resolution=64):
+        """
+        Get one word's aggregated attention map at every stored step
+        (the frames in self.attention_frames).
+
+        With the chunked attention store this reads only that word's token
+        slices across steps instead of every token of every step.
+
+        Args:
+            word_idx: Index into self.tokens
+            resolution: Target resolution for attention maps
+
+        Returns:
+            Array of shape (num_steps, resolution, resolution)
+        """
+        num_steps = len(self.attention_maps)
+
+        if not isinstance(self.attention_maps, AttentionStoreReader):
+            return np.stack([
+                self.aggregate_attention(frame, resolution)[word_idx]
+                for frame in self.attention_frames[:num_steps]
+            ])
+
+        reader = self.attention_maps
+        indices = [i for i in self.word_token_indices(word_idx) if i < reader.num_tokens]
+        if not indices:
+            return np.zeros((num_steps, resolution, resolution), dtype=np.float32)
+
+        word_maps = np.mean([
+            self._upsample_maps(
+                np.mean([reader.load_token(i, res).astype(np.float32) for i in indices], axis=0),
+                resolution
+            )
+            for res in reader.resolutions
+        ], axis=0)
+
+        totals = word_maps.sum(axis=(1, 2), keepdims=True)
+        return word_maps / np.where(totals > 0, totals, 1.0)
+
     def visualize_token_attention(self, step_idx, token_idx=None, output_dir=None):
         """
         Visualize attention for a specific token (or all tokens).
@@ -172,6 +285,9 @@ class AttentionVisualizer:
 
         print(f"\nGenerating attention evolution for token: '{token}'")
 
+        # One read of this word across all steps
+        word_attention = self.word_attention_over_steps(token_idx)
+
         # Create grid visualization
         cols = 10
         rows = (num_steps + cols - 1) // cols
@@ -179,22 +295,20 @@ class AttentionVisualizer:
         fig, axes = plt.subplots(rows, cols, figsize=(cols*2, rows*2))
         axes = axes.flatten() if rows > 1 else [axes]
 
-        for step_idx in tqdm(range(num_steps)):
+        for position, step_idx in enumerate(tqdm(self.attention_frames[:num_steps])):
             # Load image
             image_path = self.sequence_dir / f"step_{step_idx:04d}.png"
             if image_path.exists():
                 img = Image.open(image_path)
 
                 # Get attention
-                attention_map = self.aggregate_attention(step_idx)
-                if attention_map is not None:
-                    attn = attention_map[token_idx]
+                attn = word_attention[position]
 
-                    # Plot overlay
-                    axes[step_idx].imshow(img, alpha=0.7)
-                    axes[step_idx].imshow(attn, cmap='hot', alpha=0.3, interpolation='bilinear')
-                    axes[step_idx].set_title(f'S{step_idx}', fontsize=8)
-                    axes[step_idx].axis('off')
+                # Plot overlay
+                axes[position].imshow(img, alpha=0.7)
+                axes[position].imshow(attn, cmap='hot', alpha=0.3, interpolation='bilinear')
+                axes[position].set_title(f'S{step_idx}', fontsize=8)
+                axes[position].axis('off')
 
         # Hide unused subplots
         for idx in range(num_steps, len(axes)):
@@ -248,7 +362,7 @@ def main():
         # Visualize attention for first few steps
         print("\n1. Generating token-specific attention maps...")
         for step in [0, 10, 25, 49]:
-            if step < len(viz.attention_maps):
+            if viz.attention_position(step) is not None:
                 viz.visualize_token_attention(step)
 
         # Visualize evolution for key tokens
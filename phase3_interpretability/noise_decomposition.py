@@ -42,13 +42,30 @@ class NoiseDecompositionAnalyzer:
         else:
             raise FileNotFoundError(f"No latent vectors found at {latents_path}")
 
+        # Load the UNet's predicted noise if it was captured (memory-mapped, float16)
+        self.predicted_noise = None
+        noise_path = self.phase3_dir / "predicted_noise.npy"
+        if noise_path.exists():
+            self.predicted_noise = np.load(noise_path, mmap_mode="r")
+            print(f"Loaded predicted noise: {self.predicted_noise.shape}")
+
+        # Position in metadata["steps"] of every stored row: with a latents stride > 1
+        # only every Nth step was stored (older metadata stored every step)
+        first_frame = (self.metadata.get("fork") or {}).get("first_frame", 0)
+        latent_frames = self.metadata.get(
+            "latent_frame_indices",
+            range(first_frame, first_frame + len(self.latent_vectors))
+        )
+        self.latent_steps = np.array(latent_frames, dtype=int) - first_frame
+
     def compute_step_changes(self):
         """
         Compute the magnitude of change at each denoising step.
         This shows how much the latent representation changes.
 
         Returns:
-            Array of change magnitudes for each step
+            Array of change magnitudes since the previous stored step
+            (change i ends at step self.latent_steps[i + 1])
         """
         changes = []
 
@@ -62,14 +79,28 @@ class NoiseDecompositionAnalyzer:
 
         return np.array(changes)
 
+    def compute_predicted_noise_magnitude(self):
+        """
+        Compute the spread of the model's own noise prediction at each step.
+        Unlike noise variance (estimated from the latents), this is what the
+        UNet actually believed was noise.
+
+        Returns:
+            Array of predicted-noise standard deviations, or None if not captured
+        """
+        if self.predicted_noise is None:
+            return None
+
+        return np.array([float(np.std(step.astype(np.float32))) for step in self.predicted_noise])
+
     def compute_noise_variance_trajectory(self):
         """
         Extract noise variance over time from metadata.
 
         Returns:
-            Array of noise variance values
+            Array of noise variance values (NaN for steps the stats observer skipped)
         """
-        return np.array([step["noise_variance"] for step in self.metadata["steps"]])
+        return np.array([step.get("noise_variance", np.nan) for step in self.metadata["steps"]])
 
     def visualize_denoising_trajectory(self, output_path=None):
         """
@@ -84,20 +115,24 @@ class NoiseDecompositionAnalyzer:
         # Get data
         noise_variance = self.compute_noise_variance_trajectory()
         step_changes = self.compute_step_changes()
+        predicted_noise = self.compute_predicted_noise_magnitude()
 
         # Create plot
         fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 10))
 
         # Plot 1: Noise variance over time
         steps = range(len(noise_variance))
-        ax1.plot(steps, noise_variance, 'b-', linewidth=2, marker='o', markersize=3)
+        ax1.plot(steps, noise_variance, 'b-', linewidth=2, marker='o', markersize=3, label='Latent std')
+        if predicted_noise is not None:
+            ax1.plot(self.latent_steps[:len(predicted_noise)], predicted_noise, 'g--', linewidth=2, label='Predicted noise std')
+            ax1.legend(loc='upper right')
         ax1.set_xlabel('Denoising Step')
         ax1.set_ylabel('Noise Variance')
         ax1.set_title('Noise Variance Trajectory')
         ax1.grid(True, alpha=0.3)
 
         # Plot 2: Step-wise changes
-        ax2.plot(range(len(step_changes)), step_changes, 'r-', linewidth=2, marker='o', markersize=3)
+        ax2.plot(self.latent_steps[1:], step_changes, 'r-', linewidth=2, marker='o', markersize=3)
         ax2.set_xlabel('Denoising Step')
         ax2.set_ylabel('Change Magnitude')
         ax2.set_title('Magnitude of Latent Changes Between Steps')
@@ -107,7 +142,7 @@ class NoiseDecompositionAnalyzer:
         ax3_twin = ax3.twinx()
 
         ax3.plot(steps, noise_variance, 'b-', linewidth=2, label='Noise Variance', alpha=0.7)
-        ax3_twin.plot(range(len(step_changes)), step_changes, 'r-', linewidth=2, label='Change Magnitude', alpha=0.7)
+        ax3_twin.plot(self.latent_steps[1:], step_changes, 'r-', linewidth=2, label='Change Magnitude', alpha=0.7)
 
         ax3.set_xlabel('Denoising Step')
         ax3.set_ylabel('Noise Variance', color='b')
@@ -140,11 +175,12 @@ class NoiseDecompositionAnalyzer:
         step_changes = self.compute_step_changes()
         threshold = np.percentile(step_changes, threshold_percentile)
 
-        critical_steps = np.where(step_changes > threshold)[0]
+        critical = np.where(step_changes > threshold)[0]
+        critical_steps = self.latent_steps[1:][critical]
 
         print(f"\nCritical steps (>{threshold_percentile}th percentile):")
-        for step in critical_steps:
-            print(f"  Step {step}: change magnitude = {step_changes[step]:.4f}")
+        for step, change in zip(critical_steps, step_changes[critical]):
+            print(f"  Step {step}: change magnitude = {change:.4f}")
 
         return critical_steps
 
@@ -195,7 +231,7 @@ class NoiseDecompositionAnalyzer:
 
         for i, (x, y) in enumerate(projection):
             ax.scatter(x, y, c=[colors[i]], s=100, edgecolors='black', linewidths=1.5)
-            ax.text(x, y, f'{step_indices[i]}', fontsize=8, ha='center', va='center')
+            ax.text(x, y, f'{self.latent_steps[step_indices[i]]}', fontsize=8, ha='center', va='center')
 
         ax.set_xlabel('First Principal Component')
         ax.set_ylabel('Second Principal Component')
@@ -203,7 +239,7 @@ class NoiseDecompositionAnalyzer:
         ax.grid(True, alpha=0.3)
 
         # Add colorbar
-        sm = plt.cm.ScalarMappable(cmap='viridis', norm=plt.Normalize(vmin=0, vmax=total_steps))
+        sm = plt.cm.ScalarMappable(cmap='viridis', norm=plt.Normalize(vmin=0, vmax=self.latent_steps[-1] + 1))
         sm.set_array([])
         cbar = plt.colorbar(sm, ax=ax)
         cbar.set_label('Denoising Step')
@@ -230,11 +266,16 @@ class NoiseDecompositionAnalyzer:
         data = {
             "prompt": self.metadata["prompt"],
             "num_steps": len(self.latent_vectors),
+            "latent_steps": self.latent_steps.tolist(),
             "noise_variance": noise_variance.tolist(),
             "step_changes": step_changes.tolist(),
             "critical_steps": self.identify_critical_steps().tolist()
         }
 
+        predicted_noise = self.compute_predicted_noise_magnitude()
+        if predicted_noise is not None:
+            data["predicted_noise_std"] = predicted_noise.tolist()
+
         with open(output_path, "w") as f:
             json.dump(data, f, indent=2)
 
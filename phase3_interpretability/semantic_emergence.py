@@ -54,6 +54,30 @@ class SemanticEmergenceAnalyzer:
                 print("Warning: CLIP not available. Install with: pip install transformers")
                 self.use_clip = False
 
+    def step_image_path(self, step_idx, min_size=224):
+        """
+        Pick the cheapest saved image of a step that is still large enough.
+
+        Uses the smallest frame rendition listed in metadata.json whose longest
+        side is at least min_size (CLIP works at 224px), else the full PNG.
+
+        Args:
+            step_idx: Step (frame) index
+            min_size: Smallest acceptable longest side in pixels
+
+        Returns:
+            Path of the image (may not exist if the step has no saved frame)
+        """
+        renditions = [
+            rendition for rendition in self.metadata.get("renditions", {}).values()
+            if rendition["max_size"] is not None and rendition["max_size"] >= min_size
+        ]
+        if renditions:
+            rendition = min(renditions, key=lambda r: r["max_size"])
+            return self.sequence_dir / rendition["directory"] / f"step_{step_idx:04d}{rendition['extension']}"
+
+        return self.sequence_dir / f"step_{step_idx:04d}.png"
+
     def compute_clip_similarity(self, image, text):
         """
         Compute CLIP similarity between image and text.
@@ -121,7 +145,7 @@ class SemanticEmergenceAnalyzer:
 
         # Analyze each step
         for step_idx in tqdm(range(self.num_steps)):
-            image_path = self.sequence_dir / f"step_{step_idx:04d}.png"
+            image_path = self.step_image_path(step_idx)
 
             if not image_path.exists():
                 continue
@@ -152,7 +176,7 @@ class SemanticEmergenceAnalyzer:
         print(f"\nFinding emergence point for: '{concept}'")
 
         for step_idx in tqdm(range(self.num_steps)):
-            image_path = self.sequence_dir / f"step_{step_idx:04d}.png"
+            image_path = self.step_image_path(step_idx)
 
             if not image_path.exists():
                 continue
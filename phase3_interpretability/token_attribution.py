@@ -28,16 +28,21 @@ from diffusion_step_generator import DiffusionStepCapture
 
 
 class TokenAttributionAnalyzer:
-    def __init__(self, original_sequence_dir, device="mps"):
+    def __init__(self, original_sequence_dir, device="mps", model_id="runwayml/stable-diffusion-v1-5"):
         """
         Initialize token attribution analyzer.
 
         Args:
             original_sequence_dir: Path to the original generated sequence
             device: Device for generation ("cuda", "mps", or "cpu")
+            model_id: HuggingFace model identifier used for the ablations
         """
         self.sequence_dir = Path(original_sequence_dir)
         self.device = device
+        self.model_id = model_id
+
+        # One generator (and therefore one model load) shared by every ablation
+        self._generator = None
 
         # Load metadata from original sequence
         with open(self.sequence_dir / "metadata.json", "r") as f:
@@ -48,6 +53,8 @@ class TokenAttributionAnalyzer:
         self.seed = self.metadata["seed"]
         self.guidance_scale = self.metadata["guidance_scale"]
         self.num_inference_steps = self.metadata["num_inference_steps"]
+        self.height = self.metadata.get("height", 512)
+        self.width = self.metadata.get("width", 512)
 
         # Load original final image for comparison
         self.original_image = Image.open(self.sequence_dir / "final.png")
@@ -56,6 +63,32 @@ class TokenAttributionAnalyzer:
         print(f"Prompt: '{self.prompt}'")
         print(f"Tokens: {self.tokens}")
 
+    def get_generator(self):
+        """
+        Return the generator used for ablations, loading the model on first use.
+
+        Returns:
+            DiffusionStepCapture shared across all ablation runs
+        """
+        if self._generator is None:
+            self._generator = DiffusionStepCapture(
+                model_id=self.model_id,
+                device=self.device,
+                capture_attention=False
+            )
+        return self._generator
+
+    def close(self, evict=True):
+        """
+        Release the ablation generator.
+
+        Args:
+            evict: Also unload the model from the shared pipeline registry
+        """
+        if self._generator is not None:
+            self._generator.close(evict=evict)
+            self._generator = None
+
     def compute_image_similarity(self, img1, img2):
         """
         Compute similarity between two images using MSE.
@@ -75,6 +108,24 @@ class TokenAttributionAnalyzer:
 
         return mse
 
+    def build_ablated_prompt(self, token_idx):
+        """
+        Build the prompt with one token removed.
+
+        Args:
+            token_idx: Index of token to remove
+
+        Returns:
+            Ablated prompt string
+        """
+        ablated_tokens = [t for i, t in enumerate(self.tokens) if i != token_idx]
+        ablated_prompt = " ".join(ablated_tokens)
+
+        if not ablated_prompt.strip():
+            ablated_prompt = "image"  # Fallback if prompt becomes empty
+
+        return ablated_prompt
+
     def generate_ablated_sequence(self, token_idx, output_dir=None):
         """
         Generate a sequence with one token removed from the prompt.
@@ -89,18 +140,13 @@ class TokenAttributionAnalyzer:
         if output_dir is None:
             output_dir = self.sequence_dir / "ablation_study"
 
-        # Create ablated prompt
-        ablated_tokens = [t for i, t in enumerate(self.tokens) if i != token_idx]
-        ablated_prompt = " ".join(ablated_tokens)
-
-        if not ablated_prompt.strip():
-            ablated_prompt = "image"  # Fallback if prompt becomes empty
+        ablated_prompt = self.build_ablated_prompt(token_idx)
 
         print(f"\n  Generating without '{self.tokens[token_idx]}'...")
         print(f"  Ablated prompt: '{ablated_prompt}'")
 
-        # Initialize generator
-        generator = DiffusionStepCapture(device=self.device, capture_attention=False)
+        # Reuse the already-loaded generator
+        generator = self.get_generator()
 
         # Generate with ablated prompt (using same seed for comparison)
         output_path = output_dir / f"ablation_token{token_idx}_{self.tokens[token_idx]}"
@@ -110,18 +156,28 @@ class TokenAttributionAnalyzer:
             output_dir=output_path,
             num_inference_steps=self.num_inference_steps,
             guidance_scale=self.guidance_scale,
-            seed=self.seed  # Use same seed for fair comparison
+            seed=self.seed,  # Use same seed for fair comparison
+            height=self.height,
+            width=self.width
         )
 
         return final_image, ablated_prompt
 
-    def run_attribution_study(self):
+    def run_attribution_study(self, batched=False, max_batch_size=4):
         """
         Run full attribution study: generate sequences with each token removed.
 
+        Args:
+            batched: Run all ablations (plus the original prompt) through batched
+                denoising loops instead of one generation per token
+            max_batch_size: Maximum prompts per batched loop (bounds memory)
+
         Returns:
             Dictionary mapping token indices to divergence scores
         """
+        if batched:
+            return self.run_batched_attribution_study(max_batch_size=max_batch_size)
+
         print("\n" + "="*60)
         print("RUNNING TOKEN ATTRIBUTION STUDY")
         print(f"This will generate {len(self.tokens)} additional sequences")
@@ -148,6 +204,60 @@ class TokenAttributionAnalyzer:
 
         return results
 
+    def run_batched_attribution_study(self, max_batch_size=4):
+        """
+        Run the attribution study with all ablated prompts batched together.
+
+        The original prompt is generated in the same batch and used as the
+        comparison reference, so batch-vs-serial numerical drift is not counted
+        as attribution. Only final images are saved for each ablation.
+
+        Args:
+            max_batch_size: Maximum prompts per batched loop (bounds memory)
+
+        Returns:
+            Dictionary mapping token indices to divergence scores
+        """
+        print("\n" + "="*60)
+        print("RUNNING BATCHED TOKEN ATTRIBUTION STUDY")
+        print(f"This will generate {len(self.tokens) + 1} prompts in batches of {max_batch_size}")
+        print("="*60)
+
+        ablation_dir = self.sequence_dir / "ablation_study"
+        ablated_prompts = [self.build_ablated_prompt(i) for i in range(len(self.tokens))]
+
+        prompts = [self.prompt] + ablated_prompts
+        output_dirs = [ablation_dir / "original_batched"] + [
+            ablation_dir / f"ablation_token{i}_{token}" for i, token in enumerate(self.tokens)
+        ]
+
+        final_images = self.get_generator().generate_batch(
+            prompts=prompts,
+            output_dirs=output_dirs,
+            num_inference_steps=self.num_inference_steps,
+            guidance_scale=self.guidance_scale,
+            seed=self.seed,
+            height=self.height,
+            width=self.width,
+            max_batch_size=max_batch_size
+        )
+
+        reference_image = final_images[0]
+        results = {}
+
+        for token_idx, ablated_image in enumerate(final_images[1:]):
+            divergence = self.compute_image_similarity(reference_image, ablated_image)
+
+            results[token_idx] = {
+                "token": self.tokens[token_idx],
+                "ablated_prompt": ablated_prompts[token_idx],
+                "divergence": divergence
+            }
+
+            print(f"  Without '{self.tokens[token_idx]}': divergence {divergence:.2f}")
+
+        return results
+
     def visualize_attribution_scores(self, results, output_path=None):
         """
         Visualize token importance as a bar chart.
@@ -270,14 +380,16 @@ def main():
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: python token_attribution.py <sequence_dir> [device]")
+        print("Usage: python token_attribution.py <sequence_dir> [device] [max_batch_size]")
         print("Example: python token_attribution.py ../assets/generated_sequences/01_standard mps")
+        print("Passing max_batch_size runs all ablations in batched denoising loops.")
         print("\nWARNING: This will regenerate the sequence N times (once per token).")
         print("This can take significant time and compute resources.")
         return
 
     sequence_dir = sys.argv[1]
     device = sys.argv[2] if len(sys.argv) > 2 else "mps"
+    max_batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
     print("="*60)
     print("TOKEN ATTRIBUTION ANALYSIS")
@@ -288,7 +400,10 @@ def main():
 
         # Run attribution study
         print("\n1. Running attribution study (this will take a while)...")
-        results = analyzer.run_attribution_study()
+        results = analyzer.run_attribution_study(
+            batched=max_batch_size is not None,
+            max_batch_size=max_batch_size or 4
+        )
 
         # Visualize scores
         print("\n2. Visualizing attribution scores...")
@@ -301,6 +416,7 @@ def main():
         # Export data
         print("\n4. Exporting attribution data...")
         analyzer.export_attribution_data(results)
+        analyzer.close()
 
         print("\n" + "="*60)
         print("✓ Token attribution analysis complete!")